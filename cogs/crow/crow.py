@@ -1,4 +1,3 @@
-import aiohttp
 import discord
 from redbot.core import commands, Config
 from redbot.core.bot import Red
@@ -7,6 +6,9 @@ from .crow_events import CrowEvents
 from .crow_greeter import CrowGreeter
 from .crow_mtk import CrowMtk
 from .crow_wide import CrowWide
+from .fetcher import Fetcher
+from .greeter import GreeterStore, GreetingDispatcher
+from .scheduler import JobScheduler
 
 EVENT_EMOJIS = {"🧩": 1, "🍒": 2, "🚥": 3}
 
@@ -16,7 +18,30 @@ class Crow(CrowEvents, CrowGreeter, CrowMtk, CrowWide, commands.Cog):
         self.bot = bot
         self.bot.allowed_mentions = discord.AllowedMentions.none()
         self.config = Config.get_conf(self, identifier=8703465)
-        self.httpsession = aiohttp.ClientSession()
+        self.fetcher = Fetcher()
+        self.greeter_store = GreeterStore(self.config)
+        self.greeter_dispatcher = GreetingDispatcher(self._send_greeter_message)
+        self.scheduler = JobScheduler()
+        self.mtk_webhooks = {}
+
+    async def cog_load(self):
+        await self._init_metrics()
+        await self._init_slow_query_log()
+        await self._init_sharding()
+        # open, migrate and warm up event storage in the background
+        self._init_event_manager()
+        await self._init_backups()
+        await self._init_reconcile()
+
+    async def cog_unload(self):
+        self._stop_metrics_file()
+        self._stop_backups()
+        self._stop_reconcile()
+        self._stop_watching_changes()
+        await self.scheduler.close()
+        await self.greeter_dispatcher.close()
+        await self.greeter_store.close()
+        await self.fetcher.close()
 
     async def cog_before_invoke(self, ctx: commands.Context):
         self._init_event_manager()
@@ -1,25 +1,178 @@
+import asyncio
 import datetime
 import io
-from typing import Iterator, Optional, Union, cast
+import logging
+import os
+import re
+import time
+from typing import TYPE_CHECKING, Iterator, List, Optional, Union, cast
 
 import discord
-from redbot.core import commands
+from redbot.core import commands, Config
 from redbot.core.bot import Red
+from redbot.core.data_manager import cog_data_path
 from redbot.core.utils import menus
+from redbot.core.utils.chat_formatting import box, pagify
 
-from .events import EventManager, EventError
+from .events import DEFAULT_SLOW_QUERY_MS, EventError
+from .metrics import metrics
+from .scheduler import Job, JobError, JobScheduler, Priority
+
+if TYPE_CHECKING:
+    from .events import EventManager
+    from .events.reconcile import ReconcileReport
+    from .events.types import Rank
+
+log = logging.getLogger("red.kenku")
 
 EVENT_EMOJIS = {"🧩": 1, "🍒": 2, "🚥": 3}
+SPARKS = "▁▂▃▄▅▆▇█"
+
+# how often to rewrite the prometheus metrics file, when enabled
+METRICS_WRITE_INTERVAL = 60.0
 
 
 class CrowEvents(commands.Cog):
     bot: Red
+    config: Config
+    scheduler: JobScheduler
+    metrics_task: Optional[asyncio.Task] = None
+    startup_task: Optional[asyncio.Task] = None
+    watch_task: Optional[asyncio.Task] = None
+    backup_task: Optional[asyncio.Task] = None
+    reconcile_task: Optional[asyncio.Task] = None
+    last_reconcile: Optional["ReconcileReport"] = None
+    slow_query_ms: Optional[float] = DEFAULT_SLOW_QUERY_MS
+    shard_by_guild: bool = False
+
+    async def _init_metrics(self):
+        self.config.register_global(metrics={"enabled": False, "prometheus": False})
+        settings = await self.config.metrics()
+        metrics.enabled = settings["enabled"]
+        if settings["prometheus"]:
+            self._start_metrics_file()
+
+    def _start_metrics_file(self):
+        if self.metrics_task is None or self.metrics_task.done():
+            self.metrics_task = asyncio.create_task(self._write_metrics_file())
+
+    def _stop_metrics_file(self):
+        if self.metrics_task:
+            self.metrics_task.cancel()
+            self.metrics_task = None
+
+    async def _write_metrics_file(self):
+        path = os.path.join(cog_data_path(cast(commands.Cog, self)), "metrics.prom")
+        while True:
+            try:
+                metrics.write_prometheus(path)
+            except OSError:
+                log.exception("Failed to write metrics file")
+            await asyncio.sleep(METRICS_WRITE_INTERVAL)
+
+    async def _init_backups(self):
+        self.config.register_global(backups={"interval_hours": 0, "keep": 7})
+        settings = await self.config.backups()
+        if settings["interval_hours"]:
+            self._start_backups()
+
+    def _start_backups(self):
+        self._stop_backups()
+        self.backup_task = asyncio.create_task(self._run_backups())
+
+    def _stop_backups(self):
+        if self.backup_task:
+            self.backup_task.cancel()
+            self.backup_task = None
+
+    def _backup_dir(self):
+        return os.path.join(cog_data_path(cast(commands.Cog, self)), "backups")
+
+    async def _run_backups(self):
+        while True:
+            settings = await self.config.backups()
+            await asyncio.sleep(settings["interval_hours"] * 3600)
+            self._init_event_manager()
+            try:
+                await self._backup_job(settings["keep"])
+            except (EventError, JobError):
+                # already logged, or a backup is already running
+                pass
+
+    async def _init_reconcile(self):
+        self.config.register_global(reconcile={"interval_hours": 24})
+        settings = await self.config.reconcile()
+        if settings["interval_hours"]:
+            self._start_reconcile()
+
+    def _start_reconcile(self):
+        self._stop_reconcile()
+        self.reconcile_task = asyncio.create_task(self._run_reconcile())
+
+    def _stop_reconcile(self):
+        if self.reconcile_task:
+            self.reconcile_task.cancel()
+            self.reconcile_task = None
+
+    async def _run_reconcile(self):
+        while True:
+            settings = await self.config.reconcile()
+            await asyncio.sleep(settings["interval_hours"] * 3600)
+            self._init_event_manager()
+            try:
+                self.last_reconcile = await self._reconcile_job()
+            except (EventError, JobError):
+                # already logged, or a check is already running
+                pass
+
+    async def _backup_job(self, keep: int) -> str:
+        return await self.scheduler.run(
+            "backup",
+            lambda: self.event_manager.backup(self._backup_dir(), keep=keep),
+            priority=Priority.BULK,
+            key="backup",
+        )
+
+    async def _reconcile_job(self) -> "ReconcileReport":
+        return await self.scheduler.run(
+            "reconcile",
+            lambda: self.event_manager.reconcile(pause=self.scheduler.checkpoint),
+            priority=Priority.BULK,
+            key="reconcile",
+        )
+
+    async def _init_slow_query_log(self):
+        self.config.register_global(slow_query_ms=DEFAULT_SLOW_QUERY_MS)
+        self.slow_query_ms = await self.config.slow_query_ms()
+
+    async def _init_sharding(self):
+        self.config.register_global(shard_by_guild=False)
+        self.shard_by_guild = await self.config.shard_by_guild()
 
     def _init_event_manager(self):
-        # initialize the event manager lazily, so bugs don't crash startup
+        # storage is opened and warmed up in the background (normally from cog_load), so
+        # bugs don't crash startup
         if hasattr(self, "event_manager") and self.event_manager:
             return
-        self.event_manager = EventManager(cast(commands.Cog, self))
+        from .events import EventManager
+
+        self.event_manager = EventManager(
+            cast(commands.Cog, self),
+            slow_query_ms=self.slow_query_ms,
+            background=True,
+            shard_by_guild=self.shard_by_guild,
+        )
+        # reactions and event commands wait on this (see `EventManager.wait_ready`)
+        self.startup_task = asyncio.create_task(
+            self.event_manager.start(notify=self.bot.send_to_owners)
+        )
+        # other bot processes may share the storage files
+        self.watch_task = asyncio.create_task(self.event_manager.watch_changes())
+
+    def _stop_watching_changes(self):
+        if self.watch_task:
+            self.watch_task.cancel()
+            self.watch_task = None
 
     @commands.group()
     async def events(self, ctx: commands.Context):
@@ -36,25 +189,34 @@ class CrowEvents(commands.Cog):
         - 🍒 2 points
         - 🚥 3 points
 
-        This bot also tracks seasons of events, however the capability to configure seasons is not yet supported. All events/channels and leaderboards will fall under "Season 1" for now.
+        Events are grouped into seasons. Channels are set up per season, and the season leaderboard adds up every event in it. Use `season start` to close the current season (freezing its leaderboard) and begin a new one.
         """
 
+        # hold commands until storage is ready
+        await self.event_manager.wait_ready()
+
     @commands.Cog.listener("on_raw_reaction_add")
     async def event_react_added(self, payload: discord.RawReactionActionEvent):
         self._init_event_manager()
         if not await self.should_handle_react(payload):
             return
 
-        channel = cast(discord.TextChannel, self.bot.get_channel(payload.channel_id))
-        partial = discord.PartialMessage(channel=channel, id=payload.message_id)
-        message: discord.Message = await partial.fetch()
+        with self.scheduler.interactive(), metrics.timer("events.react_added"):
+            channel = cast(
+                discord.TextChannel, self.bot.get_channel(payload.channel_id)
+            )
+            partial = discord.PartialMessage(channel=channel, id=payload.message_id)
+            with metrics.timer("discord.fetch_message"):
+                message: discord.Message = await partial.fetch()
 
-        # count the mod reacts and add them up
-        score, _emojis = await self.score_mod_reacts(message)
-        added = self.event_manager.set_points(message, score)
+            # count the mod reacts and add them up
+            score, _emojis = await self.score_mod_reacts(message)
+            await self.event_manager.wait_ready()
+            added = self.event_manager.set_points(message, score)
 
-        if added:
-            await message.add_reaction(payload.emoji)
+            if added:
+                with metrics.timer("discord.add_reaction"):
+                    await message.add_reaction(payload.emoji)
 
     @commands.Cog.listener("on_raw_reaction_remove")
     async def event_react_removed(self, payload: discord.RawReactionActionEvent):
@@ -62,19 +224,25 @@ class CrowEvents(commands.Cog):
         if not await self.should_handle_react(payload):
             return
 
-        channel = cast(discord.TextChannel, self.bot.get_channel(payload.channel_id))
-        partial = discord.PartialMessage(channel=channel, id=payload.message_id)
-        message: discord.Message = await partial.fetch()
-
-        # count the mod reacts and add them up
-        score, emojis = await self.score_mod_reacts(message)
-        self.event_manager.set_points(message, score)
-
-        # if there no more mod reacts on this emoji, remove it
-        if payload.emoji.name not in emojis:
-            await message.remove_reaction(
-                payload.emoji, cast(discord.Member, self.bot.user)
+        with self.scheduler.interactive(), metrics.timer("events.react_removed"):
+            channel = cast(
+                discord.TextChannel, self.bot.get_channel(payload.channel_id)
             )
+            partial = discord.PartialMessage(channel=channel, id=payload.message_id)
+            with metrics.timer("discord.fetch_message"):
+                message: discord.Message = await partial.fetch()
+
+            # count the mod reacts and add them up
+            score, emojis = await self.score_mod_reacts(message)
+            await self.event_manager.wait_ready()
+            self.event_manager.set_points(message, score)
+
+            # if there no more mod reacts on this emoji, remove it
+            if payload.emoji.name not in emojis:
+                with metrics.timer("discord.remove_reaction"):
+                    await message.remove_reaction(
+                        payload.emoji, cast(discord.Member, self.bot.user)
+                    )
 
     async def should_handle_react(self, payload: discord.RawReactionActionEvent):
         # ignore ourselves
@@ -95,8 +263,9 @@ class CrowEvents(commands.Cog):
             assert member
 
         # check if the person un/reacting is a mod
-        if not await self.bot.is_mod(member):
-            return False
+        with metrics.timer("discord.is_mod"):
+            if not await self.bot.is_mod(member):
+                return False
 
         return True
 
@@ -122,12 +291,13 @@ class CrowEvents(commands.Cog):
         emojis: set[str] = set()
         for reaction in reactions:
             # async loop reacting users to find mods
-            async for user in reaction.users():
-                if await self.bot.is_mod(cast(discord.Member, user)):
-                    emoji = cast(str, reaction.emoji)
-                    multiplier += EVENT_EMOJIS[emoji]
-                    emojis.add(emoji)
-                    break
+            with metrics.timer("discord.reaction_users"):
+                async for user in reaction.users():
+                    if await self.bot.is_mod(cast(discord.Member, user)):
+                        emoji = cast(str, reaction.emoji)
+                        multiplier += EVENT_EMOJIS[emoji]
+                        emojis.add(emoji)
+                        break
         return multiplier, emojis
 
     @events.command(name="info")
@@ -147,7 +317,8 @@ class CrowEvents(commands.Cog):
         if event:
             user = user if user else ctx.message.author
             event_points, event_adj = self.event_manager.user_event_info(user, event)
-            desc = []
+            rank = self.event_manager.user_rank(user, event.guild.id, event.id)
+            desc = [format_rank(rank), ""] if rank else []
             for point in event_points:
                 score = point["point_value"] * point["multiplier"]
                 url = event.get_partial_message(point["message_id"]).jump_url
@@ -168,43 +339,136 @@ class CrowEvents(commands.Cog):
         else:
             author = cast(discord.Member, ctx.message.author)
             season, scores_by_channel = self.event_manager.user_info(author)
+            rank = self.event_manager.user_rank(author, author.guild.id)
             desc = []
             total = 0
             for score in scores_by_channel:
                 total += score["score"]
                 desc.append(f"<#{score['channel_id']}>: {plural(score['score'])}")
 
+            header = f"__**Total:** {plural(total)}__\n"
+            if rank:
+                header += format_rank(rank) + "\n"
             embed = discord.Embed(
                 title=f"Your points - {season['name']}",
-                description=f"__**Total:** {plural(total)}__\n\n" + "\n".join(desc),
+                description=header + "\n" + "\n".join(desc),
             )
             await ctx.send(embed=embed)
 
     @events.command(name="leaderboard")
     async def events_leaderboard(
-        self, ctx: commands.Context, event: Optional[discord.TextChannel] = None
+        self,
+        ctx: commands.Context,
+        event: Optional[discord.TextChannel] = None,
+        period: str = "all",
     ):
         """
         Show the season leaderboard.
 
         If a channel is provided, show that event's leaderboard instead.
+
+        By default scores are season totals. Set the period to a number of days (like `7d`) to only count recent points, or to `hot` to weigh points by age, halving each week.
         """
 
         assert ctx.guild
 
-        if event:
-            user_points = self.event_manager.get_event_leaderboard(event.id)
-            if user_points is None:
-                # channel not registered for events
-                await ctx.react_quietly("🚷")
-                return
+        period = period.lower()
+        match = re.fullmatch(r"(\d+)d", period)
+        if period not in ("all", "hot") and not (match and 1 <= int(match[1]) <= 90):
+            await ctx.send(
+                "The period can be `all`, `hot` or a number of days, up to `90d`."
+            )
+            return
+
+        if event and not self.event_manager.is_event_channel(ctx.guild.id, event.id):
+            # channel not registered for events
+            await ctx.react_quietly("🚷")
+            return
+
+        if period == "hot":
+            season, user_points = self.event_manager.get_hot_leaderboard(
+                ctx.guild.id, event.id if event else None
+            )
+            title = f"{event.name if event else season['name']} - hot"
+            empty = "No points scored recently."
+        elif match:
+            days = int(match[1])
+            season, user_points = self.event_manager.get_movers_leaderboard(
+                ctx.guild.id, days, event.id if event else None
+            )
+            title = f"{event.name if event else season['name']} - last {days} days"
+            empty = f"No points scored in the last {days} days."
+        elif event:
+            user_points = self.event_manager.get_event_leaderboard(
+                ctx.guild.id, event.id
+            )
             title = event.name
+            empty = "No points scored in that event yet."
         else:
             season, user_points = self.event_manager.get_season_leaderboard(
                 ctx.guild.id
             )
             title = season["name"]
+            empty = "No points scored this season yet."
+
+        if not user_points:
+            await ctx.send(empty)
+            return
+        await self._send_leaderboard(ctx, title, user_points)
+
+    @events.command(name="trend")
+    async def events_trend(
+        self,
+        ctx: commands.Context,
+        user: Optional[discord.Member] = None,
+        days: int = 14,
+    ):
+        """
+        Show points scored per day, over the last 14 days by default.
+
+        Only points from reactions count; staff adjustments aren't dated.
+        """
+
+        if not 1 <= days <= 90:
+            await ctx.send("Pick between 1 and 90 days.")
+            return
+        member = user or cast(discord.Member, ctx.message.author)
+        trend = self.event_manager.user_trend(member, member.guild.id, days)
+        embed = discord.Embed(
+            title=f"{member.name}#{member.discriminator}'s points - last {days} days",
+            description=f"`{sparkline(trend)}`\n\n"
+            + f"__**Total:** {plural(sum(trend))}__, best day {plural(max(trend))}",
+        )
+        await ctx.send(embed=embed)
+
+    @events.command(name="movers")
+    async def events_movers(
+        self,
+        ctx: commands.Context,
+        days: int = 7,
+        event: Optional[discord.TextChannel] = None,
+    ):
+        """
+        Show who scored the most points recently, over the last 7 days by default.
+
+        If a channel is provided, only count points from that event.
+        """
+
+        assert ctx.guild
+
+        if not 1 <= days <= 90:
+            await ctx.send("Pick between 1 and 90 days.")
+            return
+        _season, user_points = self.event_manager.get_movers_leaderboard(
+            ctx.guild.id, days, event.id if event else None
+        )
+        if not user_points:
+            await ctx.send(f"No points scored in the last {days} days.")
+            return
+        title = f"{event.name if event else 'Top movers'} - last {days} days"
+        await self._send_leaderboard(ctx, title, user_points)
 
+    async def _send_leaderboard(self, ctx: commands.Context, title: str, user_points):
         desc = []
         place = 1
         for user_id, points in user_points.items():
@@ -236,21 +500,24 @@ class CrowEvents(commands.Cog):
     async def events_configure_channel(
         self,
         ctx: commands.Context,
-        channel: discord.TextChannel,
+        channels: commands.Greedy[discord.TextChannel],
         point_value: int = 1,
     ):
         """
-        Configure a channel to be tracked in the current season.
+        Configure channels to be tracked in the current season.
 
         If the channel is already tracked, use this command to update the point value.
         Scores will be re-calculated.
 
         Set to 0 to remove a channel from the season. If you re-add a channel later, or add a channel after 🧩 reactions were already added, use the `rescan` command to update scores.
 
-        The default point value is 1.
+        The default point value is 1. Several channels can be given at once, and they'll all get the same point value.
         """
 
-        self.event_manager.configure_channel(channel, point_value)
+        if not channels:
+            await ctx.send_help()
+            return
+        self.event_manager.configure_channels(list(channels), point_value)
         await ctx.tick()
 
     @events.command(name="channels")
@@ -281,19 +548,36 @@ class CrowEvents(commands.Cog):
 
         You usually shouldn't need to do this. But if you deleted messages, or the bot was offline
         when reacting, you can run this to clear out points for a channel and re-calculate.
+
+        Scans run in the background, after other jobs in line (see `events jobs`).
         """
 
         async def rescan_handler(message):
+            # reactions coming in now go first
+            await self.scheduler.checkpoint()
             multiplier, _emojis = await self.score_mod_reacts(message)
             if multiplier > 0:
                 self.event_manager.set_points(message, multiplier)
 
+        async def rescan():
+            self.event_manager.clear_channel_points(channel)
+            await self.event_manager.rescan_channel(ctx, channel, rescan_handler)
+
+        try:
+            job = self.scheduler.submit(
+                "rescan",
+                rescan,
+                guild_id=channel.guild.id,
+                priority=Priority.BULK,
+                key=("rescan", channel.id),
+            )
+        except JobError as e:
+            await ctx.send(str(e))
+            return
         await ctx.send(
-            f"Scanning <#{channel.id}> for event data, this may take a while..."
+            f"Scanning <#{channel.id}> for event data (job {job.id}), "
+            + "this may take a while..."
         )
-        self.event_manager.clear_channel_points(channel)
-
-        self.event_manager.rescan_channel(ctx, channel, rescan_handler)
 
     @commands.admin()
     @events.command(name="adjust")
@@ -316,8 +600,15 @@ class CrowEvents(commands.Cog):
             readable = io.StringIO(bytes.decode(encoding="UTF-8"))
 
             try:
-                await self.event_manager.replace_adjustments(ctx, channel.id, readable)
-            except EventError as e:
+                await self.scheduler.run(
+                    "adjust",
+                    lambda: self.event_manager.replace_adjustments(
+                        ctx, channel.id, readable
+                    ),
+                    guild_id=channel.guild.id,
+                    key=("adjust", channel.id),
+                )
+            except (EventError, JobError) as e:
                 await ctx.send(str(e))
                 return
 
@@ -326,8 +617,9 @@ class CrowEvents(commands.Cog):
 
         # otherwise, emit scores
         writable = io.StringIO()
+        assert ctx.guild
         adjs = self.event_manager.get_adjustments(
-            channel.id, writable, ctx.message.author
+            ctx.guild.id, channel.id, writable, ctx.message.author
         )
         writable.seek(0)
 
@@ -349,14 +641,500 @@ class CrowEvents(commands.Cog):
         """
 
         assert ctx.guild
+        guild_id = ctx.guild.id
+
+        async def export():
+            self.event_manager.export_points(guild_id, writable)
 
         writable = io.StringIO()
-        self.event_manager.export_points(ctx.guild.id, writable)
+        try:
+            await self.scheduler.run(
+                "export", export, guild_id=guild_id, key=("export", guild_id)
+            )
+        except JobError as e:
+            await ctx.send(str(e))
+            return
         writable.seek(0)
         file = discord.File(writable, filename=f"{ctx.guild.id}_points.csv")  # type: ignore
         await ctx.send(file=file)
 
+    @events.group(name="season", invoke_without_command=True)
+    async def events_season(self, ctx: commands.Context):
+        """List this server's seasons."""
+
+        assert ctx.guild
+
+        active, seasons = self.event_manager.get_seasons(ctx.guild.id)
+        desc = []
+        for season in seasons:
+            start_at = int(
+                datetime.datetime.fromisoformat(season["start_at"]).timestamp()
+            )
+            if season["id"] == active["id"]:
+                desc.append(f"**{season['name']}**: since <t:{start_at}:D> (current)")
+            elif season["end_at"]:
+                end_at = int(
+                    datetime.datetime.fromisoformat(season["end_at"]).timestamp()
+                )
+                archived = " (archived)" if season["archived_at"] else ""
+                desc.append(
+                    f"**{season['name']}**: <t:{start_at}:D> to <t:{end_at}:D>{archived}"
+                )
+
+        embed = discord.Embed(title="Seasons", description="\n".join(desc))
+        await ctx.send(embed=embed)
+
+    @commands.admin()
+    @events_season.command(name="start")  # type: ignore
+    async def events_season_start(self, ctx: commands.Context, *, name: str):
+        """
+        End the current season and start a new one.
+
+        The current season's leaderboard is frozen and can still be viewed with `season leaderboard`. Event channels need to be set up again with `setup` for the new season.
+        """
+
+        assert ctx.guild
+
+        try:
+            previous, season = self.event_manager.start_season(ctx.guild.id, name)
+        except EventError as e:
+            await ctx.send(str(e))
+            return
+        await ctx.send(f"Ended {previous['name']} and started {season['name']}.")
+
+    @commands.admin()
+    @events_season.command(name="archive")  # type: ignore
+    async def events_season_archive(self, ctx: commands.Context, *, name: str):
+        """
+        Move a finished season's points into an archive file.
+
+        Its leaderboard stays available, and `export` still includes its points, but they're no longer kept in the live database.
+        """
+
+        assert ctx.guild
+
+        try:
+            season = self.event_manager.archive_season(ctx.guild.id, name)
+        except EventError as e:
+            await ctx.send(str(e))
+            return
+        await ctx.send(f"Archived {season['name']}.")
+
+    @events_season.command(name="leaderboard")  # type: ignore
+    async def events_season_leaderboard(self, ctx: commands.Context, *, name: str):
+        """Show the leaderboard for a past (or the current) season."""
+
+        assert ctx.guild
+
+        try:
+            season, user_points = self.event_manager.get_season_leaderboard(
+                ctx.guild.id, name
+            )
+        except EventError as e:
+            await ctx.send(str(e))
+            return
+        await self._send_leaderboard(ctx, season["name"], user_points)
+
+    @commands.mod()
+    @events.group(name="stats", invoke_without_command=True)
+    async def events_stats(self, ctx: commands.Context):
+        """
+        Show timing stats for reactions, scoring, storage and image commands.
+
+        Stats are only collected while enabled (see `enable`). Times are shown as the mean, plus rough p50/p99 bucket bounds.
+        """
+
+        if not metrics.enabled:
+            await ctx.send(
+                "Stats collection is off. Use `events stats enable` to turn it on."
+            )
+            return
+
+        lines = metrics.summary()
+        if not lines:
+            await ctx.send("Nothing recorded yet.")
+            return
+        for page in pagify("\n".join(lines)):
+            await ctx.send(box(page))
+
+    @commands.admin()
+    @events_stats.command(name="enable")  # type: ignore
+    async def events_stats_enable(self, ctx: commands.Context):
+        """Start collecting stats."""
+
+        metrics.enabled = True
+        async with self.config.metrics() as settings:
+            settings["enabled"] = True
+        await ctx.tick()
+
+    @commands.admin()
+    @events_stats.command(name="disable")  # type: ignore
+    async def events_stats_disable(self, ctx: commands.Context):
+        """Stop collecting stats."""
+
+        metrics.enabled = False
+        async with self.config.metrics() as settings:
+            settings["enabled"] = False
+        await ctx.tick()
+
+    @commands.admin()
+    @events_stats.command(name="reset")  # type: ignore
+    async def events_stats_reset(self, ctx: commands.Context):
+        """Clear all collected stats."""
+
+        metrics.reset()
+        await ctx.tick()
+
+    @commands.is_owner()
+    @events_stats.command(name="prometheus")  # type: ignore
+    async def events_stats_prometheus(self, ctx: commands.Context, enabled: bool):
+        """
+        Periodically write stats to a Prometheus text file.
+
+        The file is `metrics.prom` in the cog's data directory, for node_exporter's textfile collector or similar.
+        """
+
+        async with self.config.metrics() as settings:
+            settings["prometheus"] = enabled
+        if enabled:
+            self._start_metrics_file()
+        else:
+            self._stop_metrics_file()
+        await ctx.tick()
+
+    @commands.is_owner()
+    @events.group(name="backup", invoke_without_command=True)
+    async def events_backup(self, ctx: commands.Context):
+        """
+        Show event storage backups.
+
+        Backups are full copies of the event database (seasons, points, adjustments and scores, archived seasons included), taken without pausing scoring. They're kept in the cog's data directory.
+        """
+        from .events.backup import list_backups
+
+        settings = await self.config.backups()
+        if settings["interval_hours"]:
+            schedule = (
+                f"Backing up every {settings['interval_hours']:g}h, "
+                + f"keeping {settings['keep']}."
+            )
+        else:
+            schedule = "Scheduled backups are off."
+        names = list_backups(self._backup_dir())
+        listing = "\n".join(names) if names else "No backups yet."
+        await ctx.send(schedule + "\n" + box(listing))
+
+    @commands.is_owner()
+    @events_backup.command(name="now")  # type: ignore
+    async def events_backup_now(self, ctx: commands.Context):
+        """Take a backup right away."""
+
+        settings = await self.config.backups()
+        try:
+            async with ctx.typing():
+                path = await self._backup_job(settings["keep"])
+        except (EventError, JobError) as e:
+            await ctx.send(str(e))
+            return
+        await ctx.send(f"Saved {os.path.basename(path)}.")
+
+    @commands.is_owner()
+    @events_backup.command(name="schedule")  # type: ignore
+    async def events_backup_schedule(
+        self, ctx: commands.Context, interval_hours: float, keep: int = 7
+    ):
+        """
+        Back up every `interval_hours`, keeping the newest `keep` backups.
+
+        Set the interval to 0 to stop scheduled backups.
+        """
+
+        if interval_hours < 0 or keep < 1:
+            await ctx.send_help()
+            return
+        async with self.config.backups() as settings:
+            settings["interval_hours"] = interval_hours
+            settings["keep"] = keep
+        if interval_hours:
+            self._start_backups()
+        else:
+            self._stop_backups()
+        await ctx.tick()
+
+    @commands.is_owner()
+    @events_backup.command(name="restore")  # type: ignore
+    async def events_backup_restore(
+        self, ctx: commands.Context, name: str, guild_id: Optional[int] = None
+    ):
+        """
+        Replace all event data with a backup.
+
+        The backup is checked before anything is touched, and the current data is backed up first.
+
+        For a guild with its own database (see `events shards`), give its ID to restore just that guild from its own backups.
+        """
+        from .events.backup import list_backups
+
+        directory = self._backup_dir()
+        if guild_id is not None:
+            directory = self.event_manager.shard_backup_dir(directory, guild_id)
+        existing = list_backups(directory)
+        if name not in existing:
+            await ctx.send("There's no backup with that name.")
+            return
+
+        try:
+            async with ctx.typing():
+                # don't rotate, so this can't remove the backup being restored (or any
+                # other database's backups)
+                await self.event_manager.backup(self._backup_dir(), keep=None)
+                await self.event_manager.restore(
+                    os.path.join(directory, name), guild_id=guild_id
+                )
+        except EventError as e:
+            await ctx.send(str(e))
+            return
+        await ctx.send(f"Restored event data from {name}.")
+
+    @commands.is_owner()
+    @events.group(name="reconcile", invoke_without_command=True)
+    async def events_reconcile(self, ctx: commands.Context):
+        """
+        Show when scores were last checked against the points behind them.
+
+        Scores are kept up to date as points come in, and stored separately from them. A regular check makes sure they still agree, fixes any that don't, and clears out scores left behind by removed events. Removed events' points are kept, so adding one back restores its scores.
+        """
+
+        settings = await self.config.reconcile()
+        hours = settings["interval_hours"]
+        schedule = (
+            f"Checking every {hours:g}h." if hours else "Scheduled checks are off."
+        )
+        if self.last_reconcile:
+            last = self.last_reconcile.summary()
+        else:
+            last = "Not checked since the bot started."
+        await ctx.send(f"{schedule}\n{last}")
+
+    @commands.is_owner()
+    @events_reconcile.command(name="now")  # type: ignore
+    async def events_reconcile_now(self, ctx: commands.Context):
+        """Check and fix scores right away."""
+
+        try:
+            async with ctx.typing():
+                self.last_reconcile = await self._reconcile_job()
+        except (EventError, JobError) as e:
+            await ctx.send(str(e))
+            return
+        await ctx.send(self.last_reconcile.summary())
+
+    @commands.is_owner()
+    @events_reconcile.command(name="schedule")  # type: ignore
+    async def events_reconcile_schedule(
+        self, ctx: commands.Context, interval_hours: float
+    ):
+        """
+        Check scores every `interval_hours`.
+
+        Set to 0 to stop scheduled checks.
+        """
+
+        if interval_hours < 0:
+            await ctx.send_help()
+            return
+        async with self.config.reconcile() as settings:
+            settings["interval_hours"] = interval_hours
+        if interval_hours:
+            self._start_reconcile()
+        else:
+            self._stop_reconcile()
+        await ctx.tick()
+
+    @commands.is_owner()
+    @events.group(name="shards", invoke_without_command=True)
+    async def events_shards(self, ctx: commands.Context):
+        """
+        Show which guilds have their own event database.
+
+        By default every guild's events share one database, so a busy guild's reactions and exports can hold up everyone else's. With sharding on, each guild new to events gets its own instead. Guilds already using the shared one can be moved with `move`.
+        """
+
+        manager = self.event_manager
+        mode = "on" if manager.shard_by_guild else "off"
+        lines = []
+        for guild_id, shard in sorted(manager.shards.items()):
+            guild = self.bot.get_guild(guild_id)
+            name = guild.name if guild else "unknown guild"
+            size = (
+                f"{os.path.getsize(shard.path) / 2**20:.1f} MiB"
+                if not shard.backend.in_memory
+                else "in memory"
+            )
+            lines.append(f"{guild_id} ({name}): {size}")
+        shared = manager.storage.get_guild_ids()
+        lines.append(f"{len(shared)} guilds in the shared database")
+        await ctx.send(f"Sharding is {mode}.\n" + box("\n".join(lines)))
+
+    @commands.is_owner()
+    @events_shards.command(name="enable")  # type: ignore
+    async def events_shards_enable(self, ctx: commands.Context):
+        """Give each guild new to events its own database."""
+
+        await self.config.shard_by_guild.set(True)
+        self.shard_by_guild = True
+        self.event_manager.shard_by_guild = True
+        await ctx.tick()
+
+    @commands.is_owner()
+    @events_shards.command(name="disable")  # type: ignore
+    async def events_shards_disable(self, ctx: commands.Context):
+        """
+        Keep guilds new to events in the shared database.
+
+        Guilds that already have their own database keep it.
+        """
+
+        await self.config.shard_by_guild.set(False)
+        self.shard_by_guild = False
+        self.event_manager.shard_by_guild = False
+        await ctx.tick()
+
+    @commands.is_owner()
+    @events_shards.command(name="move")  # type: ignore
+    async def events_shards_move(self, ctx: commands.Context, *guild_ids: int):
+        """
+        Move guilds out of the shared database into their own.
+
+        Defaults to this guild. Events pause while they're moved.
+        """
+
+        if not guild_ids:
+            if not ctx.guild:
+                await ctx.send_help()
+                return
+            guild_ids = (ctx.guild.id,)
+
+        moved = []
+        async with ctx.typing():
+            for guild_id in guild_ids:
+                try:
+                    seasons = await self.event_manager.move_guild(guild_id)
+                except EventError as e:
+                    await ctx.send(f"{guild_id}: {e}")
+                    continue
+                moved.append(f"{guild_id}: {seasons} seasons")
+                # let reactions for other guilds through in between
+                await asyncio.sleep(0)
+        if moved:
+            await ctx.send("Moved " + ", ".join(moved) + ".")
+
+    @commands.is_owner()
+    @events.group(name="slowlog", invoke_without_command=True)
+    async def events_slowlog(self, ctx: commands.Context):
+        """
+        Show recent slow event storage queries.
+
+        Queries slower than the threshold (see `threshold`) are kept along with their parameter types, row counts and query plans.
+        """
+
+        dump = self.event_manager.profiler.dump()
+        if not dump:
+            await ctx.send("No slow queries recorded.")
+            return
+        file = discord.File(io.BytesIO(dump.encode()), filename="slow_queries.sql")
+        await ctx.send(file=file)
+
+    @commands.is_owner()
+    @events_slowlog.command(name="threshold")  # type: ignore
+    async def events_slowlog_threshold(
+        self, ctx: commands.Context, milliseconds: Optional[float] = None
+    ):
+        """
+        Set how slow a query must be to be logged, in milliseconds.
+
+        Leave empty to turn slow query logging off.
+        """
+
+        await self.config.slow_query_ms.set(milliseconds)
+        self.slow_query_ms = milliseconds
+        self.event_manager.set_slow_query_threshold(milliseconds)
+        await ctx.tick()
+
+    @commands.is_owner()
+    @events_slowlog.command(name="clear")  # type: ignore
+    async def events_slowlog_clear(self, ctx: commands.Context):
+        """Forget recorded slow queries."""
+
+        self.event_manager.profiler.clear()
+        await ctx.tick()
+
+    @commands.mod()
+    @events.group(name="jobs", invoke_without_command=True)
+    async def events_jobs(self, ctx: commands.Context):
+        """
+        Show background jobs: rescans, exports, imports, image rendering, checks and backups.
+
+        Jobs run a few at a time, with bulk work like rescans going after anything someone is waiting on. Reactions and greetings never wait for jobs. Bot owners see every guild's jobs.
+        """
+
+        assert ctx.guild
+        if await self.bot.is_owner(ctx.author):
+            jobs = self.scheduler.jobs()
+        else:
+            jobs = self.scheduler.jobs(ctx.guild.id)
+        if not jobs:
+            await ctx.send("No recent jobs.")
+            return
+        await ctx.send(box("\n".join(format_job(job) for job in jobs)))
+
+    @commands.mod()
+    @events_jobs.command(name="cancel")  # type: ignore
+    async def events_jobs_cancel(self, ctx: commands.Context, job_id: int):
+        """Stop a queued or running job."""
+
+        assert ctx.guild
+        owner = await self.bot.is_owner(ctx.author)
+        jobs = self.scheduler.jobs(None if owner else ctx.guild.id)
+        if not any(job.id == job_id for job in jobs):
+            await ctx.send("There's no job with that number.")
+            return
+        if not self.scheduler.cancel(job_id):
+            await ctx.send("That job has already finished.")
+            return
+        await ctx.tick()
+
+
+def format_rank(rank: "Rank"):
+    line = f"**Rank:** #{rank.rank}"
+    if rank.above:
+        ahead = rank.above[0]
+        line += f", {plural(ahead['score'] - rank.score)} behind <@{ahead['user_id']}>"
+    return line
+
+
+def sparkline(values: List[int]):
+    low, high = min(values), max(values)
+    if high == low:
+        return SPARKS[0] * len(values)
+    steps = len(SPARKS) - 1
+    return "".join(SPARKS[round((v - low) / (high - low) * steps)] for v in values)
+
 
 def plural(points: int):
     word = "point" if points == 1 else "points"
     return f"{points} {word}"
+
+
+def format_job(job: Job):
+    now = time.monotonic()
+    if job.finished_at is not None:
+        timing = f"took {job.finished_at - (job.started_at or job.finished_at):.0f}s"
+    elif job.started_at is not None:
+        timing = f"for {now - job.started_at:.0f}s"
+    else:
+        timing = f"for {now - job.created_at:.0f}s"
+    return (
+        f"{job.id:>4} {job.name:<10} {job.priority.name.lower():<6} "
+        + f"{job.status:<9} {timing}"
+    )
@@ -1,13 +1,24 @@
+import asyncio
+from io import BytesIO
 from typing import List, Optional, cast
 import discord
 from redbot.core import commands, Config
 from redbot.core.bot import Red
 from redbot.core.utils.predicates import MessagePredicate
 
+from .fetcher import Fetcher, FetchError
+from .greeter import GreeterStore, GreetingDispatcher
+from .metrics import metrics
+from .scheduler import JobScheduler
+
 
 class CrowGreeter(commands.Cog):
     bot: Red
     config: Config
+    fetcher: Fetcher
+    greeter_store: GreeterStore
+    greeter_dispatcher: GreetingDispatcher
+    scheduler: JobScheduler
 
     @commands.mod()
     @commands.group()
@@ -16,14 +27,6 @@ class CrowGreeter(commands.Cog):
         Configure welcome messages and images.
         """
 
-        defaults = {
-            "message": "Welcome $USER to our server!",
-            "channel": 0,
-            "images": [],
-            "next_image": 0,
-        }
-        self.config.register_guild(greeter=defaults)
-
     @commands.admin()
     @greeter.command(name="config")  # type: ignore
     async def greeter_config(
@@ -34,7 +37,7 @@ class CrowGreeter(commands.Cog):
         """Set up a greeting channel."""
 
         await ctx.reply(
-            f"Configuring channel <#{channel.id}> to be used for new member greetings. You can enter a greeting message that will be sent when someone joins the server. Use `$USER` to mention them. For example, 'Welcome $USER to our server!'.\n"
+            f"Configuring channel <#{channel.id}> to be used for new member greetings. You can enter a greeting message that will be sent when someone joins the server. Use `$USER` to mention them, `$NAME` for their display name, `$SERVER` for the server name, and `$MEMBERS` for the member count. For example, 'Welcome $USER to our server!'.\n"
             + "Enter your greeting message now (or type `cancel`):"
         )
 
@@ -46,8 +49,8 @@ class CrowGreeter(commands.Cog):
             await message.add_reaction("🆗")
             return
 
-        config = self.config.guild(cast(discord.Guild, ctx.guild))
-        async with config.greeter() as greeter:
+        guild = cast(discord.Guild, ctx.guild)
+        async with self.greeter_store.edit(guild) as greeter:
             greeter["message"] = message.content
             greeter["channel"] = channel.id
 
@@ -64,11 +67,33 @@ class CrowGreeter(commands.Cog):
     ):
         """Add a banner image to the greeter rotation."""
 
-        config = self.config.guild(cast(discord.Guild, ctx.guild))
-        async with config.greeter() as greeter:
+        # catch broken links now rather than when someone joins
+        try:
+            data = await self.fetcher.fetch(url, content_type="image/")
+        except FetchError as e:
+            await ctx.reply(f"Couldn't use that banner: {e}")
+            return
+        try:
+            # decoding is CPU work; keep it off the event loop
+            await asyncio.to_thread(self._greeter_verify_image, data)
+        except Exception:
+            await ctx.reply(
+                "Couldn't use that banner: it doesn't look like a valid image."
+            )
+            return
+
+        guild = cast(discord.Guild, ctx.guild)
+        async with self.greeter_store.edit(guild) as greeter:
             greeter["images"].append(url)
         await ctx.react_quietly("✅")
 
+    @metrics.timed("pillow.verify")
+    def _greeter_verify_image(self, data: bytes):
+        from PIL import Image
+
+        with Image.open(BytesIO(data)) as img:
+            img.verify()
+
     @commands.admin()
     @greeter.command(name="bannerlist")  # type: ignore
     async def greeter_list_banner(
@@ -77,10 +102,8 @@ class CrowGreeter(commands.Cog):
     ):
         """List all active banner images."""
 
-        config = self.config.guild(cast(discord.Guild, ctx.guild))
-        greeter = await config.greeter()
-        images = greeter["images"]
-        image_text = [f"<{i}>" for i in images]
+        greeter = await self.greeter_store.get(cast(discord.Guild, ctx.guild))
+        image_text = [f"<{i}>" for i in greeter.images]
         embed = discord.Embed(description="\n".join(image_text))
         await ctx.reply(embed=embed)
 
@@ -93,8 +116,8 @@ class CrowGreeter(commands.Cog):
     ):
         """Remove a banner image from the greeter rotation."""
 
-        config = self.config.guild(cast(discord.Guild, ctx.guild))
-        async with config.greeter() as greeter:
+        guild = cast(discord.Guild, ctx.guild)
+        async with self.greeter_store.edit(guild) as greeter:
             greeter["images"].remove(url)
         await ctx.react_quietly("✅")
 
@@ -106,7 +129,16 @@ class CrowGreeter(commands.Cog):
         """Manually send a greeting."""
 
         to = member if member else cast(discord.Member, ctx.author)
-        await self._send_greeter_message(to)
+        await self._send_greeter_message([to])
+
+    @commands.mod()
+    @greeter.command(name="status")  # type: ignore
+    async def greeter_status(self, ctx: commands.Context):
+        """Show how many members are waiting to be greeted."""
+
+        guild = cast(discord.Guild, ctx.guild)
+        depth = self.greeter_dispatcher.depth(guild.id)
+        await ctx.reply(f"{depth} member(s) queued for a greeting.")
 
     @commands.Cog.listener("on_member_update")
     async def greeter_member_verified(
@@ -119,45 +151,32 @@ class CrowGreeter(commands.Cog):
             return
         if after.pending:
             return
-        await self._send_greeter_message(after)
-
-    async def _send_greeter_message(self, member: discord.Member):
-        config = self.config.guild(member.guild)
-        greeter = await config.greeter()
-        message = greeter["message"]
-        channel_id = greeter["channel"]
-
-        if channel_id == 0:
+        # greetings are batched up, so a wave of verifications doesn't flood the channel
+        self.greeter_dispatcher.enqueue(after)
+
+    async def _send_greeter_message(self, members: List[discord.Member]):
+        # rescans and other bulk jobs hold off until the greeting is out
+        with self.scheduler.interactive():
+            await self._send_greeting(members)
+
+    async def _send_greeting(self, members: List[discord.Member]):
+        guild = members[0].guild
+        greeter = await self.greeter_store.get(guild)
+        if greeter.channel == 0:
             return
 
-        channel = cast(discord.TextChannel, member.guild.get_channel(channel_id))
-        formatted = message.replace("$USER", f"<@{member.id}>")
+        channel = cast(discord.TextChannel, guild.get_channel(greeter.channel))
+        mentions = ", ".join(f"<@{member.id}>" for member in members)
+        formatted = greeter.template.render(members)
 
-        image_url = await self._greeter_next_image(member.guild)
+        image_url = self.greeter_store.next_image(guild.id)
 
         embed = discord.Embed(
             description=formatted,
         )
         embed.set_image(url=image_url)
         await channel.send(
-            f"<@{member.id}>",
+            mentions,
             embed=embed,
-            allowed_mentions=discord.AllowedMentions(users=[member]),
+            allowed_mentions=discord.AllowedMentions(users=members),
         )
-
-    async def _greeter_next_image(self, guild: discord.Guild):
-        config = self.config.guild(guild)
-        greeter = await config.greeter()
-        images: List[str] = greeter["images"]
-        index: int = greeter["next_image"]
-
-        # wrap around at the start, instead of afterwards, so we can still show images recently
-        # added at the end (if the pointer was already at the end)
-        if index >= len(images):
-            index = 0
-        url = images[index]
-
-        async with config.greeter() as greeter:
-            greeter["next_image"] = index + 1
-
-        return url
@@ -1,18 +1,24 @@
+import asyncio
 from io import BytesIO
 from math import floor
-from typing import Optional, cast
+from typing import Dict, Optional, cast
 
-import aiohttp
 import discord
-from PIL import Image
 from redbot.core import commands, Config
 from redbot.core.bot import Red
 
+from .fetcher import Fetcher, FetchError
+from .metrics import metrics
+from .scheduler import JobScheduler
+
 
 class CrowMtk(commands.Cog):
     bot: Red
     config: Config
-    httpsession: aiohttp.ClientSession
+    fetcher: Fetcher
+    scheduler: JobScheduler
+    # channel id -> our webhook in that channel, or None if there isn't one
+    mtk_webhooks: Dict[int, Optional[discord.Webhook]]
 
     @commands.mod()
     @commands.group()
@@ -20,6 +26,7 @@ class CrowMtk(commands.Cog):
         """Kanjon's half-assed goodie bag"""
 
         self.config.register_user(exclaim={"image": "", "x": 0, "y": 0, "scale": 1.0})
+        self.config.register_channel(exclaim_webhook={"id": 0, "token": ""})
 
     @mtk.command("exclaimset")  # type: ignore
     async def mtk_exclaim_set(
@@ -55,12 +62,51 @@ class CrowMtk(commands.Cog):
         """
         config = self.config.user(ctx.author)
         exclaim = await config.exclaim()
-        scale: float = exclaim["scale"]
 
-        base_data = BytesIO(await self._mtk_fetch(exclaim["image"]))
-        base_img = Image.open(base_data)
+        try:
+            base_data = BytesIO(
+                await self.fetcher.fetch(exclaim["image"], content_type="image/")
+            )
+        except FetchError as e:
+            await ctx.reply(f"Couldn't load your `exclaimset` image: {e}")
+            return
 
         emoji_data = BytesIO(await emoji.read())
+        out = await self.scheduler.run(
+            "exclaim",
+            lambda: asyncio.to_thread(
+                self._mtk_compose, base_data, emoji_data, exclaim
+            ),
+            guild_id=channel.guild.id,
+        )
+
+        filename = f"exclaim_{emoji.name}.png"
+        webhook = await self._mtk_exclaim_webhook(channel)
+        if webhook:
+            author = cast(discord.Member, ctx.author)
+            avatar_url = author.avatar.url if author.avatar else None
+            try:
+                await webhook.send(
+                    file=discord.File(out, filename=filename),
+                    username=author.nick or author.name,
+                    avatar_url=avatar_url,
+                    wait=True,
+                )
+                return
+            except discord.NotFound:
+                # cached hook was deleted while we weren't looking
+                await self._mtk_forget_webhook(channel)
+                out.seek(0)
+        await channel.send(file=discord.File(out, filename=filename))
+
+    @metrics.timed("pillow.exclaim")
+    def _mtk_compose(self, base_data: BytesIO, emoji_data: BytesIO, exclaim: dict):
+        # Pillow is slow to import, so only load it once someone needs it
+        from PIL import Image
+
+        scale: float = exclaim["scale"]
+        base_img = Image.open(base_data)
+
         emoji_img = Image.open(emoji_data)
         emoji_resized = emoji_img.resize(
             (floor(emoji_img.width * scale), floor(emoji_img.height * scale))
@@ -75,21 +121,7 @@ class CrowMtk(commands.Cog):
         out = BytesIO()
         base_img.save(out, format="PNG")
         out.seek(0)
-
-        file = discord.File(out, filename=f"exclaim_{emoji.name}.png")
-
-        webhook = await self._mtk_exclaim_webhook(channel)
-        if webhook:
-            author = cast(discord.Member, ctx.author)
-            avatar_url = author.avatar.url if author.avatar else None
-            await webhook.send(
-                file=file,
-                username=author.nick or author.name,
-                avatar_url=avatar_url,
-                wait=True,
-            )
-        else:
-            await channel.send(file=file)
+        return out
 
     @mtk.command(name="exclaimwebhook")  # type: ignore
     async def mtk_exclaim_webhook(
@@ -106,21 +138,72 @@ class CrowMtk(commands.Cog):
         if existing:
             await ctx.reply("Webhook already exists for that channel.")
             return
-        await channel.create_webhook(name="Kenku Disguise")
+        webhook = await channel.create_webhook(name="Kenku Disguise")
+        await self._mtk_remember_webhook(channel, webhook)
         await ctx.react_quietly("✅")
 
+    @commands.Cog.listener("on_webhooks_update")
+    async def mtk_webhooks_updated(self, channel: discord.abc.GuildChannel):
+        # someone added/removed/edited a webhook. this fires for our own hook being
+        # created too, so only forget it if it's really gone
+        webhook = self.mtk_webhooks.get(channel.id)
+        if webhook is None:
+            # nothing cached, or a miss that a new hook may have made stale
+            self.mtk_webhooks.pop(channel.id, None)
+            return
+        if not isinstance(channel, discord.TextChannel):
+            return
+        try:
+            hooks = await channel.webhooks()
+        except discord.Forbidden:
+            # sending through a deleted hook forgets it as well
+            return
+        if not any(hook.id == webhook.id for hook in hooks):
+            await self._mtk_forget_webhook(channel)
+
     async def _mtk_exclaim_webhook(
         self, channel: discord.TextChannel
     ) -> Optional[discord.Webhook]:
+        """
+        Find our webhook for a channel.
+
+        Checked in memory first, then in config, and only then by listing the channel's
+        webhooks through the API.
+        """
+        if channel.id in self.mtk_webhooks:
+            return self.mtk_webhooks[channel.id]
+
+        stored = await self.config.channel(channel).exclaim_webhook()
+        if stored and stored["id"] and stored["token"]:
+            webhook = discord.Webhook.partial(
+                stored["id"], stored["token"], client=self.bot
+            )
+            self.mtk_webhooks[channel.id] = webhook
+            return webhook
+
         try:
             for hook in await channel.webhooks():
                 assert hook.user
                 assert self.bot.user
                 if hook.user.id == self.bot.user.id:
+                    await self._mtk_remember_webhook(channel, hook)
                     return hook
         except discord.Forbidden:
-            return None
+            pass
+
+        # cache misses too, so channels without a hook don't list webhooks every time
+        self.mtk_webhooks[channel.id] = None
+        return None
+
+    async def _mtk_remember_webhook(
+        self, channel: discord.TextChannel, webhook: discord.Webhook
+    ):
+        self.mtk_webhooks[channel.id] = webhook
+        if webhook.token:
+            await self.config.channel(channel).exclaim_webhook.set(
+                {"id": webhook.id, "token": webhook.token}
+            )
 
-    async def _mtk_fetch(self, url):
-        async with self.httpsession.get(url) as response:
-            return await response.read()
+    async def _mtk_forget_webhook(self, channel: discord.abc.GuildChannel):
+        self.mtk_webhooks.pop(channel.id, None)
+        await self.config.channel(channel).exclaim_webhook.clear()
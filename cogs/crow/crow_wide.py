@@ -1,15 +1,20 @@
+import asyncio
 from io import BytesIO
 from math import floor
 from typing import Optional
 
 import discord
-from PIL import Image
 from redbot.core import commands
 
+from .metrics import metrics
+from .scheduler import JobScheduler
+
 WIDE_HEIGHT = 48
 
 
 class CrowWide(commands.Cog):
+    scheduler: JobScheduler
+
     @commands.command()
     async def wide(
         self,
@@ -33,7 +38,12 @@ class CrowWide(commands.Cog):
             height = floor(WIDE_HEIGHT / size)
 
         emoji_data = BytesIO(await emoji.read())
-        resized_file = self._resize_image(emoji_data, width, height)
+        # resizing is queued with other jobs and run off the event loop
+        resized_file = await self.scheduler.run(
+            "wide",
+            lambda: asyncio.to_thread(self._resize_image, emoji_data, width, height),
+            guild_id=ctx.guild.id if ctx.guild else None,
+        )
         file = discord.File(resized_file, filename=f"{emoji.name}_wide.png")
 
         if channel:
@@ -41,7 +51,10 @@ class CrowWide(commands.Cog):
         else:
             await ctx.send(file=file)
 
+    @metrics.timed("pillow.wide")
     def _resize_image(self, image_data: BytesIO, width: int, height: int):
+        from PIL import Image
+
         out = BytesIO()
         with Image.open(image_data) as img:
             resized = img.resize((width, height))
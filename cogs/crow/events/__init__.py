@@ -1,2 +1,18 @@
-from .manager import EventManager as EventManager
-from .manager import EventError as EventError
+from typing import TYPE_CHECKING
+
+from .errors import EventError as EventError
+
+# here rather than in .profiling, so the cog can read it without loading storage
+DEFAULT_SLOW_QUERY_MS = 100.0
+
+if TYPE_CHECKING:
+    from .manager import EventManager as EventManager
+
+
+def __getattr__(name):
+    # the storage stack is only imported once something needs it
+    if name == "EventManager":
+        from .manager import EventManager
+
+        return EventManager
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
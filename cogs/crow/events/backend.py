@@ -0,0 +1,92 @@
+from contextlib import contextmanager
+import os
+from pathlib import Path
+import sqlite3
+from typing import Iterator, Optional, Union
+
+from .profiling import ProfiledConnection
+
+DATABASE_NAME = "event_storage.sqlite"
+ARCHIVE_DIR = "event_archives"
+
+# seconds a connection waits for another connection's (or process's) write to finish
+BUSY_TIMEOUT = 30.0
+
+
+class SQLiteBackend:
+    """
+    Where event storage keeps its data, and every way it connects to it.
+
+    `EventStorage` and the manager only get connections from here, so this is the one
+    place that knows about files, journaling and locking. File databases use WAL
+    journaling, and writes take the write lock when their transaction starts, so
+    several bot processes can score into the same file: readers never wait, and
+    writers queue for up to `BUSY_TIMEOUT` instead of failing.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.in_memory = path == ":memory:"
+        self.path = ":memory:" if self.in_memory else os.path.join(path, DATABASE_NAME)
+        # closed seasons' raw points are moved out to one database per season
+        self.archive_dir: Optional[str] = (
+            None if self.in_memory else os.path.join(path, ARCHIVE_DIR)
+        )
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        The connection everything is scored through.
+
+        It's opened (and warmed up) on a worker thread, then used from the event loop;
+        never by two threads at once.
+        """
+        db = sqlite3.connect(
+            self.path,
+            factory=ProfiledConnection,
+            check_same_thread=False,
+            timeout=BUSY_TIMEOUT,
+        )
+        db.row_factory = sqlite3.Row
+        return db
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        A plain connection of its own, for migrations and backups, closed afterwards.
+
+        Turns on WAL journaling, which sticks to the file once set. A new file gets
+        incremental auto-vacuum first (see `Migrations.migrate`), since switching to WAL
+        writes its header and settles it.
+        """
+        db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+        try:
+            # does nothing once there are tables
+            db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            db.execute("PRAGMA journal_mode = WAL").fetchall()
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """A read-only connection, usable from a worker thread, closed afterwards."""
+
+        db = sqlite3.connect(
+            f"file:{self.path}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            timeout=BUSY_TIMEOUT,
+        )
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def begin(self, db: sqlite3.Connection):
+        """
+        Start a write transaction on `db`.
+
+        Taking the write lock up front means whatever is read inside can't be changed by
+        another process before it's written back, and a busy database is waited on
+        rather than failing halfway through.
+        """
+        db.execute("BEGIN IMMEDIATE")
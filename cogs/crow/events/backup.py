@@ -0,0 +1,193 @@
+from contextlib import closing
+import datetime
+import logging
+import os
+import shutil
+import sqlite3
+from typing import List, Optional
+
+from .schema import SCHEMA_VERSION
+
+log = logging.getLogger("red.kenku")
+
+# pages copied per step; the source is only locked while a step runs
+BACKUP_PAGES = 256
+BACKUP_PREFIX = "event_storage-"
+BACKUP_SUFFIX = ".sqlite"
+# archived seasons' databases are copied into a directory next to each backup
+ARCHIVES_SUFFIX = ".archives"
+
+
+class BackupError(Exception):
+    pass
+
+
+def create_backup(
+    source: sqlite3.Connection,
+    directory: str,
+    *,
+    keep: Optional[int],
+    archive_dir: Optional[str] = None,
+    pages: int = BACKUP_PAGES,
+) -> str:
+    """
+    Snapshot `source`, and the archived seasons in `archive_dir`, into a new, verified
+    backup in `directory`.
+
+    Uses SQLite's online backup API a few pages at a time, so writers on other
+    connections only wait for the current step. Afterwards, only the newest `keep`
+    backups are kept (all of them if `keep` is None). Returns the new backup's path.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stamp = f"{BACKUP_PREFIX}{datetime.datetime.now():%Y%m%d-%H%M%S}"
+    path = os.path.join(directory, stamp + BACKUP_SUFFIX)
+    count = 0
+    while os.path.exists(path):
+        # more than one a second; the suffix still sorts after the first
+        count += 1
+        path = os.path.join(directory, f"{stamp}_{count}{BACKUP_SUFFIX}")
+    temp = f"{path}.tmp"
+    temp_archives = f"{backup_archives(path)}.tmp"
+
+    _copy_database(source, temp, pages)
+    try:
+        # after the snapshot, so every season it has archived already has its file
+        if archive_dir and os.path.isdir(archive_dir):
+            os.makedirs(temp_archives)
+            for name in _archive_names(archive_dir):
+                with _connect_ro(os.path.join(archive_dir, name)) as archive:
+                    _copy_database(archive, os.path.join(temp_archives, name), pages)
+        verify_backup(temp, archives=temp_archives)
+    except (BackupError, OSError, sqlite3.Error):
+        os.remove(temp)
+        shutil.rmtree(temp_archives, ignore_errors=True)
+        raise
+    # the backup only shows up once its archives are in place
+    if os.path.isdir(temp_archives):
+        os.replace(temp_archives, backup_archives(path))
+    os.replace(temp, path)
+    log.info(f"Backed up event storage to {path}")
+
+    if keep is not None:
+        rotate_backups(directory, keep)
+    return path
+
+
+def verify_backup(path: str, *, archives: Optional[str] = None):
+    """
+    Raise `BackupError` unless `path` is an intact event database we can load, along
+    with its archived seasons (in `archives`, or the directory saved next to it).
+    """
+
+    if archives is None:
+        archives = backup_archives(path)
+    if os.path.isdir(archives):
+        for name in _archive_names(archives):
+            _verify_archive(os.path.join(archives, name))
+
+    try:
+        db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        raise BackupError(f"Can't open backup: {e}")
+    try:
+        result = db.execute("PRAGMA integrity_check").fetchall()
+        if result != [("ok",)]:
+            problems = ", ".join(row[0] for row in result[:5])
+            raise BackupError(f"Backup failed its integrity check: {problems}")
+
+        version = db.execute("PRAGMA user_version").fetchone()[0]
+        if not 0 < version <= SCHEMA_VERSION:
+            raise BackupError(f"Backup has an unknown schema version ({version}).")
+
+        tables = {
+            row[0]
+            for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        }
+        if not {"seasons", "event_points", "snowflakes"} <= tables:
+            raise BackupError("That isn't an event storage backup.")
+    except sqlite3.DatabaseError as e:
+        raise BackupError(f"Can't read backup: {e}")
+    finally:
+        db.close()
+
+
+def _verify_archive(path: str):
+    try:
+        with _connect_ro(path) as db:
+            result = db.execute("PRAGMA integrity_check").fetchall()
+            if result != [("ok",)]:
+                raise BackupError(
+                    f"Archive {os.path.basename(path)} failed its integrity check."
+                )
+            db.execute("SELECT COUNT(*) FROM event_points").fetchall()
+    except sqlite3.DatabaseError as e:
+        raise BackupError(f"Can't read archive {os.path.basename(path)}: {e}")
+
+
+def restore_archives(path: str, archive_dir: str):
+    """
+    Make `archive_dir` match the archived seasons saved with the backup at `path`.
+
+    Backups taken before archives were included leave `archive_dir` alone.
+    """
+    archives = backup_archives(path)
+    if not os.path.isdir(archives):
+        return
+    os.makedirs(archive_dir, exist_ok=True)
+    names = _archive_names(archives)
+    for name in names:
+        temp = os.path.join(archive_dir, f"{name}.tmp")
+        shutil.copyfile(os.path.join(archives, name), temp)
+        os.replace(temp, os.path.join(archive_dir, name))
+    # seasons archived since the backup are live again in the restored database
+    for name in set(_archive_names(archive_dir)) - set(names):
+        os.remove(os.path.join(archive_dir, name))
+
+
+def backup_archives(path: str) -> str:
+    """Where the archived seasons saved with the backup at `path` are kept."""
+
+    return path[: -len(BACKUP_SUFFIX)] + ARCHIVES_SUFFIX
+
+
+def _archive_names(directory: str) -> List[str]:
+    return sorted(
+        name
+        for name in os.listdir(directory)
+        if name.startswith("season_") and name.endswith(".sqlite")
+    )
+
+
+def _connect_ro(path: str) -> "closing[sqlite3.Connection]":
+    return closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True))
+
+
+def _copy_database(source: sqlite3.Connection, path: str, pages: int):
+    dest = sqlite3.connect(path)
+    try:
+        source.backup(dest, pages=pages)
+        # the copy inherits WAL journaling; a backup should be a single file
+        dest.execute("PRAGMA journal_mode = DELETE").fetchall()
+    finally:
+        dest.close()
+
+
+def list_backups(directory: str) -> List[str]:
+    """Backup file names, newest first."""
+
+    if not os.path.isdir(directory):
+        return []
+    names = [
+        name
+        for name in os.listdir(directory)
+        if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIX)
+    ]
+    return sorted(names, reverse=True)
+
+
+def rotate_backups(directory: str, keep: int):
+    for name in list_backups(directory)[keep:]:
+        path = os.path.join(directory, name)
+        os.remove(path)
+        shutil.rmtree(backup_archives(path), ignore_errors=True)
+        log.info(f"Removed old event storage backup {name}")
@@ -2,39 +2,446 @@ import asyncio
 import csv
 import datetime
 import logging
-from typing import IO, Optional, Union, cast
+import os
+from pathlib import Path
+import shutil
+import sqlite3
+import time
+from typing import (
+    IO,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+    cast,
+)
 
 import discord
 from discord.ext.commands.converter import UserConverter
 from redbot.core.data_manager import cog_data_path
 from redbot.core import commands
 
+from .backup import BackupError, verify_backup
+from .errors import EventError
+from .profiling import DEFAULT_SLOW_QUERY_MS, QueryProfiler
+from .reconcile import (
+    RECONCILE_CHUNK,
+    Drift,
+    ReconcileReport,
+    check_users,
+    find_orphans,
+)
+from .scoring import decay_hot_score
 from .storage import EventStorage
 from .types import Adjustment
 
 log = logging.getLogger("red.kenku")
 
+HOT_LEADERBOARD_SIZE = 100
 
-class EventError(Exception):
-    pass
+# guilds with their own database each get a directory in here, named by guild ID
+SHARD_DIR = "guilds"
+# seconds between checks for other processes' writes (see `watch_changes`)
+CHANGE_POLL_INTERVAL = 1.0
+
+T = TypeVar("T")
 
 
 class EventManager:
-    def __init__(self, cog: commands.Cog, *, storage_path: Optional[str] = None):
+    storage: EventStorage
+
+    def __init__(
+        self,
+        cog: commands.Cog,
+        *,
+        storage_path: Optional[str] = None,
+        slow_query_ms: Optional[float] = DEFAULT_SLOW_QUERY_MS,
+        background: bool = False,
+        shard_by_guild: bool = False,
+    ):
+        """
+        Open event storage. With `background=True`, nothing is opened until `start` is
+        awaited, and `storage` can't be used until `wait_ready` returns.
+
+        With `shard_by_guild=True`, guilds new to events each get their own database, so
+        one busy guild's writes don't hold up the others. Guilds already in the shared
+        `storage` stay there until moved with `move_guild`. Guilds with their own
+        database keep using it if sharding is turned off again.
+        """
         self.cog = cog
+        self.storage_path = (
+            storage_path if storage_path else cog_data_path(cog_instance=cog)
+        )
+        self.slow_query_ms = slow_query_ms
+        self.shard_by_guild = shard_by_guild
+        # shared by every database, so the slow query log covers them all
+        self.profiler = QueryProfiler()
+        self.shards: Dict[int, EventStorage] = {}
+        # guilds found in the shared database while sharding
+        self._unsharded: Set[int] = set()
+
+        self.ready = asyncio.Event()
+        self.startup_error: Optional[Exception] = None
+        if not background:
+            self.storage = self._open_storage(self.storage_path)
+            self.storage.initialize()
+            for guild_id in self._shard_ids():
+                self._open_shard(guild_id).initialize()
+            self.ready.set()
+
+    async def start(
+        self,
+        *,
+        progress: Optional[Callable[[str], None]] = None,
+        notify: Optional[Callable[[str], Awaitable]] = None,
+    ):
+        """
+        Open storage, migrate it, prime its caches and check its integrity, all on a
+        worker thread, so the first reaction doesn't pay for any of it.
+
+        `progress` gets migration progress (called from the worker thread); `notify` gets
+        anything the bot owner should hear about.
+        """
+        started = time.perf_counter()
+        try:
+            storage = await asyncio.to_thread(self._open_storage, self.storage_path)
+            pending = await asyncio.to_thread(storage.pending_migrations)
+            if pending and notify:
+                await notify(
+                    "⏳ Upgrading event storage to a new version. "
+                    + "Reactions will be counted once it's done; progress is in the log."
+                )
+            await asyncio.to_thread(storage.initialize, progress)
+            problems = await asyncio.to_thread(storage.warm_up)
+            for guild_id in self._shard_ids():
+                shard = await asyncio.to_thread(self._open_shard, guild_id)
+                await asyncio.to_thread(shard.initialize, progress)
+                problems += await asyncio.to_thread(shard.warm_up)
+            self.storage = storage
+        except Exception as e:
+            self.startup_error = e
+            log.exception("Event storage failed to start")
+            if notify:
+                await notify(
+                    "⚠️ Event storage failed to start, see the log for details."
+                )
+            return
+        finally:
+            self.ready.set()
+
+        log.info(f"Event storage ready in {time.perf_counter() - started:.2f}s")
+        if problems:
+            log.error("Event storage integrity check failed: " + "; ".join(problems))
+            if notify:
+                await notify(
+                    "⚠️ Event storage failed its integrity check. Consider restoring "
+                    + "a backup (`events backup`). Problems:\n"
+                    + "\n".join(problems[:10])
+                )
+        elif pending and notify:
+            await notify("🏁 Event storage upgrade complete.")
+
+    def storage_for(self, guild_id: int) -> EventStorage:
+        """The database a guild's events are kept in."""
+
+        shard = self.shards.get(guild_id)
+        if shard:
+            return shard
+        if not self.shard_by_guild or guild_id in self._unsharded:
+            return self.storage
+        if self.storage.get_seasons(guild_id=guild_id):
+            self._unsharded.add(guild_id)
+            return self.storage
+        shard = self._open_shard(guild_id)
+        shard.initialize()
+        return shard
+
+    def all_storage(self) -> List[EventStorage]:
+        """The shared database, then each guild's own."""
+
+        return [self.storage, *self.shards.values()]
+
+    def _open_storage(self, path: Union[str, Path]) -> EventStorage:
+        return EventStorage(
+            path, slow_query_ms=self.slow_query_ms, profiler=self.profiler
+        )
 
-        path = storage_path if storage_path else cog_data_path(cog_instance=cog)
-        self.storage = EventStorage(path)
-        self.storage.initialize()
+    def _open_shard(self, guild_id: int) -> EventStorage:
+        if self.storage_path == ":memory:":
+            shard = self._open_storage(":memory:")
+        else:
+            path = os.path.join(self.storage_path, SHARD_DIR, str(guild_id))
+            os.makedirs(path, exist_ok=True)
+            shard = self._open_storage(path)
+        self.shards[guild_id] = shard
+        return shard
+
+    def _shard_ids(self) -> List[int]:
+        if self.storage_path == ":memory:":
+            return []
+        directory = os.path.join(self.storage_path, SHARD_DIR)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(int(name) for name in os.listdir(directory) if name.isdigit())
+
+    async def move_guild(self, guild_id: int) -> int:
+        """
+        Move a guild from the shared database into its own. Returns the seasons moved.
+
+        Runs on a worker thread (for file storage) with storage paused, so nothing is
+        scored in the meantime.
+        """
+        return await self._paused(self._move_guild, guild_id)
+
+    def _move_guild(self, guild_id: int) -> int:
+        if guild_id in self.shards:
+            raise EventError("That guild already has its own database.")
+        shard = self._open_shard(guild_id)
+        shard.initialize()
+        self._unsharded.discard(guild_id)
+        try:
+            return self.storage.move_guild(guild_id=guild_id, dest=shard)
+        except (OSError, sqlite3.Error) as e:
+            log.exception(f"Moving guild {guild_id} to its own database failed")
+            if not shard.get_seasons(guild_id=guild_id):
+                # nothing was copied; keep using the shared database
+                self._drop_shard(guild_id)
+            raise EventError(f"Move failed: {e}")
+
+    def _drop_shard(self, guild_id: int):
+        shard = self.shards.pop(guild_id)
+        shard.db.close()
+        if not shard.backend.in_memory:
+            shutil.rmtree(os.path.dirname(shard.path))
+        self._unsharded.add(guild_id)
+
+    def check_changes(self) -> bool:
+        """
+        Pick up what other bot processes sharing these files have written.
+
+        Caches are dropped for each database another process has committed to, and
+        guilds another process moved into their own database are followed there.
+        Returns whether anything had changed.
+        """
+        if self.storage.backend.in_memory:
+            return False
 
-        self.active_task = None
+        changed = False
+        for shard in self.shards.values():
+            changed = shard.check_changes() or changed
+        if self.storage.check_changes():
+            changed = True
+            # guilds are only ever moved out of the shared database
+            self._unsharded.clear()
+            for guild_id in self._shard_ids():
+                if guild_id not in self.shards:
+                    self._open_shard(guild_id).initialize()
+        return changed
+
+    async def watch_changes(self, interval: float = CHANGE_POLL_INTERVAL):
+        """Run `check_changes` every `interval` seconds, for as long as storage is up."""
+
+        await self.ready.wait()
+        if self.startup_error:
+            return
+        while True:
+            await self.wait_ready()
+            try:
+                self.check_changes()
+            except sqlite3.Error:
+                log.exception("Checking event storage for changes failed")
+            await asyncio.sleep(interval)
+
+    def set_slow_query_threshold(self, threshold_ms: Optional[float]):
+        self.slow_query_ms = threshold_ms
+        for storage in self.all_storage():
+            storage.set_slow_query_threshold(threshold_ms)
+
+    async def backup(self, directory: str, *, keep: Optional[int]) -> str:
+        """
+        Snapshot storage into `directory` without blocking the event loop.
+
+        Guilds with their own database are backed up alongside, each in a directory
+        named by guild ID, and each directory keeps its newest `keep` backups (all of
+        them if `keep` is None). Returns the shared database's backup.
+        """
+        await self.wait_ready()
+        shards = [
+            (self.shard_backup_dir(directory, guild_id), shard)
+            for guild_id, shard in self.shards.items()
+        ]
+        try:
+            for shard_directory, shard in shards:
+                await self._backup(shard, shard_directory, keep)
+            return await self._backup(self.storage, directory, keep)
+        except (BackupError, OSError, sqlite3.Error) as e:
+            log.exception("Event storage backup failed")
+            raise EventError(f"Backup failed: {e}")
+
+    def shard_backup_dir(self, directory: str, guild_id: int) -> str:
+        """Where `backup` puts backups of a guild's own database."""
+
+        return os.path.join(directory, SHARD_DIR, str(guild_id))
+
+    async def _backup(
+        self, storage: EventStorage, directory: str, keep: Optional[int]
+    ) -> str:
+        if storage.backend.in_memory:
+            return storage.backup(directory, keep=keep)
+        return await asyncio.to_thread(storage.backup, directory, keep=keep)
+
+    async def restore(self, path: str, *, guild_id: Optional[int] = None):
+        """
+        Replace storage with a backup. The backup is verified first, then copied in on a
+        worker thread with storage paused.
+
+        With `guild_id`, that guild's own database is replaced instead.
+        """
+        await self.wait_ready()
+        if guild_id is None:
+            storage = self.storage
+        elif guild_id in self.shards:
+            storage = self.shards[guild_id]
+        else:
+            raise EventError("That guild doesn't have its own database.")
+        try:
+            await asyncio.to_thread(verify_backup, path)
+            await self._paused(storage.restore, path, verify=False)
+        except BackupError as e:
+            raise EventError(str(e))
+
+    async def reconcile(
+        self,
+        *,
+        chunk_size: int = RECONCILE_CHUNK,
+        pause: Optional[Callable[[], Awaitable]] = None,
+    ) -> ReconcileReport:
+        """
+        Check every running season's scores against their points, and fix what's off.
+
+        Checks run a chunk of users at a time on a worker thread (for file storage),
+        over their own connection, awaiting `pause()` in between. Fixes are made
+        afterwards, from the raw tables, so anything scored in the meantime is taken
+        into account.
+        """
+
+        await self.wait_ready()
+        report = ReconcileReport(seasons=0, users=0, drift=[], orphans=[])
+        try:
+            for storage in self.all_storage():
+                report = await self._reconcile(storage, chunk_size, pause, report)
+        except sqlite3.Error as e:
+            log.exception("Event score reconciliation failed")
+            raise EventError(f"Reconciliation failed: {e}")
+        if report.drift or report.orphans:
+            log.warning(report.summary())
+        else:
+            log.info(report.summary())
+        return report
 
-    def rescan_channel(
-        self, ctx: commands.Context, channel: discord.TextChannel, handler
+    async def _reconcile(
+        self,
+        storage: EventStorage,
+        chunk_size: int,
+        pause: Optional[Callable[[], Awaitable]],
+        report: ReconcileReport,
+    ) -> ReconcileReport:
+        seasons = storage.get_running_seasons()
+        report = report._replace(seasons=report.seasons + len(seasons))
+        in_memory = storage.backend.in_memory
+
+        async def run(fn, *args, **kwargs):
+            if in_memory:
+                return fn(*args, **kwargs)
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+        with storage.reader() as db:
+            db.row_factory = sqlite3.Row
+            for season in seasons:
+                season_id = season["id"]
+                drift: List[Drift] = []
+                users = [-1]
+                while users:
+                    found, users = await run(
+                        check_users,
+                        db,
+                        season_id=season_id,
+                        after=users[-1],
+                        limit=chunk_size,
+                    )
+                    drift += found
+                    report = report._replace(users=report.users + len(users))
+                    # let reactions in between chunks
+                    if pause:
+                        await pause()
+                    else:
+                        await asyncio.sleep(0)
+                orphans = await run(find_orphans, db, season_id=season_id)
+
+                # a move or restore may have started while checking
+                await self.wait_ready()
+                self._repair(storage, season_id, drift, orphans)
+                report.drift.extend((season_id, d) for d in drift)
+                report.orphans.extend((season_id, c) for c in orphans)
+        return report
+
+    def _repair(
+        self,
+        storage: EventStorage,
+        season_id: int,
+        drift: List[Drift],
+        orphans: List[int],
     ):
-        self.active_task = asyncio.create_task(self._rescan_task(ctx, channel, handler))
+        # one commit for the season, however much is fixed
+        with storage.transaction():
+            if orphans:
+                storage.remove_orphans(season_id=season_id, channel_ids=orphans)
+            days = {(d.channel_id, d.user_id) for d in drift if d.kind == "days"}
+            if days:
+                storage.rebuild_point_days(
+                    season_id=season_id,
+                    events=cast(Set[Tuple[int, int]], days),
+                )
+            scores = [d for d in drift if d.kind != "days"]
+            if scores or orphans:
+                # season totals are always rewritten; only the drifted events are
+                storage.recalculate_scores(
+                    season_id=season_id,
+                    channel_ids={
+                        d.channel_id for d in scores if d.channel_id is not None
+                    },
+                )
 
-    async def _rescan_task(
+    async def wait_ready(self):
+        """Wait for any migration, move or restore in progress to finish."""
+
+        # another one may have started before this got its turn
+        while not self.ready.is_set():
+            await self.ready.wait()
+        if self.startup_error:
+            raise EventError("Event storage couldn't be started, check the logs.")
+
+    async def _paused(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Run `fn` on a worker thread, holding everything else at `wait_ready` until it's
+        done, since it uses the same connections scoring does. In-memory databases
+        can't be shared with a thread, so they run it right away.
+        """
+        await self.wait_ready()
+        if self.storage.backend.in_memory:
+            return fn(*args, **kwargs)
+        self.ready.clear()
+        try:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        finally:
+            self.ready.set()
+
+    async def rescan_channel(
         self, ctx: commands.Context, channel: discord.TextChannel, handler
     ):
         async with ctx.typing():
@@ -61,47 +468,120 @@ class EventManager:
             await status_message.edit(
                 content=f"🏁 Scan complete. Checked {count} messages."
             )
-            self.active_task = None
 
-    def _default_season(self, guild_id):
-        # FUTURE: multi-season support; for now just use the first/default
-        seasons = self.storage.get_seasons(guild_id=guild_id)
-        if len(seasons) > 0:
-            return seasons[0]
-        else:
-            self.storage.configure_season(
-                name="Season 1", guild_id=guild_id, start_at=datetime.datetime.now()
-            )
-            seasons = self.storage.get_seasons(guild_id=guild_id)
-            return seasons[0]
+    def _active_season(self, guild_id) -> sqlite3.Row:
+        storage = self.storage_for(guild_id)
+        season = storage.get_active_season(guild_id=guild_id)
+        if season:
+            return season
+
+        # first use (or every season was ended); open a new one
+        count = len(storage.get_seasons(guild_id=guild_id))
+        storage.configure_season(
+            name=f"Season {count + 1}",
+            guild_id=guild_id,
+            start_at=datetime.datetime.now(),
+        )
+        return cast(sqlite3.Row, storage.get_active_season(guild_id=guild_id))
+
+    def get_seasons(self, guild_id: int):
+        storage = self.storage_for(guild_id)
+        return self._active_season(guild_id), storage.get_seasons(guild_id=guild_id)
+
+    def get_season(self, guild_id: int, name: str) -> sqlite3.Row:
+        storage = self.storage_for(guild_id)
+        for season in storage.get_seasons(guild_id=guild_id):
+            if season["name"].lower() == name.lower():
+                return season
+        raise EventError(f"There's no season called {name}.")
+
+    def start_season(self, guild_id: int, name: str):
+        """
+        End the active season and start a new one.
+
+        The old season's scores are archived and can no longer change. Channels need to be
+        set up again for the new season.
+        """
+        storage = self.storage_for(guild_id)
+        if any(
+            s["name"].lower() == name.lower()
+            for s in storage.get_seasons(guild_id=guild_id)
+        ):
+            raise EventError(f"There's already a season called {name}.")
+
+        now = datetime.datetime.now()
+        previous = self._active_season(guild_id)
+        with storage.transaction():
+            storage.end_season(season_id=previous["id"], end_at=now)
+            storage.configure_season(name=name, guild_id=guild_id, start_at=now)
+        return previous, self._active_season(guild_id)
+
+    def archive_season(self, guild_id: int, name: str):
+        """Move a finished season's raw points out of the live database."""
+
+        storage = self.storage_for(guild_id)
+        season = self.get_season(guild_id, name)
+        if season["end_at"] is None:
+            raise EventError(f"{season['name']} hasn't ended yet.")
+        if season["archived_at"] is not None:
+            raise EventError(f"{season['name']} is already archived.")
+        if storage.archive_dir is None:
+            raise EventError("Seasons can't be archived with in-memory storage.")
+
+        storage.archive_season(season_id=season["id"])
+        return season
 
     def configure_channel(self, channel: discord.TextChannel, point_value: int = 1):
-        season_id = self._default_season(channel.guild.id)["id"]
+        storage = self.storage_for(channel.guild.id)
+        season_id = self._active_season(channel.guild.id)["id"]
 
         if point_value == 0:
-            self.storage.remove_channel(season_id=season_id, channel_id=channel.id)
+            storage.remove_channel(season_id=season_id, channel_id=channel.id)
             return
 
-        self.storage.configure_channel(
-            season_id=season_id, channel_id=channel.id, point_value=point_value
-        )
-        self.storage.update_snowflake(id=channel.id, name=channel.name)
+        with storage.transaction():
+            storage.configure_channel(
+                season_id=season_id, channel_id=channel.id, point_value=point_value
+            )
+            storage.update_snowflake(id=channel.id, name=channel.name)
+
+    def configure_channels(
+        self, channels: List[discord.TextChannel], point_value: int = 1
+    ):
+        """Like `configure_channel` for several channels, re-scoring the season once."""
+
+        if not channels:
+            return
+        storage = self.storage_for(channels[0].guild.id)
+        season_id = self._active_season(channels[0].guild.id)["id"]
+        with storage.transaction():
+            storage.configure_channels(
+                season_id=season_id,
+                point_values={channel.id: point_value for channel in channels},
+            )
+            if point_value != 0:
+                for channel in channels:
+                    storage.update_snowflake(id=channel.id, name=channel.name)
 
     def clear_channel_points(self, channel: discord.TextChannel):
-        self.storage.clear_channel_points(channel_id=channel.id)
+        storage = self.storage_for(channel.guild.id)
+        season_id = self._active_season(channel.guild.id)["id"]
+        storage.clear_channel_points(season_id=season_id, channel_id=channel.id)
 
     def get_season_channels(self, ctx: commands.Context):
         assert ctx.guild
-        season = self._default_season(ctx.guild.id)
-        return season, self.storage.get_season_channels(season["id"])
+        storage = self.storage_for(ctx.guild.id)
+        season = self._active_season(ctx.guild.id)
+        return season, storage.get_season_channels(season["id"])
 
     def set_points(self, message: discord.Message, score: int):
         assert message.guild
-        season_id = self._default_season(message.guild.id)["id"]
+        storage = self.storage_for(message.guild.id)
+        season_id = self._active_season(message.guild.id)["id"]
 
         # always remove points if set to zero
         if score == 0:
-            self.storage.remove_point(
+            storage.remove_point(
                 message_id=message.id,
                 season_id=season_id,
                 channel_id=message.channel.id,
@@ -110,64 +590,172 @@ class EventManager:
             return
 
         # only record a point if the channel was configured
-        if not self.storage.get_channel(message.channel.id):
+        if not storage.get_channel(season_id=season_id, channel_id=message.channel.id):
             return False
-        self.storage.record_point(
-            message_id=message.id,
-            user_id=message.author.id,
-            season_id=season_id,
-            channel_id=message.channel.id,
-            sent_at=message.created_at,
-            multiplier=score,
-        )
-        self.storage.update_snowflake(
-            id=message.author.id,
-            name=f"{message.author.name}#{message.author.discriminator}",
-        )
-        self.storage.update_snowflake(
-            id=message.channel.id, name=cast(discord.TextChannel, message.channel).name
-        )
+        # the point, its scores and any new names go in one commit
+        with storage.transaction():
+            storage.record_point(
+                message_id=message.id,
+                user_id=message.author.id,
+                season_id=season_id,
+                channel_id=message.channel.id,
+                sent_at=message.created_at,
+                multiplier=score,
+            )
+            storage.update_snowflake(
+                id=message.author.id,
+                name=f"{message.author.name}#{message.author.discriminator}",
+            )
+            storage.update_snowflake(
+                id=message.channel.id,
+                name=cast(discord.TextChannel, message.channel).name,
+            )
         return True
 
     def user_info(self, user: discord.Member):
-        season = self._default_season(user.guild.id)
+        storage = self.storage_for(user.guild.id)
+        season = self._active_season(user.guild.id)
 
-        return season, self.storage.get_user_season_scores(
+        return season, storage.get_user_season_scores(
             season_id=season["id"], user_id=user.id
         )
 
+    def user_rank(
+        self,
+        user: Union[discord.User, discord.Member],
+        guild_id: int,
+        channel_id: Optional[int] = None,
+    ):
+        """Where a user stands this season, or in an event if `channel_id` is given."""
+
+        storage = self.storage_for(guild_id)
+        season_id = self._active_season(guild_id)["id"]
+        if channel_id is None:
+            return storage.get_season_rank(season_id=season_id, user_id=user.id)
+        return storage.get_event_rank(
+            season_id=season_id, channel_id=channel_id, user_id=user.id
+        )
+
+    def user_trend(
+        self,
+        user: Union[discord.User, discord.Member],
+        guild_id: int,
+        days: int,
+        channel_id: Optional[int] = None,
+    ) -> List[int]:
+        """Points scored on each of the last `days` days (UTC), oldest first."""
+
+        storage = self.storage_for(guild_id)
+        season_id = self._active_season(guild_id)["id"]
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        since = today - datetime.timedelta(days=days - 1)
+        history = storage.get_user_history(
+            season_id=season_id, user_id=user.id, since=since, channel_id=channel_id
+        )
+        by_day = {row["day"]: row["score"] for row in history}
+        return [
+            by_day.get((since + datetime.timedelta(days=i)).isoformat(), 0)
+            for i in range(days)
+        ]
+
+    def get_movers_leaderboard(
+        self, guild_id: int, days: int, channel_id: Optional[int] = None
+    ):
+        """Points scored in the last `days` days (UTC, including today), highest first."""
+
+        storage = self.storage_for(guild_id)
+        season = self._active_season(guild_id)
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        sorted_scores = storage.get_window_scores(
+            season_id=season["id"],
+            since=today - datetime.timedelta(days=days - 1),
+            channel_id=channel_id,
+        )
+        score_map = {s["user_id"]: s["score"] for s in sorted_scores}
+        return season, score_map
+
+    def get_hot_leaderboard(self, guild_id: int, channel_id: Optional[int] = None):
+        """
+        Scores with each point's value halving every `HOT_HALF_LIFE_DAYS`, highest first.
+
+        Only the top `HOT_LEADERBOARD_SIZE` are listed.
+        """
+
+        storage = self.storage_for(guild_id)
+        season = self._active_season(guild_id)
+        if channel_id is None:
+            hot_scores = storage.get_hot_scores(
+                season_id=season["id"], limit=HOT_LEADERBOARD_SIZE
+            )
+        else:
+            hot_scores = storage.get_event_hot_scores(
+                season_id=season["id"],
+                channel_id=channel_id,
+                limit=HOT_LEADERBOARD_SIZE,
+            )
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        score_map = {}
+        for row in hot_scores:
+            score = round(decay_hot_score(row["hot"], now))
+            if score == 0:
+                break
+            score_map[row["user_id"]] = score
+        return season, score_map
+
     def user_event_info(
         self, user: Union[discord.User, discord.Member], channel: discord.TextChannel
     ):
-        points = self.storage.get_event_points_for_user(
-            channel_id=channel.id, user_id=user.id
+        storage = self.storage_for(channel.guild.id)
+        season_id = self._active_season(channel.guild.id)["id"]
+        points = storage.get_event_points_for_user(
+            season_id=season_id, channel_id=channel.id, user_id=user.id
         )
-        adjustments = self.storage.get_event_adjustments_for_user(
-            channel_id=channel.id, user_id=user.id
+        adjustments = storage.get_event_adjustments_for_user(
+            season_id=season_id, channel_id=channel.id, user_id=user.id
         )
         return points, adjustments
 
-    def get_season_leaderboard(self, guild_id):
-        season = self._default_season(guild_id)
+    def get_season_leaderboard(self, guild_id, season_name: Optional[str] = None):
+        storage = self.storage_for(guild_id)
+        if season_name:
+            season = self.get_season(guild_id, season_name)
+        else:
+            season = self._active_season(guild_id)
 
-        sorted_scores = self.storage.get_season_scores(season_id=season["id"])
+        if season["end_at"] is None:
+            sorted_scores = storage.get_season_scores(season_id=season["id"])
+        else:
+            sorted_scores = storage.get_archived_season_scores(season_id=season["id"])
         score_map = {s["user_id"]: s["score"] for s in sorted_scores}
         return season, score_map
 
-    def get_event_leaderboard(self, channel_id):
-        if not self.storage.get_channel(channel_id):
+    def is_event_channel(self, guild_id: int, channel_id: int):
+        storage = self.storage_for(guild_id)
+        season_id = self._active_season(guild_id)["id"]
+        return bool(storage.get_channel(season_id=season_id, channel_id=channel_id))
+
+    def get_event_leaderboard(self, guild_id: int, channel_id: int):
+        storage = self.storage_for(guild_id)
+        season_id = self._active_season(guild_id)["id"]
+        if not storage.get_channel(season_id=season_id, channel_id=channel_id):
             return None
-        sorted_scores = self.storage.get_event_scores(channel_id=channel_id)
+        sorted_scores = storage.get_event_scores(
+            season_id=season_id, channel_id=channel_id
+        )
         score_map = {s["user_id"]: s["score"] for s in sorted_scores}
         return score_map
 
     def get_adjustments(
         self,
+        guild_id: int,
         channel_id: int,
         file: IO,
         sample_user: Union[discord.Member, discord.User],
     ):
-        rows = self.storage.get_adjustments(channel_id=channel_id)
+        storage = self.storage_for(guild_id)
+        season_id = self._active_season(guild_id)["id"]
+        rows = storage.get_adjustments(season_id=season_id, channel_id=channel_id)
         writer = csv.DictWriter(
             file,
             [
@@ -202,7 +790,8 @@ class EventManager:
         self, ctx: commands.Context, channel_id: int, file: IO
     ):
         assert ctx.guild
-        season = self._default_season(ctx.guild.id)
+        storage = self.storage_for(ctx.guild.id)
+        season = self._active_season(ctx.guild.id)
 
         reader = csv.DictReader(file)
         user_lookup = UserConverter()
@@ -223,7 +812,7 @@ class EventManager:
                     continue
                 user_id = user.id
             user = await ctx.bot.get_or_fetch_user(user_id)
-            self.storage.update_snowflake(
+            storage.update_snowflake(
                 id=user_id, name=f"{user.name}#{user.discriminator}"
             )
             adj = Adjustment(user_id=user_id, adjustment=adjustment, note=row["note"])
@@ -232,12 +821,13 @@ class EventManager:
         if errors:
             raise EventError("Couldn't figure out these users: " + ", ".join(errors))
 
-        self.storage.replace_adjustments(
+        storage.replace_adjustments(
             season_id=season["id"], channel_id=channel_id, adjustments=adjustments
         )
 
     def export_points(self, guild_id: int, file: IO):
-        rows = self.storage.export_points(guild_id=guild_id)
+        storage = self.storage_for(guild_id)
+        rows = storage.export_points(guild_id=guild_id)
         writer = csv.DictWriter(
             file,
             [
@@ -0,0 +1,180 @@
+from collections import deque
+import datetime
+import logging
+import sqlite3
+import time
+from typing import Deque, List, NamedTuple, Optional, cast
+
+from ..metrics import metrics
+from . import DEFAULT_SLOW_QUERY_MS as DEFAULT_SLOW_QUERY_MS
+
+log = logging.getLogger("red.kenku")
+
+SLOW_QUERY_LOG_SIZE = 50
+
+
+class SlowQuery(NamedTuple):
+    at: datetime.datetime
+    duration_ms: float
+    sql: str
+    params: str
+    rows: int
+    plan: List[str]
+
+    def format(self):
+        lines = [
+            f"-- {self.at.isoformat(timespec='seconds')} "
+            + f"{self.duration_ms:.1f}ms, {self.rows} rows, params {self.params}",
+            _dedent(self.sql),
+        ]
+        lines += [f"--   {step}" for step in self.plan]
+        return "\n".join(lines)
+
+
+class QueryProfiler:
+    """
+    Keeps the last few statements that took longer than `threshold_ms`.
+
+    Each one is stored with the shape of its parameters (types, not values), how many
+    rows it returned or changed, and its `EXPLAIN QUERY PLAN`.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float = DEFAULT_SLOW_QUERY_MS,
+        size: int = SLOW_QUERY_LOG_SIZE,
+    ):
+        self.threshold_ms = threshold_ms
+        self.queries: Deque[SlowQuery] = deque(maxlen=size)
+
+    def record(self, db: sqlite3.Connection, sql: str, params, elapsed, rows: int):
+        duration_ms = elapsed * 1000
+        if duration_ms < self.threshold_ms:
+            return
+
+        metrics.incr("storage.slow_queries")
+        self.queries.append(
+            SlowQuery(
+                at=datetime.datetime.now(),
+                duration_ms=duration_ms,
+                sql=sql,
+                params=_shape(params),
+                rows=rows,
+                plan=_query_plan(db, sql, params),
+            )
+        )
+        log.info(f"Slow query ({duration_ms:.1f}ms): {' '.join(sql.split())[:200]}")
+
+    def dump(self) -> str:
+        return "\n\n".join(query.format() for query in self.queries)
+
+    def clear(self):
+        self.queries.clear()
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """A connection that times `execute`/`executemany` when a profiler is attached."""
+
+    profiler: Optional[QueryProfiler] = None
+
+    def execute(self, sql, parameters=(), /):
+        if self.profiler is None:
+            return super().execute(sql, parameters)
+        cursor = self.cursor(ProfiledCursor)
+        return cursor.execute(sql, parameters)
+
+    def executemany(self, sql, parameters, /):
+        if self.profiler is None:
+            return super().executemany(sql, parameters)
+        cursor = self.cursor(ProfiledCursor)
+        return cursor.executemany(sql, parameters)
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """
+    Times a statement, including fetching its results.
+
+    Statements that return rows are only timed up to their first `fetchall`/`fetchone`,
+    which is how this codebase reads every result.
+    """
+
+    _sql: Optional[str] = None
+    _elapsed = 0.0
+
+    def execute(self, sql, parameters=(), /):
+        self._sql = sql
+        self._params = parameters
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        self._elapsed = time.perf_counter() - start
+        if self.description is None:
+            self._finish(self.rowcount)
+        return self
+
+    def executemany(self, sql, parameters, /):
+        self._sql = sql
+        self._params = None
+        start = time.perf_counter()
+        super().executemany(sql, parameters)
+        self._elapsed = time.perf_counter() - start
+        self._finish(self.rowcount)
+        return self
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._elapsed += time.perf_counter() - start
+        self._finish(len(rows))
+        return rows
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._elapsed += time.perf_counter() - start
+        self._finish(0 if row is None else 1)
+        return row
+
+    def _finish(self, rows: int):
+        db = cast(ProfiledConnection, self.connection)
+        if db.profiler is not None and self._sql is not None:
+            db.profiler.record(db, self._sql, self._params, self._elapsed, rows)
+        # only report a statement once
+        self._sql = None
+
+
+def _shape(params) -> str:
+    if params is None:
+        return "(executemany)"
+    if isinstance(params, dict):
+        return (
+            "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in params.items()) + "}"
+        )
+    return "(" + ", ".join(type(v).__name__ for v in params) + ")"
+
+
+def _query_plan(db: sqlite3.Connection, sql: str, params) -> List[str]:
+    if params is None or not sql.lstrip().upper().startswith(
+        ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+    ):
+        return []
+    try:
+        rows = sqlite3.Connection.execute(
+            db, f"EXPLAIN QUERY PLAN {sql}", params
+        ).fetchall()
+    except sqlite3.Error as e:
+        return [f"(no plan: {e})"]
+
+    # rows are (id, parent, notused, detail); indent each step under its parent
+    depths = {0: 0}
+    plan = []
+    for row in rows:
+        depth = depths.get(row[1], 0) + 1
+        depths[row[0]] = depth
+        plan.append("  " * (depth - 1) + row[3])
+    return plan
+
+
+def _dedent(sql: str) -> str:
+    lines = [line for line in sql.splitlines() if line.strip()]
+    indent = min((len(line) - len(line.lstrip()) for line in lines), default=0)
+    return "\n".join(line[indent:] for line in lines)
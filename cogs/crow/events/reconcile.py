@@ -0,0 +1,197 @@
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+# users checked per step; each step is a handful of indexed range reads
+RECONCILE_CHUNK = 500
+
+
+class Drift(NamedTuple):
+    # "season", "event" or "days"
+    kind: str
+    channel_id: Optional[int]
+    user_id: int
+
+
+class ReconcileReport(NamedTuple):
+    seasons: int
+    users: int
+    # (season ID, drift)
+    drift: List[Tuple[int, Drift]]
+    # (season ID, channel ID)
+    orphans: List[Tuple[int, int]]
+
+    def summary(self) -> str:
+        kinds = {"season": 0, "event": 0, "days": 0}
+        for _season_id, drift in self.drift:
+            kinds[drift.kind] += 1
+        return (
+            f"Checked {self.users} users in {self.seasons} seasons: "
+            + f"fixed {kinds['season']} season scores, {kinds['event']} event scores, "
+            + f"{kinds['days']} daily histories and {len(self.orphans)} removed events' "
+            + "leftover scores."
+        )
+
+
+def check_users(
+    db: sqlite3.Connection, *, season_id: int, after: int, limit: int
+) -> Tuple[List[Drift], List[int]]:
+    """
+    Compare the stored scores and daily rollups of the next `limit` users (by ID, after
+    `after`) against their points and adjustments.
+
+    Returns what doesn't match, and the users checked (none when done). Hot
+    scores aren't compared, since they depend on when they were calculated; they're
+    rewritten along with any score that's fixed.
+    """
+    with _snapshot(db):
+        return _check_users(db, season_id=season_id, after=after, limit=limit)
+
+
+def _check_users(
+    db: sqlite3.Connection, *, season_id: int, after: int, limit: int
+) -> Tuple[List[Drift], List[int]]:
+    params = dict(season_id=season_id, after=after, limit=limit)
+    users = [
+        row[0]
+        for row in db.execute(
+            """
+            SELECT user_id FROM event_points
+            WHERE season_id = :season_id AND user_id > :after
+            UNION
+            SELECT user_id FROM event_adjustments
+            WHERE season_id = :season_id AND user_id > :after
+            UNION
+            SELECT user_id FROM season_scores
+            WHERE season_id = :season_id AND user_id > :after
+            UNION
+            SELECT user_id FROM event_scores
+            WHERE season_id = :season_id AND user_id > :after
+            ORDER BY user_id
+            LIMIT :limit
+            """,
+            params,
+        ).fetchall()
+    ]
+    if not users:
+        return [], []
+    params.update(low=users[0], high=users[-1])
+
+    expected_events = {
+        (row[0], row[1]): row[2]
+        for row in db.execute(
+            """
+            SELECT channel_id, user_id, SUM(value)
+            FROM (
+                SELECT p.channel_id, user_id, point_value * multiplier AS value
+                FROM event_points p
+                JOIN event_channels c
+                    ON p.season_id = c.season_id AND p.channel_id = c.channel_id
+                WHERE p.season_id = :season_id AND user_id BETWEEN :low AND :high
+                UNION ALL
+                SELECT a.channel_id, user_id, adjustment AS value
+                FROM event_adjustments a
+                JOIN event_channels c
+                    ON a.season_id = c.season_id AND a.channel_id = c.channel_id
+                WHERE a.season_id = :season_id AND user_id BETWEEN :low AND :high
+            )
+            GROUP BY channel_id, user_id
+            """,
+            params,
+        ).fetchall()
+    }
+    actual_events = {
+        (row[0], row[1]): row[2]
+        for row in db.execute(
+            """
+            SELECT channel_id, user_id, score
+            FROM event_scores
+            INDEXED BY idx_user_event_scores
+            WHERE season_id = :season_id AND user_id BETWEEN :low AND :high
+            """,
+            params,
+        ).fetchall()
+    }
+    actual_seasons = dict(
+        db.execute(
+            """
+            SELECT user_id, score
+            FROM season_scores
+            WHERE season_id = :season_id AND user_id BETWEEN :low AND :high
+            """,
+            params,
+        ).fetchall()
+    )
+
+    drift = []
+    expected_seasons = {}
+    for (channel_id, user_id), score in expected_events.items():
+        expected_seasons[user_id] = expected_seasons.get(user_id, 0) + score
+    for key in expected_events.keys() | actual_events.keys():
+        if expected_events.get(key, 0) != actual_events.get(key, 0):
+            drift.append(Drift("event", *key))
+    for user_id in expected_seasons.keys() | actual_seasons.keys():
+        if expected_seasons.get(user_id, 0) != actual_seasons.get(user_id, 0):
+            drift.append(Drift("season", None, user_id))
+
+    expected_days = db.execute(
+        """
+        SELECT channel_id, user_id, date(sent_at), SUM(multiplier)
+        FROM event_points
+        WHERE season_id = :season_id AND user_id BETWEEN :low AND :high
+        GROUP BY channel_id, user_id, date(sent_at)
+        """,
+        params,
+    ).fetchall()
+    actual_days = db.execute(
+        """
+        SELECT channel_id, user_id, day, multiplier
+        FROM event_point_days
+        INDEXED BY idx_user_point_days
+        WHERE season_id = :season_id AND user_id BETWEEN :low AND :high
+            AND multiplier != 0
+        """,
+        params,
+    ).fetchall()
+    mismatched = set(map(tuple, expected_days)) ^ set(map(tuple, actual_days))
+    for channel_id, user_id in sorted({(row[0], row[1]) for row in mismatched}):
+        drift.append(Drift("days", channel_id, user_id))
+
+    return drift, users
+
+
+@contextmanager
+def _snapshot(db: sqlite3.Connection) -> Iterator[None]:
+    """
+    Read in one transaction, so a point committed between two reads doesn't look like
+    drift. A transaction already open is joined instead.
+    """
+    if db.in_transaction:
+        yield
+        return
+    db.execute("BEGIN")
+    try:
+        yield
+    finally:
+        db.execute("COMMIT")
+
+
+def find_orphans(db: sqlite3.Connection, *, season_id: int) -> List[int]:
+    """
+    Channels with scores left over after being removed.
+
+    Removed channels keep their points and daily history, so scores come straight back
+    if they're added again; leaderboards only read those through `event_channels`.
+    """
+
+    return [
+        row[0]
+        for row in db.execute(
+            """
+            SELECT channel_id FROM event_scores WHERE season_id = :season_id
+            EXCEPT
+            SELECT channel_id FROM event_channels WHERE season_id = :season_id
+            """,
+            dict(season_id=season_id),
+        ).fetchall()
+    ]
@@ -1,11 +1,113 @@
 import sqlite3
 import logging
-from typing import Optional
+import time
+from typing import Callable, List, Optional, Tuple
+
+from .scoring import Calculator
 
 log = logging.getLogger("red.kenku")
 
-SCHEMA_VERSION = 5
+# rows copied per statement when rebuilding a table
+MIGRATION_BATCH_SIZE = 5000
+# seconds between progress reports
+PROGRESS_INTERVAL = 5.0
+
+SCHEMA_VERSION = 10
 SCHEMA = """
+    CREATE TABLE IF NOT EXISTS seasons (
+        id           INTEGER PRIMARY KEY NOT NULL,
+        name         TEXT NOT NULL,
+        guild_id     INTEGER NOT NULL,
+        start_at     INTEGER NOT NULL,
+        end_at       INTEGER,
+        archived_at  INTEGER,
+
+        UNIQUE (name, guild_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS season_scores (
+        season_id  INTEGER NOT NULL,
+        user_id    INTEGER NOT NULL,
+        score      INTEGER NOT NULL,
+        hot        REAL,
+
+        PRIMARY KEY (season_id, user_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_high_scores ON season_scores (season_id, score DESC);
+
+    CREATE TABLE IF NOT EXISTS archived_season_scores (
+        season_id  INTEGER NOT NULL,
+        user_id    INTEGER NOT NULL,
+        score      INTEGER NOT NULL,
+
+        PRIMARY KEY (season_id, user_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_archived_high_scores ON archived_season_scores (season_id, score DESC);
+
+    CREATE TABLE IF NOT EXISTS event_channels (
+        season_id    INTEGER NOT NULL,
+        channel_id   INTEGER NOT NULL,
+        point_value  INTEGER DEFAULT 1,
+
+        PRIMARY KEY (season_id, channel_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS event_points (
+        message_id  INTEGER PRIMARY KEY NOT NULL,
+        season_id   INTEGER NOT NULL,
+        user_id     INTEGER NOT NULL,
+        channel_id  INTEGER NOT NULL,
+        sent_at     INTEGER NOT NULL,
+        multiplier  INTEGER NOT NULL DEFAULT 1
+    );
+    CREATE INDEX IF NOT EXISTS idx_season_user_points ON event_points (season_id, user_id);
+    CREATE INDEX IF NOT EXISTS idx_season_channel_points ON event_points (season_id, channel_id);
+
+    CREATE TABLE IF NOT EXISTS event_adjustments (
+        id          INTEGER PRIMARY KEY NOT NULL,
+        season_id   INTEGER NOT NULL,
+        channel_id  INTEGER NOT NULL,
+        user_id     INTEGER NOT NULL,
+        adjustment  INTEGER NOT NULL,
+        note        TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_season_adjustments ON event_adjustments (season_id, channel_id);
+
+    CREATE TABLE IF NOT EXISTS event_scores (
+        season_id   INTEGER NOT NULL,
+        channel_id  INTEGER NOT NULL,
+        user_id     INTEGER NOT NULL,
+        score       INTEGER NOT NULL,
+        hot         REAL,
+
+        PRIMARY KEY (season_id, channel_id, user_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_event_high_scores ON event_scores (season_id, channel_id, score DESC);
+    CREATE INDEX IF NOT EXISTS idx_user_event_scores ON event_scores (season_id, user_id);
+
+    -- daily totals of point multipliers (scaled by point_value when read), kept in
+    -- step with event_points and left in place when a season is archived
+    CREATE TABLE IF NOT EXISTS event_point_days (
+        season_id   INTEGER NOT NULL,
+        channel_id  INTEGER NOT NULL,
+        user_id     INTEGER NOT NULL,
+        day         TEXT NOT NULL,
+        multiplier  INTEGER NOT NULL,
+
+        PRIMARY KEY (season_id, channel_id, user_id, day)
+    );
+    CREATE INDEX IF NOT EXISTS idx_point_days ON event_point_days (season_id, day);
+    CREATE INDEX IF NOT EXISTS idx_user_point_days ON event_point_days (season_id, user_id, day);
+
+    CREATE TABLE IF NOT EXISTS snowflakes (
+        id         INTEGER PRIMARY KEY NOT NULL,
+        name       TEXT,
+        cached_at  INTEGER NOT NULL
+    );
+"""
+# SCHEMA as it was up to version 5, for the early migrations that only added tables.
+# the current SCHEMA indexes columns those versions don't have yet
+SCHEMA_5 = """
     CREATE TABLE IF NOT EXISTS seasons (
         id        INTEGER PRIMARY KEY NOT NULL,
         name      TEXT NOT NULL,
@@ -62,37 +164,209 @@ SCHEMA = """
         cached_at  INTEGER NOT NULL
     );
 """
-SCHEMA_3_TO_4 = """
-BEGIN TRANSACTION;
-    CREATE TEMPORARY TABLE event_points_bak (
+# Table rebuilds, as (table, new definition, copy). The old table is renamed to
+# "<table>_old" and `copy` is run over it in batches of rowids (:after, :until].
+REBUILD_3_TO_4 = [
+    (
+        "event_points",
+        """
+        CREATE TABLE event_points (
+            message_id  INTEGER PRIMARY KEY NOT NULL,
+            user_id     INTEGER NOT NULL,
+            channel_id  INTEGER NOT NULL,
+            sent_at     INTEGER NOT NULL
+        )
+        """,
+        """
+        INSERT INTO event_points
+        SELECT message_id, user_id, channel_id, sent_at
+        FROM event_points_old
+        WHERE rowid > :after AND rowid <= :until
+        """,
+    ),
+]
+SCHEMA_4_TO_5 = """
+ALTER TABLE event_points
+ADD COLUMN multiplier INTEGER NOT NULL DEFAULT 1;
+"""
+# points, adjustments and scores get their own season_id (taken from their channel), so
+# channels can be reused across seasons and season queries don't go through
+# event_channels. points whose channel is gone end up in season 0.
+REBUILD_5_TO_6 = [
+    (
+        "event_channels",
+        """
+        CREATE TABLE event_channels (
+            season_id    INTEGER NOT NULL,
+            channel_id   INTEGER NOT NULL,
+            point_value  INTEGER DEFAULT 1,
+
+            PRIMARY KEY (season_id, channel_id)
+        )
+        """,
+        """
+        INSERT INTO event_channels (season_id, channel_id, point_value)
+        SELECT season_id, channel_id, point_value
+        FROM event_channels_old
+        WHERE rowid > :after AND rowid <= :until
+        """,
+    ),
+    (
+        "event_points",
+        """
+        CREATE TABLE event_points (
+            message_id  INTEGER PRIMARY KEY NOT NULL,
+            season_id   INTEGER NOT NULL,
+            user_id     INTEGER NOT NULL,
+            channel_id  INTEGER NOT NULL,
+            sent_at     INTEGER NOT NULL,
+            multiplier  INTEGER NOT NULL DEFAULT 1
+        )
+        """,
+        """
+        INSERT INTO event_points
+            (message_id, season_id, user_id, channel_id, sent_at, multiplier)
+        SELECT message_id, COALESCE(c.season_id, 0), user_id, p.channel_id, sent_at,
+               multiplier
+        FROM event_points_old p
+        LEFT JOIN event_channels_old c ON p.channel_id = c.channel_id
+        WHERE p.rowid > :after AND p.rowid <= :until
+        """,
+    ),
+    (
+        "event_adjustments",
+        """
+        CREATE TABLE event_adjustments (
+            id          INTEGER PRIMARY KEY NOT NULL,
+            season_id   INTEGER NOT NULL,
+            channel_id  INTEGER NOT NULL,
+            user_id     INTEGER NOT NULL,
+            adjustment  INTEGER NOT NULL,
+            note        TEXT
+        )
+        """,
+        """
+        INSERT INTO event_adjustments
+            (id, season_id, channel_id, user_id, adjustment, note)
+        SELECT id, COALESCE(c.season_id, 0), a.channel_id, user_id, adjustment, note
+        FROM event_adjustments_old a
+        LEFT JOIN event_channels_old c ON a.channel_id = c.channel_id
+        WHERE a.rowid > :after AND a.rowid <= :until
+        """,
+    ),
+    (
+        "event_scores",
+        """
+        CREATE TABLE event_scores (
+            season_id   INTEGER NOT NULL,
+            channel_id  INTEGER NOT NULL,
+            user_id     INTEGER NOT NULL,
+            score       INTEGER NOT NULL,
+
+            PRIMARY KEY (season_id, channel_id, user_id)
+        )
+        """,
+        """
+        INSERT INTO event_scores (season_id, channel_id, user_id, score)
+        SELECT c.season_id, s.channel_id, user_id, score
+        FROM event_scores_old s
+        JOIN event_channels_old c ON s.channel_id = c.channel_id
+        WHERE s.rowid > :after AND s.rowid <= :until
+        """,
+    ),
+]
+SCHEMA_6_TO_7 = """
+ALTER TABLE seasons
+ADD COLUMN archived_at INTEGER;
+"""
+
+SCHEMA_7_TO_8 = """
+CREATE INDEX IF NOT EXISTS idx_user_event_scores ON event_scores (season_id, user_id);
+"""
+
+# event_point_days is created from SCHEMA, then filled from existing points
+BACKFILL_8_TO_9 = """
+INSERT INTO event_point_days (season_id, channel_id, user_id, day, multiplier)
+SELECT season_id, channel_id, user_id, date(sent_at), SUM(multiplier)
+FROM event_points
+GROUP BY season_id, channel_id, user_id, date(sent_at);
+"""
+
+# not part of SCHEMA, which earlier migrations run before the hot columns exist
+HOT_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_hot_scores ON season_scores (season_id, hot DESC);
+CREATE INDEX IF NOT EXISTS idx_event_hot_scores ON event_scores (season_id, channel_id, hot DESC);
+"""
+
+# hot scores are filled in by re-scoring each running season's events
+SCHEMA_9_TO_10 = (
+    """
+ALTER TABLE season_scores
+ADD COLUMN hot REAL;
+ALTER TABLE event_scores
+ADD COLUMN hot REAL;
+"""
+    + HOT_INDEXES
+)
+
+# raw data for a single archived season, in its own database (attached as "archive")
+ARCHIVE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS archive.event_channels (
+        season_id    INTEGER NOT NULL,
+        channel_id   INTEGER NOT NULL,
+        point_value  INTEGER DEFAULT 1,
+
+        PRIMARY KEY (season_id, channel_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS archive.event_points (
         message_id  INTEGER PRIMARY KEY NOT NULL,
+        season_id   INTEGER NOT NULL,
         user_id     INTEGER NOT NULL,
         channel_id  INTEGER NOT NULL,
-        sent_at     INTEGER NOT NULL
+        sent_at     INTEGER NOT NULL,
+        multiplier  INTEGER NOT NULL DEFAULT 1
     );
-    INSERT INTO event_points_bak SELECT message_id, user_id, channel_id, sent_at FROM event_points;
-    DROP TABLE event_points;
-    CREATE TABLE event_points (
-        message_id  INTEGER PRIMARY KEY NOT NULL,
-        user_id     INTEGER NOT NULL,
+
+    CREATE TABLE IF NOT EXISTS archive.event_adjustments (
+        id          INTEGER PRIMARY KEY NOT NULL,
+        season_id   INTEGER NOT NULL,
         channel_id  INTEGER NOT NULL,
-        sent_at     INTEGER NOT NULL
+        user_id     INTEGER NOT NULL,
+        adjustment  INTEGER NOT NULL,
+        note        TEXT
     );
-    INSERT INTO event_points SELECT message_id, user_id, channel_id, sent_at FROM event_points_bak;
-    DROP TABLE event_points_bak;
-COMMIT;
-VACUUM;
-"""
-SCHEMA_4_TO_5 = """
-ALTER TABLE event_points
-ADD COLUMN multiplier INTEGER NOT NULL DEFAULT 1;
 """
 
 
 class Migrations:
-    def __init__(self, db: sqlite3.Connection):
+    """
+    Brings an event database up to `SCHEMA_VERSION`.
+
+    Table rebuilds copy rows in batches inside a single transaction, calling `progress`
+    (from whatever thread is migrating) every few seconds with a status line.
+    """
+
+    def __init__(
+        self,
+        db: sqlite3.Connection,
+        *,
+        batch_size: int = MIGRATION_BATCH_SIZE,
+        progress: Optional[Callable[[str], None]] = None,
+    ):
         self.db = db
+        self.batch_size = batch_size
+        self.progress = progress
         self.current = self.version()
+        self._reported_at = 0.0
+
+    @property
+    def pending(self) -> int:
+        """How many migrations `migrate` will run (0 for a fresh database)."""
+
+        if self.current == 0:
+            return 0
+        return max(SCHEMA_VERSION - self.current, 0)
 
     def migrate(self):
         # up to date
@@ -101,8 +375,12 @@ class Migrations:
 
         # fresh database
         if self.current == 0:
-            # SCHEMA should always represent current state, so skip to that
+            # SCHEMA should always represent current state, so skip to that.
+            # incremental auto-vacuum can only be turned on before any tables exist; it
+            # lets space freed by archiving seasons be handed back cheaply
+            self.db.execute("PRAGMA auto_vacuum = INCREMENTAL")
             self.db.executescript(SCHEMA)
+            self.db.executescript(HOT_INDEXES)
             self.current = SCHEMA_VERSION
             self.version(assign=self.current)
             return
@@ -111,6 +389,7 @@ class Migrations:
         while self.current < SCHEMA_VERSION:
             target = self.current + 1
             log.warning(f"Processing event storage migration to version {target}")
+            self._report(f"Migrating event storage to version {target}", force=True)
             migration = getattr(self, f"to_{target}", None)
             if migration:
                 migration()
@@ -119,6 +398,58 @@ class Migrations:
 
         log.info("Migrations complete")
 
+    def _report(self, message: str, *, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._reported_at < PROGRESS_INTERVAL:
+            return
+        self._reported_at = now
+        log.info(message)
+        if self.progress:
+            self.progress(message)
+
+    def _rebuild(self, rebuilds: List[Tuple[str, str, str]]):
+        """
+        Recreate tables with a new definition, copying their rows across in batches.
+
+        Runs in one transaction; the old tables are dropped once everything is copied.
+        """
+        self.db.execute("BEGIN")
+        try:
+            for table, create, copy in rebuilds:
+                self.db.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+                self.db.execute(create)
+
+                total = self.db.execute(f"SELECT COUNT(*) FROM {table}_old").fetchone()[
+                    0
+                ]
+                copied = 0
+                after = -1
+                while True:
+                    until = self.db.execute(
+                        f"""
+                        SELECT MAX(rowid) FROM (
+                            SELECT rowid FROM {table}_old
+                            WHERE rowid > ?
+                            ORDER BY rowid
+                            LIMIT ?
+                        )
+                        """,
+                        (after, self.batch_size),
+                    ).fetchone()[0]
+                    if until is None:
+                        break
+                    self.db.execute(copy, dict(after=after, until=until))
+                    copied = min(copied + self.batch_size, total)
+                    after = until
+                    self._report(f"Copying {table}: {copied}/{total} rows")
+
+            for table, _create, _copy in rebuilds:
+                self.db.execute(f"DROP TABLE {table}_old")
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
     def version(self, *, assign: Optional[int] = None):
         if assign:
             # pragma does not support typical parameter substitution
@@ -128,17 +459,51 @@ class Migrations:
 
     # MIGRATIONS BELOW
     # If a migration doesn't modify a table/index (for example, it just creates new tables),
-    # then just execute SCHEMA. SCHEMA should always be safe to re-run.
+    # then just execute SCHEMA. SCHEMA should always be safe to re-run, but only once the
+    # columns it indexes exist (see SCHEMA_5).
     # Otherwise, apply the necessary SQL to migrate.
 
     def to_2(self):
-        self.db.executescript(SCHEMA)
+        self.db.executescript(SCHEMA_5)
 
     def to_3(self):
-        self.db.executescript(SCHEMA)
+        self.db.executescript(SCHEMA_5)
 
     def to_4(self):
-        self.db.executescript(SCHEMA_3_TO_4)
+        self._rebuild(REBUILD_3_TO_4)
 
     def to_5(self):
         self.db.executescript(SCHEMA_4_TO_5)
+
+    def to_6(self):
+        self._rebuild(REBUILD_5_TO_6)
+        # new tables and indexes
+        self.db.executescript(SCHEMA)
+
+    def to_7(self):
+        self.db.executescript(SCHEMA_6_TO_7)
+
+    def to_8(self):
+        self.db.executescript(SCHEMA_7_TO_8)
+
+    def to_9(self):
+        self.db.executescript(SCHEMA)
+        self.db.executescript(BACKFILL_8_TO_9)
+
+    def to_10(self):
+        self.db.executescript(SCHEMA_9_TO_10)
+        seasons = self.db.execute(
+            "SELECT id FROM seasons WHERE end_at IS NULL"
+        ).fetchall()
+
+        # the calculator reads columns by name
+        row_factory = self.db.row_factory
+        self.db.row_factory = sqlite3.Row
+        try:
+            calculator = Calculator(self.db)
+            for (season_id,) in seasons:
+                self._report(f"Re-scoring season {season_id}")
+                calculator.recalculate_season_scores(season_id=season_id)
+            self.db.commit()
+        finally:
+            self.db.row_factory = row_factory
@@ -1,28 +1,89 @@
+import datetime
+import math
 import sqlite3
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from ..metrics import metrics
+from .types import Rank
+
+# how quickly points stop counting towards "hot" scores
+HOT_HALF_LIFE_DAYS = 7
+HOT_HALF_LIFE = HOT_HALF_LIFE_DAYS * 24 * 60 * 60
+
+
+def hot_weight(at: float, now: float) -> float:
+    """How much a point scored at timestamp `at` is worth at `now`."""
+
+    return 2 ** ((at - now) / HOT_HALF_LIFE)
+
+
+def hot_score(total: float, now: float) -> Optional[float]:
+    """
+    The stored form of a hot score: `total`, weighted at `now`, as log2 of its value
+    back at the Unix epoch. None when there's nothing to count.
+
+    Decaying everything by the same factor doesn't change its order, so this only
+    needs updating when points change, and its index sorts like the decayed scores
+    would. Kept as a log so it never overflows.
+    """
+    if total <= 0:
+        return None
+    return math.log2(total) + now / HOT_HALF_LIFE
+
+
+def decay_hot_score(hot: Optional[float], now: datetime.datetime) -> float:
+    """A stored hot score, as points at `now`."""
+
+    if hot is None:
+        return 0.0
+    return 2 ** (hot - now.timestamp() / HOT_HALF_LIFE)
+
+
+# sent_at as a Unix timestamp, worked out by SQLite rather than parsed per row
+SENT_TS = "(julianday(sent_at) - 2440587.5) * 86400.0 AS sent_ts"
 
 
 class Calculator:
     def __init__(self, db: sqlite3.Connection):
         self.db = db
 
+    @metrics.timed("scoring.recalculate_event_scores")
     def recalculate_event_scores(self, *, season_id: int, channel_id: int):
         """
         Re-compute scores for an entire event, and update that event and season.
 
         Useful if an event/channel's configuration was modified. If only a user's score
-        needs to be updated, use `recalculate_user_scores`.
+        needs to be updated, use `recalculate_user_scores`. If several events changed,
+        use `recalculate_season_scores`.
+        """
+        self.recalculate_season_scores(season_id=season_id, channel_ids=[channel_id])
+
+    @metrics.timed("scoring.recalculate_season_scores")
+    def recalculate_season_scores(
+        self, *, season_id: int, channel_ids: Optional[Iterable[int]] = None
+    ):
+        """
+        Re-compute season scores, and the scores of each event in `channel_ids` (or all
+        of them), from a single read of the season's points and adjustments.
+
+        Written in one transaction, however many events are updated. Not committed.
         """
-        season_totals = {}
-        event_totals = {}
+        events = None if channel_ids is None else set(channel_ids)
+        season_totals: Dict[int, int] = {}
+        event_totals: Dict[Tuple[int, int], int] = {}
+        season_hot: Dict[int, float] = {}
+        event_hot: Dict[Tuple[int, int], float] = {}
+        now = time.time()
 
         # tally up all points
         points = self.db.execute(
-            """
-            SELECT message_id, user_id, p.channel_id, point_value, multiplier
+            f"""
+            SELECT user_id, p.channel_id, point_value, multiplier, {SENT_TS}
             FROM event_points p
             JOIN event_channels c
-                ON p.channel_id = c.channel_id
-            WHERE c.season_id = ?
+                ON p.season_id = c.season_id AND p.channel_id = c.channel_id
+            WHERE p.season_id = ?
             """,
             (season_id,),
         ).fetchall()
@@ -30,17 +91,16 @@ class Calculator:
         for point in points:
             # tally all for season total
             user_id = point["user_id"]
-            current_season_points = season_totals.get(user_id, 0)
-            season_totals[user_id] = (
-                current_season_points + point["point_value"] * point["multiplier"]
-            )
+            value = point["point_value"] * point["multiplier"]
+            hot = value * hot_weight(point["sent_ts"], now)
+            season_totals[user_id] = season_totals.get(user_id, 0) + value
+            season_hot[user_id] = season_hot.get(user_id, 0) + hot
 
-            # tally channel total if matching
-            if point["channel_id"] == channel_id:
-                current_event_points = event_totals.get(user_id, 0)
-                event_totals[user_id] = (
-                    current_event_points + point["point_value"] * point["multiplier"]
-                )
+            # tally event totals for the events being updated
+            if events is None or point["channel_id"] in events:
+                key = (point["channel_id"], user_id)
+                event_totals[key] = event_totals.get(key, 0) + value
+                event_hot[key] = event_hot.get(key, 0) + hot
 
         # and then similarly tally up all adjustments
         adjustments = self.db.execute(
@@ -48,33 +108,30 @@ class Calculator:
             SELECT user_id, a.channel_id, adjustment
             FROM event_adjustments a
             JOIN event_channels c
-                ON a.channel_id = c.channel_id
-            WHERE c.season_id = ?
+                ON a.season_id = c.season_id AND a.channel_id = c.channel_id
+            WHERE a.season_id = ?
             """,
             (season_id,),
         ).fetchall()
 
         for adj in adjustments:
-            # tally all for season total
             user_id = adj["user_id"]
-            current_season_points = season_totals.get(user_id, 0)
-            season_totals[user_id] = current_season_points + adj["adjustment"]
-
-            # tally channel total if matching
-            if adj["channel_id"] == channel_id:
-                current_event_points = event_totals.get(user_id, 0)
-                event_totals[user_id] = current_event_points + adj["adjustment"]
+            season_totals[user_id] = season_totals.get(user_id, 0) + adj["adjustment"]
+            if events is None or adj["channel_id"] in events:
+                key = (adj["channel_id"], user_id)
+                event_totals[key] = event_totals.get(key, 0) + adj["adjustment"]
 
         def season_score_generator():
             for user_id, score in season_totals.items():
-                yield (season_id, user_id, score)
+                hot = hot_score(season_hot.get(user_id, 0), now)
+                yield (season_id, user_id, score, hot)
 
         def event_score_generator():
-            for user_id, score in event_totals.items():
-                yield (channel_id, user_id, score)
+            for (channel_id, user_id), score in event_totals.items():
+                hot = hot_score(event_hot.get((channel_id, user_id), 0), now)
+                yield (season_id, channel_id, user_id, score, hot)
 
         # clear the season + event scores out first
-        # (this is transactional; commit is after insertion)
         self.db.execute(
             """
             DELETE FROM season_scores
@@ -82,34 +139,44 @@ class Calculator:
             """,
             (season_id,),
         )
-        self.db.execute(
-            """
-            DELETE FROM event_scores
-            WHERE channel_id = ?
-            """,
-            (channel_id,),
-        )
+        if events is None:
+            self.db.execute(
+                """
+                DELETE FROM event_scores
+                WHERE season_id = ?
+                """,
+                (season_id,),
+            )
+        else:
+            self.db.executemany(
+                """
+                DELETE FROM event_scores
+                WHERE season_id = ? AND channel_id = ?
+                """,
+                ((season_id, channel_id) for channel_id in events),
+            )
         self.db.executemany(
             """
-            INSERT INTO season_scores (season_id, user_id, score)
-            VALUES (?, ?, ?)
+            INSERT INTO season_scores (season_id, user_id, score, hot)
+            VALUES (?, ?, ?, ?)
             """,
             season_score_generator(),
         )
         self.db.executemany(
             """
-            INSERT INTO event_scores (channel_id, user_id, score)
-            VALUES (?, ?, ?)
+            INSERT INTO event_scores (season_id, channel_id, user_id, score, hot)
+            VALUES (?, ?, ?, ?, ?)
             """,
             event_score_generator(),
         )
-        self.db.commit()
 
+    @metrics.timed("scoring.recalculate_user_scores")
     def recalculate_user_scores(self, *, season_id: int, channel_id: int, user_id: int):
         """
         Insert or update the event and season score for a user.
 
         This re-calculates scores for the specified event/channel as well as the season.
+        Not committed.
         """
         season_points = self.get_season_points_for_user(
             season_id=season_id, user_id=user_id
@@ -122,59 +189,86 @@ class Calculator:
         ) + sum(a["adjustment"] for a in season_adj)
 
         event_points = self.get_event_points_for_user(
-            channel_id=channel_id, user_id=user_id
+            season_id=season_id, channel_id=channel_id, user_id=user_id
         )
         event_adj = self.get_event_adjustments_for_user(
-            channel_id=channel_id, user_id=user_id
+            season_id=season_id, channel_id=channel_id, user_id=user_id
         )
         event_score = sum(
             p["point_value"] * p["multiplier"] for p in event_points
         ) + sum(a["adjustment"] for a in event_adj)
 
+        # adjustments aren't dated, so hot scores only count points
+        now = time.time()
+        season_hot = hot_score(
+            sum(
+                p["point_value"] * p["multiplier"] * hot_weight(p["sent_ts"], now)
+                for p in season_points
+            ),
+            now,
+        )
+        event_hot = hot_score(
+            sum(
+                p["point_value"] * p["multiplier"] * hot_weight(p["sent_ts"], now)
+                for p in event_points
+            ),
+            now,
+        )
+
         self.db.execute(
             """
-            INSERT INTO season_scores (season_id, user_id, score)
-            VALUES (:season_id, :user_id, :score)
-            ON CONFLICT (season_id, user_id) DO UPDATE SET score=:score
+            INSERT INTO season_scores (season_id, user_id, score, hot)
+            VALUES (:season_id, :user_id, :score, :hot)
+            ON CONFLICT (season_id, user_id) DO UPDATE SET score=:score, hot=:hot
             """,
-            dict(season_id=season_id, user_id=user_id, score=season_score),
+            dict(
+                season_id=season_id, user_id=user_id, score=season_score, hot=season_hot
+            ),
         )
         self.db.execute(
             """
-            INSERT INTO event_scores (channel_id, user_id, score)
-            VALUES (:channel_id, :user_id, :score)
-            ON CONFLICT (channel_id, user_id) DO UPDATE SET score=:score
+            INSERT INTO event_scores (season_id, channel_id, user_id, score, hot)
+            VALUES (:season_id, :channel_id, :user_id, :score, :hot)
+            ON CONFLICT (season_id, channel_id, user_id)
+                DO UPDATE SET score=:score, hot=:hot
             """,
-            dict(channel_id=channel_id, user_id=user_id, score=event_score),
+            dict(
+                season_id=season_id,
+                channel_id=channel_id,
+                user_id=user_id,
+                score=event_score,
+                hot=event_hot,
+            ),
         )
-        self.db.commit()
 
     def get_season_points_for_user(self, *, season_id: int, user_id: int):
         """Fetch all of the points for a user this season."""
 
         return self.db.execute(
-            """
-            SELECT message_id, p.channel_id, point_value, multiplier, sent_at
+            f"""
+            SELECT message_id, p.channel_id, point_value, multiplier, sent_at, {SENT_TS}
             FROM event_points p
             JOIN event_channels c
-                ON p.channel_id = c.channel_id
-            WHERE user_id = ? AND c.season_id = ?
+                ON p.season_id = c.season_id AND p.channel_id = c.channel_id
+            WHERE p.season_id = ? AND user_id = ?
             """,
-            (user_id, season_id),
+            (season_id, user_id),
         ).fetchall()
 
-    def get_event_points_for_user(self, *, channel_id: int, user_id: int):
+    def get_event_points_for_user(
+        self, *, season_id: int, channel_id: int, user_id: int
+    ):
         """Fetch all of the points for a user this event/channel."""
 
         return self.db.execute(
-            """
-            SELECT message_id, p.channel_id, point_value, multiplier, sent_at
+            f"""
+            SELECT message_id, p.channel_id, point_value, multiplier, sent_at, {SENT_TS}
             FROM event_points p
             JOIN event_channels c
-                ON p.channel_id = c.channel_id
-            WHERE user_id = ? AND c.channel_id = ?
+                ON p.season_id = c.season_id AND p.channel_id = c.channel_id
+            WHERE p.season_id = ? AND p.channel_id = ? AND user_id = ?
             """,
-            (user_id, channel_id),
+            (season_id, channel_id, user_id),
         ).fetchall()
 
     def get_season_adjustments_for_user(self, *, season_id: int, user_id: int):
@@ -185,22 +279,24 @@ class Calculator:
             SELECT a.channel_id, adjustment
             FROM event_adjustments a
             JOIN event_channels c
-                ON a.channel_id = c.channel_id
-            WHERE user_id = ? AND c.season_id = ?
+                ON a.season_id = c.season_id AND a.channel_id = c.channel_id
+            WHERE a.season_id = ? AND user_id = ?
             """,
-            (user_id, season_id),
+            (season_id, user_id),
         ).fetchall()
 
-    def get_event_adjustments_for_user(self, *, channel_id: int, user_id: int):
+    def get_event_adjustments_for_user(
+        self, *, season_id: int, channel_id: int, user_id: int
+    ):
         """Fetch all of the adjustments for a user for this event/channel."""
 
         return self.db.execute(
             """
             SELECT channel_id, adjustment
             FROM event_adjustments
-            WHERE user_id = ? AND channel_id = ?
+            WHERE season_id = ? AND channel_id = ? AND user_id = ?
             """,
-            (user_id, channel_id),
+            (season_id, channel_id, user_id),
         ).fetchall()
 
     def get_season_scores(self, *, season_id: int):
@@ -215,27 +311,216 @@ class Calculator:
             (season_id,),
         ).fetchall()
 
-    def get_event_scores(self, *, channel_id: int):
+    def get_event_scores(self, *, season_id: int, channel_id: int):
         return self.db.execute(
             """
             SELECT user_id, score
             FROM event_scores
             INDEXED BY idx_event_high_scores
-            WHERE channel_id = ?
+            WHERE season_id = ? AND channel_id = ?
             ORDER BY score DESC
             """,
-            (channel_id,),
+            (season_id, channel_id),
+        ).fetchall()
+
+    def get_hot_scores(self, *, season_id: int, limit: int):
+        return self.db.execute(
+            """
+            SELECT user_id, hot
+            FROM season_scores
+            INDEXED BY idx_hot_scores
+            WHERE season_id = ? AND hot IS NOT NULL
+            ORDER BY hot DESC
+            LIMIT ?
+            """,
+            (season_id, limit),
+        ).fetchall()
+
+    def get_event_hot_scores(self, *, season_id: int, channel_id: int, limit: int):
+        return self.db.execute(
+            """
+            SELECT user_id, hot
+            FROM event_scores
+            INDEXED BY idx_event_hot_scores
+            WHERE season_id = ? AND channel_id = ? AND hot IS NOT NULL
+            ORDER BY hot DESC
+            LIMIT ?
+            """,
+            (season_id, channel_id, limit),
         ).fetchall()
 
     def get_user_season_scores(self, *, season_id: int, user_id: int):
         return self.db.execute(
             """
-            SELECT s.channel_id, score
-            FROM event_scores s
-            JOIN event_channels c
-                ON s.channel_id = c.channel_id
-            WHERE c.season_id = ? AND s.user_id = ?
-            ORDER BY s.channel_id DESC
+            SELECT channel_id, score
+            FROM event_scores
+            INDEXED BY idx_user_event_scores
+            WHERE season_id = ? AND user_id = ?
+            ORDER BY channel_id DESC
             """,
             (season_id, user_id),
         ).fetchall()
+
+    def get_user_history(
+        self,
+        *,
+        season_id: int,
+        user_id: int,
+        since: datetime.date,
+        channel_id: Optional[int] = None,
+    ):
+        """A user's points per day since `since`. Days without points are skipped."""
+
+        return self.db.execute(
+            """
+            SELECT day, SUM(d.multiplier * c.point_value) AS score
+            FROM event_point_days d
+            INDEXED BY idx_user_point_days
+            JOIN event_channels c
+                ON d.season_id = c.season_id AND d.channel_id = c.channel_id
+            WHERE d.season_id = :season_id AND user_id = :user_id AND day >= :since
+                AND (:channel_id IS NULL OR d.channel_id = :channel_id)
+            GROUP BY day
+            ORDER BY day
+            """,
+            dict(
+                season_id=season_id,
+                user_id=user_id,
+                since=since.isoformat(),
+                channel_id=channel_id,
+            ),
+        ).fetchall()
+
+    def get_window_scores(
+        self, *, season_id: int, since: datetime.date, channel_id: Optional[int] = None
+    ):
+        """
+        Points scored since `since` per user, highest first.
+
+        Adjustments aren't dated, so they're left out.
+        """
+
+        return self.db.execute(
+            """
+            SELECT user_id, SUM(d.multiplier * c.point_value) AS score
+            FROM event_point_days d
+            INDEXED BY idx_point_days
+            JOIN event_channels c
+                ON d.season_id = c.season_id AND d.channel_id = c.channel_id
+            WHERE d.season_id = :season_id AND day >= :since
+                AND (:channel_id IS NULL OR d.channel_id = :channel_id)
+            GROUP BY user_id
+            HAVING score != 0
+            ORDER BY score DESC
+            """,
+            dict(season_id=season_id, since=since.isoformat(), channel_id=channel_id),
+        ).fetchall()
+
+    def get_season_rank(
+        self, *, season_id: int, user_id: int, neighbors: int = 1
+    ) -> Optional[Rank]:
+        return self._rank(
+            "season_scores",
+            "idx_high_scores",
+            "season_id = :season_id",
+            dict(season_id=season_id, user_id=user_id, neighbors=neighbors),
+        )
+
+    def get_event_rank(
+        self, *, season_id: int, channel_id: int, user_id: int, neighbors: int = 1
+    ) -> Optional[Rank]:
+        return self._rank(
+            "event_scores",
+            "idx_event_high_scores",
+            "season_id = :season_id AND channel_id = :channel_id",
+            dict(
+                season_id=season_id,
+                channel_id=channel_id,
+                user_id=user_id,
+                neighbors=neighbors,
+            ),
+        )
+
+    def _rank(self, table: str, index: str, where: str, params: dict):
+        """
+        A user's rank, and the `neighbors` users either side of them.
+
+        Everything is read from the high score index: the rank counts only the index
+        entries ahead of the user, so nobody has to load the whole leaderboard.
+        """
+        row = self.db.execute(
+            f"""
+            SELECT score FROM {table}
+            WHERE {where} AND user_id = :user_id
+            """,
+            params,
+        ).fetchall()
+        if not row:
+            return None
+        params = dict(params, score=row[0]["score"])
+
+        ahead = self.db.execute(
+            f"""
+            SELECT COUNT(*) FROM {table}
+            INDEXED BY {index}
+            WHERE {where} AND score > :score
+            """,
+            params,
+        ).fetchall()[0][0]
+        above = self.db.execute(
+            f"""
+            SELECT user_id, score FROM {table}
+            INDEXED BY {index}
+            WHERE {where} AND score > :score
+            ORDER BY score ASC
+            LIMIT :neighbors
+            """,
+            params,
+        ).fetchall()
+        below = self.db.execute(
+            f"""
+            SELECT user_id, score FROM {table}
+            INDEXED BY {index}
+            WHERE {where} AND score < :score
+            ORDER BY score DESC
+            LIMIT :neighbors
+            """,
+            params,
+        ).fetchall()
+        return Rank(rank=ahead + 1, score=params["score"], above=above, below=below)
+
+    def get_archived_season_scores(self, *, season_id: int):
+        return self.db.execute(
+            """
+            SELECT user_id, score
+            FROM archived_season_scores
+            INDEXED BY idx_archived_high_scores
+            WHERE season_id = ?
+            ORDER BY score DESC
+            """,
+            (season_id,),
+        ).fetchall()
+
+    def archive_season_scores(self, *, season_id: int):
+        """
+        Freeze a finished season's totals into `archived_season_scores`.
+
+        The season's rows are moved out of `season_scores`, which then only holds
+        seasons that are still being scored. Not committed.
+        """
+        self.db.execute(
+            """
+            INSERT OR REPLACE INTO archived_season_scores (season_id, user_id, score)
+            SELECT season_id, user_id, score
+            FROM season_scores
+            WHERE season_id = ?
+            """,
+            (season_id,),
+        )
+        self.db.execute(
+            """
+            DELETE FROM season_scores
+            WHERE season_id = ?
+            """,
+            (season_id,),
+        )
@@ -1,44 +1,300 @@
+from contextlib import contextmanager
 import datetime
 import logging
 import os
 from pathlib import Path
 import sqlite3
-from typing import List, Optional, Union
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union, cast
 
-from .schema import Migrations
+from ..metrics import metrics
+from .profiling import DEFAULT_SLOW_QUERY_MS, ProfiledConnection, QueryProfiler
+from .backend import SQLiteBackend
+from .backup import create_backup, restore_archives, verify_backup
+from .schema import ARCHIVE_SCHEMA, Migrations
 from .scoring import Calculator
 from .types import Adjustment
 
 log = logging.getLogger("red.kenku")
 
+# tables moved along with a guild's seasons (see `move_guild`)
+SEASON_TABLES = (
+    "event_channels",
+    "event_points",
+    "event_adjustments",
+    "season_scores",
+    "event_scores",
+    "archived_season_scores",
+    "event_point_days",
+)
+
+EXPORT_POINTS = """
+    SELECT message_id,
+           p.season_id, s.name season_name,
+           p.channel_id, sc.name channel_name,
+           p.user_id, su.name user_name,
+           point_value, sent_at
+    FROM {schema}.event_points p
+    LEFT JOIN {schema}.event_channels c
+        ON p.season_id = c.season_id AND p.channel_id = c.channel_id
+    LEFT JOIN main.seasons s
+        ON p.season_id = s.id
+    LEFT OUTER JOIN main.snowflakes sc
+        ON p.channel_id = sc.id
+    LEFT OUTER JOIN main.snowflakes su
+        ON p.user_id = su.id
+    WHERE s.guild_id = ?
+"""
+
 
 class EventStorage:
-    def __init__(self, path: Union[str, Path]):
-        self.path = (
-            path if path == ":memory:" else os.path.join(path, "event_storage.sqlite")
-        )
-        self.db = sqlite3.connect(self.path)
-        self.db.row_factory = sqlite3.Row
+    def __init__(
+        self,
+        path: Union[str, Path],
+        *,
+        slow_query_ms: Optional[float] = DEFAULT_SLOW_QUERY_MS,
+        profiler: Optional[QueryProfiler] = None,
+    ):
+        self.backend = SQLiteBackend(path)
+        self.path = self.backend.path
+        self.archive_dir = self.backend.archive_dir
+        self.db = self.backend.connect()
 
         log.debug(self.path)
-        if logging.DEBUG >= log.level:
-            self.db.set_trace_callback(log.debug)
+        # guild shards share one, so the slow query log covers them all
+        self.profiler = profiler or QueryProfiler()
+        self.set_slow_query_threshold(slow_query_ms)
 
         self._scoring = Calculator(self.db)
 
-    def initialize(self):
-        migrations = Migrations(self.db)
-        migrations.migrate()
+        # looked up on every reaction; see `warm_up`
+        self._active_seasons: Dict[int, Optional[sqlite3.Row]] = {}
+        self._channels: Dict[Tuple[int, int], Optional[sqlite3.Row]] = {}
+        self._snowflakes: Dict[int, str] = {}
+
+        # how many `transaction` blocks are open; only the outermost commits
+        self._transaction_depth = 0
+        # see `check_changes`
+        self._data_version = self._read_data_version()
+
+    def initialize(self, progress: Optional[Callable[[str], None]] = None):
+        """
+        Bring the schema up to date, blocking until it's done.
+
+        File databases are migrated over a connection of their own, so this is safe to run
+        from a worker thread.
+        """
+        if self.backend.in_memory:
+            Migrations(self.db, progress=progress).migrate()
+            return
+
+        with self.backend.connection() as db:
+            Migrations(db, progress=progress).migrate()
+        # the migration was another connection's commit, but nothing's cached from before
+        self._data_version = self._read_data_version()
+
+    def warm_up(self) -> List[str]:
+        """
+        Prime the season, channel and snowflake caches and check the database.
+
+        Also reads through the active seasons' leaderboard indexes so their pages are
+        cached. Returns any integrity problems found (empty if all is well).
+        """
+        self.clear_caches()
+        # anything committed elsewhere from here on is picked up by `check_changes`
+        self._data_version = self._read_data_version()
+
+        # ascending, so each guild ends up with its latest active season
+        for season in self.db.execute(
+            """
+            SELECT * FROM seasons
+            WHERE end_at IS NULL
+            ORDER BY start_at, id
+            """
+        ).fetchall():
+            self._active_seasons[season["guild_id"]] = season
+
+        for season in self._active_seasons.values():
+            assert season
+            for channel in self.get_season_channels(season["id"]):
+                self._channels[(season["id"], channel["channel_id"])] = channel
+            self._scoring.get_season_scores(season_id=season["id"])
+
+        for row in self.db.execute("SELECT id, name FROM snowflakes").fetchall():
+            self._snowflakes[row["id"]] = row["name"]
+
+        return self.check_integrity()
+
+    def check_integrity(self) -> List[str]:
+        problems = [
+            row[0] for row in self.db.execute("PRAGMA integrity_check").fetchall()
+        ]
+        return [] if problems == ["ok"] else problems
+
+    def clear_caches(self):
+        self._active_seasons.clear()
+        self._channels.clear()
+        self._snowflakes.clear()
+
+    def check_changes(self) -> bool:
+        """
+        Drop the caches if another connection, usually another bot process sharing the
+        file, has committed since the last check. Returns whether one had.
 
+        Costs one read of the WAL index, so it's fine to call often.
+        """
+        version = self._read_data_version()
+        if version == self._data_version:
+            return False
+        self._data_version = version
+        self.clear_caches()
+        metrics.incr("storage.external_changes")
+        return True
+
+    def _read_data_version(self) -> int:
+        # only changes when other connections commit, never for our own writes
+        return self.db.execute("PRAGMA data_version").fetchall()[0][0]
+
+    def pending_migrations(self) -> int:
+        return Migrations(self.db).pending
+
+    def backup(self, directory: str, *, keep: Optional[int]) -> str:
+        """
+        Write a consistent snapshot to `directory`, archived seasons included, keeping
+        the newest `keep` backups (or all of them).
+
+        Like `initialize`, file databases are read over their own connection, so this can
+        run on a worker thread while scoring carries on.
+        """
+        if self.backend.in_memory:
+            return create_backup(self.db, directory, keep=keep)
+
+        with self.backend.connection() as source:
+            return create_backup(
+                source, directory, keep=keep, archive_dir=self.archive_dir
+            )
+
+    @contextmanager
+    def transaction(self):
+        """
+        Commit everything written inside as one transaction.
+
+        Each write method opens one, so a point and the scores it changes are committed
+        together. Wrap several calls to have them share a commit; nested transactions
+        join the outermost one. If anything raises, all of it is rolled back (and the
+        caches dropped, since they may have been filled from rolled back rows).
+
+        Nothing may be awaited inside; other tasks' writes would join the transaction.
+        """
+        outermost = self._transaction_depth == 0
+        if outermost and not self.db.in_transaction:
+            self.backend.begin(self.db)
+        self._transaction_depth += 1
+        try:
+            yield
+            if outermost:
+                self.db.commit()
+        except BaseException:
+            self.db.rollback()
+            self.clear_caches()
+            raise
+        finally:
+            self._transaction_depth -= 1
+
+    @contextmanager
+    def reader(self):
+        """
+        A read-only connection for long checks, closed afterwards.
+
+        Like `backup`, file databases get their own connection, so it can be used from a
+        worker thread while scoring carries on. In-memory ones can only share `db`.
+        """
+        if self.backend.in_memory:
+            yield self.db
+            return
+
+        with self.backend.reader() as db:
+            yield db
+
+    def restore(self, path: str, *, verify: bool = True):
+        """
+        Replace everything with the contents of a backup, after checking it.
+
+        Archived seasons are restored along with it.
+        """
+        if verify:
+            verify_backup(path)
+        source = sqlite3.connect(path)
+        try:
+            source.backup(self.db)
+        finally:
+            source.close()
+        if self.archive_dir:
+            restore_archives(path, self.archive_dir)
+        self.clear_caches()
+        # backups from before an upgrade
+        Migrations(self.db).migrate()
+
+    def set_slow_query_threshold(self, threshold_ms: Optional[float]):
+        """Log statements slower than this many milliseconds. `None` turns it off."""
+
+        db = cast(ProfiledConnection, self.db)
+        if threshold_ms is None:
+            db.profiler = None
+        else:
+            self.profiler.threshold_ms = threshold_ms
+            db.profiler = self.profiler
+
+    @metrics.timed("storage.get_seasons")
     def get_seasons(self, *, guild_id):
         return self.db.execute(
             """
             SELECT * FROM seasons
             WHERE guild_id = ?
+            ORDER BY start_at, id
             """,
             (guild_id,),
         ).fetchall()
 
+    @metrics.timed("storage.get_guild_ids")
+    def get_guild_ids(self) -> List[int]:
+        return [
+            row[0]
+            for row in self.db.execute(
+                "SELECT DISTINCT guild_id FROM seasons ORDER BY guild_id"
+            ).fetchall()
+        ]
+
+    @metrics.timed("storage.get_running_seasons")
+    def get_running_seasons(self):
+        """Seasons that haven't ended, in every guild."""
+
+        return self.db.execute(
+            """
+            SELECT * FROM seasons
+            WHERE end_at IS NULL
+            ORDER BY id
+            """
+        ).fetchall()
+
+    @metrics.timed("storage.get_active_season")
+    def get_active_season(self, *, guild_id):
+        """The most recently started season that hasn't ended, if any."""
+
+        if guild_id in self._active_seasons:
+            return self._active_seasons[guild_id]
+        season = self.db.execute(
+            """
+            SELECT * FROM seasons
+            WHERE guild_id = ? AND end_at IS NULL
+            ORDER BY start_at DESC, id DESC
+            LIMIT 1
+            """,
+            (guild_id,),
+        ).fetchone()
+        self._active_seasons[guild_id] = season
+        return season
+
+    @metrics.timed("storage.configure_season")
     def configure_season(
         self,
         *,
@@ -49,25 +305,148 @@ class EventStorage:
     ):
         """Creates or updates a season with the given name."""
 
-        self.db.execute(
-            """
-            INSERT INTO seasons (name, guild_id, start_at, end_at)
-            VALUES (:name, :guild_id, :start_at, :end_at)
-            ON CONFLICT (name, guild_id) DO UPDATE SET start_at=:start_at, end_at=:end_at
-            """,
-            dict(name=name, guild_id=guild_id, start_at=start_at, end_at=end_at),
-        )
-        self.db.commit()
+        with self.transaction():
+            self.db.execute(
+                """
+                INSERT INTO seasons (name, guild_id, start_at, end_at)
+                VALUES (:name, :guild_id, :start_at, :end_at)
+                ON CONFLICT (name, guild_id) DO UPDATE SET start_at=:start_at, end_at=:end_at
+                """,
+                dict(name=name, guild_id=guild_id, start_at=start_at, end_at=end_at),
+            )
+        self._active_seasons.pop(guild_id, None)
 
-    def get_channel(self, channel_id: int):
-        return self.db.execute(
+    @metrics.timed("storage.end_season")
+    def end_season(self, *, season_id: int, end_at: datetime.datetime):
+        """Close a season and archive its final scores."""
+
+        with self.transaction():
+            self.db.execute(
+                """
+                UPDATE seasons SET end_at = ?
+                WHERE id = ?
+                """,
+                (end_at, season_id),
+            )
+            self._scoring.archive_season_scores(season_id=season_id)
+        self._active_seasons.clear()
+
+    @metrics.timed("storage.archive_season")
+    def archive_season(self, *, season_id: int):
+        """
+        Move a season's points and adjustments into its own archive database.
+
+        Only its scores (and channel setup) stay behind. Space freed in the live database is
+        returned to the OS if it uses incremental auto-vacuum, and is otherwise reused.
+        """
+        # attaching can only happen outside a transaction
+        with self._attach_archive(season_id, create=True), self.transaction():
+            for table in ("event_channels", "event_points", "event_adjustments"):
+                self.db.execute(
+                    f"""
+                    INSERT OR REPLACE INTO archive.{table}
+                    SELECT * FROM main.{table}
+                    WHERE season_id = ?
+                    """,
+                    (season_id,),
+                )
+            for table in ("event_points", "event_adjustments"):
+                self.db.execute(
+                    f"""
+                    DELETE FROM main.{table}
+                    WHERE season_id = ?
+                    """,
+                    (season_id,),
+                )
+            self.db.execute(
+                """
+                UPDATE seasons SET archived_at = ?
+                WHERE id = ?
+                """,
+                (datetime.datetime.now(), season_id),
+            )
+
+        # 2 = INCREMENTAL
+        if self.db.execute("PRAGMA auto_vacuum").fetchall()[0][0] == 2:
+            self.db.execute("PRAGMA incremental_vacuum").fetchall()
+
+    @metrics.timed("storage.move_guild")
+    def move_guild(self, *, guild_id: int, dest: "EventStorage") -> int:
+        """
+        Move a guild's seasons, with everything scored in them, into `dest`.
+
+        Rows keep their IDs, and archived seasons' files move along. `dest` is committed
+        before anything is deleted here, so an interrupted move leaves a copy behind
+        rather than losing anything; moving again clears it. Returns the seasons moved.
+        """
+        seasons = self.get_seasons(guild_id=guild_id)
+        season_ids = [season["id"] for season in seasons]
+        where = f"season_id IN ({', '.join('?' * len(season_ids))})"
+
+        with dest.transaction():
+            _copy_rows(self.db, dest.db, "seasons", "guild_id = ?", (guild_id,))
+            for table in SEASON_TABLES:
+                _copy_rows(self.db, dest.db, table, where, season_ids)
+            _copy_rows(self.db, dest.db, "snowflakes", "1", ())
+
+        for season in seasons:
+            if season["archived_at"] is None:
+                continue
+            assert self.archive_dir and dest.archive_dir
+            os.makedirs(dest.archive_dir, exist_ok=True)
+            name = f"season_{season['id']}.sqlite"
+            path = os.path.join(self.archive_dir, name)
+            # already moved, by an earlier move that was interrupted
+            if os.path.exists(path):
+                os.replace(path, os.path.join(dest.archive_dir, name))
+
+        with self.transaction():
+            for table in SEASON_TABLES:
+                self.db.execute(f"DELETE FROM {table} WHERE {where}", season_ids)
+            self.db.execute("DELETE FROM seasons WHERE guild_id = ?", (guild_id,))
+        self.clear_caches()
+        dest.clear_caches()
+        return len(seasons)
+
+    @contextmanager
+    def _attach_archive(self, season_id: int, *, create: bool = False):
+        """Attach a season's archive database as `archive` for the duration."""
+
+        if self.archive_dir is None:
+            raise ValueError("In-memory storage can't archive seasons.")
+        path = os.path.join(self.archive_dir, f"season_{season_id}.sqlite")
+        if create:
+            os.makedirs(self.archive_dir, exist_ok=True)
+        elif not os.path.exists(path):
+            raise FileNotFoundError(path)
+
+        self.db.execute("ATTACH DATABASE ? AS archive", (path,))
+        try:
+            if create:
+                self.db.executescript(ARCHIVE_SCHEMA)
+            yield
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            self.db.execute("DETACH DATABASE archive")
+
+    @metrics.timed("storage.get_channel")
+    def get_channel(self, *, season_id: int, channel_id: int):
+        key = (season_id, channel_id)
+        if key in self._channels:
+            return self._channels[key]
+        channel = self.db.execute(
             """
             SELECT * from event_channels
-            WHERE channel_id = ?
+            WHERE season_id = ? AND channel_id = ?
             """,
-            (channel_id,),
+            (season_id, channel_id),
         ).fetchone()
+        self._channels[key] = channel
+        return channel
 
+    @metrics.timed("storage.get_season_channels")
     def get_season_channels(self, season_id: int):
         return self.db.execute(
             """
@@ -77,56 +456,144 @@ class EventStorage:
             (season_id,),
         ).fetchall()
 
+    @metrics.timed("storage.configure_channel")
     def configure_channel(
         self, *, channel_id: int, season_id: int, point_value: int = 1
     ):
-        self.db.execute(
-            """
-            INSERT INTO event_channels (channel_id, season_id, point_value)
-            VALUES (:channel_id, :season_id, :point_value)
-            ON CONFLICT (channel_id) DO UPDATE SET point_value=:point_value
-            """,
-            dict(channel_id=channel_id, season_id=season_id, point_value=point_value),
-        )
-        self.db.commit()
-        self._scoring.recalculate_event_scores(
-            season_id=season_id, channel_id=channel_id
+        self.configure_channels(
+            season_id=season_id, point_values={channel_id: point_value}
         )
 
+    @metrics.timed("storage.remove_channel")
     def remove_channel(self, *, channel_id: int, season_id: int):
-        self.db.execute(
-            """
-            DELETE FROM event_channels
-            WHERE channel_id = ?
-            """,
-            (channel_id,),
-        )
-        self.db.commit()
-        self._scoring.recalculate_event_scores(
-            season_id=season_id, channel_id=channel_id
-        )
+        self.configure_channels(season_id=season_id, point_values={channel_id: 0})
 
-    def clear_channel_points(self, *, channel_id: int):
-        self.db.execute(
-            """
-            DELETE FROM event_points
-            WHERE channel_id = ?
-            """,
-            (channel_id,),
-        )
-        self.db.commit()
+    @metrics.timed("storage.configure_channels")
+    def configure_channels(self, *, season_id: int, point_values: Dict[int, int]):
+        """
+        Set several channels' point values at once, then re-score them together.
+
+        A point value of 0 removes the channel from the season.
+        """
+        with self.transaction():
+            self.db.executemany(
+                """
+                INSERT INTO event_channels (season_id, channel_id, point_value)
+                VALUES (?, ?, ?)
+                ON CONFLICT (season_id, channel_id) DO UPDATE SET point_value=excluded.point_value
+                """,
+                (
+                    (season_id, channel_id, point_value)
+                    for channel_id, point_value in point_values.items()
+                    if point_value != 0
+                ),
+            )
+            self.db.executemany(
+                """
+                DELETE FROM event_channels
+                WHERE season_id = ? AND channel_id = ?
+                """,
+                (
+                    (season_id, channel_id)
+                    for channel_id, point_value in point_values.items()
+                    if point_value == 0
+                ),
+            )
+            for channel_id in point_values:
+                self._channels.pop((season_id, channel_id), None)
+            self._scoring.recalculate_season_scores(
+                season_id=season_id, channel_ids=point_values.keys()
+            )
 
+    @metrics.timed("storage.recalculate_scores")
+    def recalculate_scores(
+        self, *, season_id: int, channel_ids: Optional[Iterable[int]] = None
+    ):
+        with self.transaction():
+            self._scoring.recalculate_season_scores(
+                season_id=season_id, channel_ids=channel_ids
+            )
+
+    @metrics.timed("storage.rebuild_point_days")
+    def rebuild_point_days(self, *, season_id: int, events: Iterable[Tuple[int, int]]):
+        """Rewrite the daily history of each (channel ID, user ID) from their points."""
+
+        with self.transaction():
+            for channel_id, user_id in events:
+                params = (season_id, channel_id, user_id)
+                self.db.execute(
+                    """
+                    DELETE FROM event_point_days
+                    WHERE season_id = ? AND channel_id = ? AND user_id = ?
+                    """,
+                    params,
+                )
+                self.db.execute(
+                    """
+                    INSERT INTO event_point_days (season_id, channel_id, user_id, day, multiplier)
+                    SELECT season_id, channel_id, user_id, date(sent_at), SUM(multiplier)
+                    FROM event_points
+                    WHERE season_id = ? AND channel_id = ? AND user_id = ?
+                    GROUP BY date(sent_at)
+                    """,
+                    params,
+                )
+
+    @metrics.timed("storage.remove_orphans")
+    def remove_orphans(self, *, season_id: int, channel_ids: Iterable[int]):
+        """
+        Drop the scores of channels no longer in the season.
+
+        Their points are kept, in case they're added back. Channels re-added since they
+        were found are left alone.
+        """
+        with self.transaction():
+            for channel_id in channel_ids:
+                if self.get_channel(season_id=season_id, channel_id=channel_id):
+                    continue
+                self.db.execute(
+                    """
+                    DELETE FROM event_scores
+                    WHERE season_id = ? AND channel_id = ?
+                    """,
+                    (season_id, channel_id),
+                )
+
+    @metrics.timed("storage.clear_channel_points")
+    def clear_channel_points(self, *, season_id: int, channel_id: int):
+        with self.transaction():
+            self.db.execute(
+                """
+                DELETE FROM event_points
+                WHERE season_id = ? AND channel_id = ?
+                """,
+                (season_id, channel_id),
+            )
+            self.db.execute(
+                """
+                DELETE FROM event_point_days
+                WHERE season_id = ? AND channel_id = ?
+                """,
+                (season_id, channel_id),
+            )
+
+    @metrics.timed("storage.update_snowflake")
     def update_snowflake(self, *, id, name):
-        self.db.execute(
-            """
-            INSERT INTO snowflakes (id, name, cached_at)
-            VALUES (:id, :name, :now)
-            ON CONFLICT (id) DO UPDATE SET name=:name, cached_at=:now
-            """,
-            dict(id=id, name=name, now=datetime.datetime.now()),
-        )
-        self.db.commit()
+        # names rarely change, and this runs for every reaction
+        if self._snowflakes.get(id) == name:
+            return
+        with self.transaction():
+            self.db.execute(
+                """
+                INSERT INTO snowflakes (id, name, cached_at)
+                VALUES (:id, :name, :now)
+                ON CONFLICT (id) DO UPDATE SET name=:name, cached_at=:now
+                """,
+                dict(id=id, name=name, now=datetime.datetime.now()),
+            )
+        self._snowflakes[id] = name
 
+    @metrics.timed("storage.record_point")
     def record_point(
         self,
         *,
@@ -137,120 +604,292 @@ class EventStorage:
         multiplier: int,
         sent_at: datetime.datetime,
     ):
-        self.db.execute(
-            """
-            INSERT INTO event_points (message_id, user_id, channel_id, multiplier, sent_at)
-            VALUES (:message_id, :user_id, :channel_id, :multiplier, :sent_at)
-            ON CONFLICT (message_id) DO UPDATE SET multiplier=:multiplier
-            """,
-            dict(
-                message_id=message_id,
-                user_id=user_id,
-                channel_id=channel_id,
-                multiplier=multiplier,
-                sent_at=sent_at,
-            ),
-        )
-        self.db.commit()
-        self._scoring.recalculate_user_scores(
-            season_id=season_id, channel_id=channel_id, user_id=user_id
-        )
+        with self.transaction():
+            previous = self.db.execute(
+                """
+                SELECT season_id, multiplier, date(sent_at) AS day
+                FROM event_points
+                WHERE message_id = ?
+                """,
+                (message_id,),
+            ).fetchone()
+
+            # a message scored in an earlier season keeps that season's points
+            self.db.execute(
+                """
+                INSERT INTO event_points
+                    (message_id, season_id, user_id, channel_id, multiplier, sent_at)
+                VALUES (:message_id, :season_id, :user_id, :channel_id, :multiplier, :sent_at)
+                ON CONFLICT (message_id) DO UPDATE SET multiplier=:multiplier
+                    WHERE season_id = :season_id
+                """,
+                dict(
+                    message_id=message_id,
+                    season_id=season_id,
+                    user_id=user_id,
+                    channel_id=channel_id,
+                    multiplier=multiplier,
+                    sent_at=sent_at,
+                ),
+            )
+            if previous is None:
+                self._add_point_day(
+                    season_id=season_id,
+                    channel_id=channel_id,
+                    user_id=user_id,
+                    sent_at=sent_at,
+                    multiplier=multiplier,
+                )
+            elif previous["season_id"] == season_id:
+                self._add_point_day(
+                    season_id=season_id,
+                    channel_id=channel_id,
+                    user_id=user_id,
+                    day=previous["day"],
+                    multiplier=multiplier - previous["multiplier"],
+                )
+            self._scoring.recalculate_user_scores(
+                season_id=season_id, channel_id=channel_id, user_id=user_id
+            )
 
+    @metrics.timed("storage.remove_point")
     def remove_point(
         self, *, message_id: int, user_id: int, season_id: int, channel_id: int
     ):
+        with self.transaction():
+            previous = self.db.execute(
+                """
+                SELECT multiplier, date(sent_at) AS day
+                FROM event_points
+                WHERE message_id = ? AND season_id = ?
+                """,
+                (message_id, season_id),
+            ).fetchone()
+            self.db.execute(
+                """
+                DELETE FROM event_points
+                WHERE message_id = ? AND season_id = ?
+                """,
+                (message_id, season_id),
+            )
+            if previous is not None:
+                self._add_point_day(
+                    season_id=season_id,
+                    channel_id=channel_id,
+                    user_id=user_id,
+                    day=previous["day"],
+                    multiplier=-previous["multiplier"],
+                )
+            self._scoring.recalculate_user_scores(
+                season_id=season_id, channel_id=channel_id, user_id=user_id
+            )
+
+    def _add_point_day(
+        self,
+        *,
+        season_id: int,
+        channel_id: int,
+        user_id: int,
+        multiplier: int,
+        day: Optional[str] = None,
+        sent_at: Optional[datetime.datetime] = None,
+    ):
+        """Add to a day's total in `event_point_days`. Not committed."""
+
+        if multiplier == 0:
+            return
+        # bucketed by SQLite's date() either way, so it matches the migration's backfill
         self.db.execute(
             """
-            DELETE FROM event_points
-            WHERE message_id = ?
+            INSERT INTO event_point_days (season_id, channel_id, user_id, day, multiplier)
+            VALUES (:season_id, :channel_id, :user_id, coalesce(:day, date(:sent_at)), :multiplier)
+            ON CONFLICT (season_id, channel_id, user_id, day)
+                DO UPDATE SET multiplier = multiplier + :multiplier
             """,
-            (message_id,),
-        )
-        self.db.commit()
-        self._scoring.recalculate_user_scores(
-            season_id=season_id, channel_id=channel_id, user_id=user_id
+            dict(
+                season_id=season_id,
+                channel_id=channel_id,
+                user_id=user_id,
+                day=day,
+                sent_at=sent_at,
+                multiplier=multiplier,
+            ),
         )
 
+    @metrics.timed("storage.export_points")
     def export_points(self, *, guild_id):
-        return self.db.execute(
-            """
-            SELECT message_id,
-                   c.season_id, s.name season_name,
-                   p.channel_id, sc.name channel_name,
-                   p.user_id, su.name user_name,
-                   point_value, sent_at
-            FROM event_points p
-            LEFT JOIN event_channels c
-                ON p.channel_id = c.channel_id
-            LEFT JOIN seasons s
-                ON c.season_id = s.id
-            LEFT OUTER JOIN snowflakes sc
-                ON p.channel_id = sc.id
-            LEFT OUTER JOIN snowflakes su
-                ON p.user_id = su.id
-            WHERE s.guild_id = ?
-            """,
-            (guild_id,),
+        """All points for a guild, including archived seasons (reattached one at a time)."""
+
+        rows = self.db.execute(
+            EXPORT_POINTS.format(schema="main"), (guild_id,)
         ).fetchall()
 
+        for season in self.get_seasons(guild_id=guild_id):
+            if season["archived_at"] is None:
+                continue
+            try:
+                with self._attach_archive(season["id"]):
+                    rows += self.db.execute(
+                        EXPORT_POINTS.format(schema="archive"), (guild_id,)
+                    ).fetchall()
+            except FileNotFoundError:
+                log.warning(f"Archive for season {season['id']} is missing")
+        return rows
+
+    @metrics.timed("storage.get_season_scores")
     def get_season_scores(self, *, season_id: int):
         return self._scoring.get_season_scores(season_id=season_id)
 
-    def get_event_scores(self, *, channel_id: int):
-        return self._scoring.get_event_scores(channel_id=channel_id)
+    @metrics.timed("storage.get_archived_season_scores")
+    def get_archived_season_scores(self, *, season_id: int):
+        return self._scoring.get_archived_season_scores(season_id=season_id)
 
+    @metrics.timed("storage.get_event_scores")
+    def get_event_scores(self, *, season_id: int, channel_id: int):
+        return self._scoring.get_event_scores(
+            season_id=season_id, channel_id=channel_id
+        )
+
+    @metrics.timed("storage.get_hot_scores")
+    def get_hot_scores(self, *, season_id: int, limit: int):
+        return self._scoring.get_hot_scores(season_id=season_id, limit=limit)
+
+    @metrics.timed("storage.get_event_hot_scores")
+    def get_event_hot_scores(self, *, season_id: int, channel_id: int, limit: int):
+        return self._scoring.get_event_hot_scores(
+            season_id=season_id, channel_id=channel_id, limit=limit
+        )
+
+    @metrics.timed("storage.get_user_season_scores")
     def get_user_season_scores(self, *, season_id: int, user_id: int):
         return self._scoring.get_user_season_scores(
             season_id=season_id, user_id=user_id
         )
 
-    def get_event_points_for_user(self, *, channel_id: int, user_id: int):
+    @metrics.timed("storage.get_user_history")
+    def get_user_history(
+        self,
+        *,
+        season_id: int,
+        user_id: int,
+        since: datetime.date,
+        channel_id: Optional[int] = None,
+    ):
+        return self._scoring.get_user_history(
+            season_id=season_id, user_id=user_id, since=since, channel_id=channel_id
+        )
+
+    @metrics.timed("storage.get_window_scores")
+    def get_window_scores(
+        self, *, season_id: int, since: datetime.date, channel_id: Optional[int] = None
+    ):
+        return self._scoring.get_window_scores(
+            season_id=season_id, since=since, channel_id=channel_id
+        )
+
+    @metrics.timed("storage.get_season_rank")
+    def get_season_rank(self, *, season_id: int, user_id: int, neighbors: int = 1):
+        return self._scoring.get_season_rank(
+            season_id=season_id, user_id=user_id, neighbors=neighbors
+        )
+
+    @metrics.timed("storage.get_event_rank")
+    def get_event_rank(
+        self, *, season_id: int, channel_id: int, user_id: int, neighbors: int = 1
+    ):
+        return self._scoring.get_event_rank(
+            season_id=season_id,
+            channel_id=channel_id,
+            user_id=user_id,
+            neighbors=neighbors,
+        )
+
+    @metrics.timed("storage.get_event_points_for_user")
+    def get_event_points_for_user(
+        self, *, season_id: int, channel_id: int, user_id: int
+    ):
         return self._scoring.get_event_points_for_user(
-            channel_id=channel_id, user_id=user_id
+            season_id=season_id, channel_id=channel_id, user_id=user_id
         )
 
-    def get_event_adjustments_for_user(self, *, channel_id: int, user_id: int):
+    @metrics.timed("storage.get_event_adjustments_for_user")
+    def get_event_adjustments_for_user(
+        self, *, season_id: int, channel_id: int, user_id: int
+    ):
         return self._scoring.get_event_adjustments_for_user(
-            channel_id=channel_id, user_id=user_id
+            season_id=season_id, channel_id=channel_id, user_id=user_id
         )
 
-    def get_adjustments(self, *, channel_id: int):
+    @metrics.timed("storage.get_adjustments")
+    def get_adjustments(self, *, season_id: int, channel_id: int):
         return self.db.execute(
             """
             SELECT user_id, s.name user_name, adjustment, note
             FROM event_adjustments a
             LEFT OUTER JOIN snowflakes s
                 ON a.user_id = s.id
-            WHERE channel_id = ?
+            WHERE season_id = ? AND channel_id = ?
             """,
-            (channel_id,),
+            (season_id, channel_id),
         ).fetchall()
 
+    @metrics.timed("storage.replace_adjustments")
     def replace_adjustments(
         self, *, season_id: int, channel_id: int, adjustments: List[Adjustment]
     ):
         """Drop all adjustments for the given channel and replace them."""
 
+        self.replace_season_adjustments(
+            season_id=season_id, adjustments={channel_id: adjustments}
+        )
+
+    @metrics.timed("storage.replace_season_adjustments")
+    def replace_season_adjustments(
+        self, *, season_id: int, adjustments: Dict[int, List[Adjustment]]
+    ):
+        """
+        Replace the adjustments of every channel in `adjustments` (by channel ID), then
+        re-score them together.
+        """
+
         def adjustment_generator():
-            for adj in adjustments:
-                yield (channel_id, adj.user_id, adj.adjustment, adj.note)
+            for channel_id, channel_adjustments in adjustments.items():
+                for adj in channel_adjustments:
+                    yield (season_id, channel_id, adj.user_id, adj.adjustment, adj.note)
 
-        self.db.execute(
-            """
-            DELETE FROM event_adjustments
-            WHERE channel_id = ?
-            """,
-            (channel_id,),
-        )
-        self.db.executemany(
-            """
-            INSERT INTO event_adjustments (channel_id, user_id, adjustment, note)
-            VALUES (?, ?, ?, ?)
-            """,
-            adjustment_generator(),
-        )
-        self.db.commit()
+        with self.transaction():
+            self.db.executemany(
+                """
+                DELETE FROM event_adjustments
+                WHERE season_id = ? AND channel_id = ?
+                """,
+                ((season_id, channel_id) for channel_id in adjustments),
+            )
+            self.db.executemany(
+                """
+                INSERT INTO event_adjustments
+                    (season_id, channel_id, user_id, adjustment, note)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                adjustment_generator(),
+            )
+            self._scoring.recalculate_season_scores(
+                season_id=season_id, channel_ids=adjustments.keys()
+            )
 
-        self._scoring.recalculate_event_scores(
-            season_id=season_id, channel_id=channel_id
-        )
+
+def _copy_rows(
+    source: sqlite3.Connection,
+    dest: sqlite3.Connection,
+    table: str,
+    where: str,
+    params: Iterable,
+):
+    # by column name; migrated databases may order them differently
+    cursor = source.execute(f"SELECT * FROM {table} WHERE {where}", tuple(params))
+    columns = ", ".join(column[0] for column in cursor.description)
+    values = ", ".join("?" * len(cursor.description))
+    dest.executemany(
+        f"INSERT OR REPLACE INTO {table} ({columns}) VALUES ({values})",
+        (tuple(row) for row in cursor),
+    )
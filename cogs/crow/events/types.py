@@ -1,7 +1,17 @@
-from typing import NamedTuple
+import sqlite3
+from typing import List, NamedTuple
 
 
 class Adjustment(NamedTuple):
     user_id: int
     adjustment: int
     note: str
+
+
+class Rank(NamedTuple):
+    # 1-based; tied scores share a rank
+    rank: int
+    score: int
+    # nearest first
+    above: List[sqlite3.Row]
+    below: List[sqlite3.Row]
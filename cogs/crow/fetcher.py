@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import aiohttp
+
+from .metrics import metrics
+
+log = logging.getLogger("red.kenku")
+
+# remote images are stickers and banners, nothing should come close to this
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+DEFAULT_TIMEOUT = 10.0
+CHUNK_SIZE = 64 * 1024
+
+
+class FetchError(Exception):
+    pass
+
+
+class Fetcher:
+    """
+    Shared HTTP client for pulling remote images.
+
+    Connections are pooled and capped, every request has a timeout, bodies are streamed
+    and abandoned once they go over `max_bytes`, and recent responses are kept in a
+    small LRU cache so the same sticker/banner isn't downloaded over and over.
+
+    The session is only created on the first fetch.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        timeout: float = DEFAULT_TIMEOUT,
+        connections: int = 20,
+        connections_per_host: int = 4,
+        cache_bytes: int = 32 * 1024 * 1024,
+        cache_ttl: float = 300.0,
+    ):
+        self.max_bytes = max_bytes
+        self.cache_bytes = cache_bytes
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.connections = connections
+        self.connections_per_host = connections_per_host
+        self._session: Optional[aiohttp.ClientSession] = None
+
+        # url -> (fetched at, content type, body)
+        self._cache: OrderedDict[str, Tuple[float, str, bytes]] = OrderedDict()
+        self._cached_bytes = 0
+
+    async def fetch(self, url: str, *, content_type: Optional[str] = None) -> bytes:
+        """
+        Download `url`, raising `FetchError` if it can't be fetched within limits.
+
+        If `content_type` is given, the response's type must start with it (e.g. "image/").
+        """
+        cached = self._cache_get(url)
+        if cached is None:
+            metrics.incr("fetcher.cache_miss")
+            with metrics.timer("fetcher.download"):
+                cached = await self._download(url)
+            self._cache_put(url, cached)
+        else:
+            metrics.incr("fetcher.cache_hit")
+
+        _fetched_at, response_type, body = cached
+        if content_type and not response_type.startswith(content_type):
+            raise FetchError(f"Expected {content_type} content, got {response_type}.")
+        return body
+
+    async def _download(self, url: str) -> Tuple[float, str, bytes]:
+        try:
+            async with self.session().get(url) as response:
+                if response.status >= 400:
+                    raise FetchError(f"Got HTTP {response.status} fetching that URL.")
+                if (response.content_length or 0) > self.max_bytes:
+                    raise FetchError(self._too_large())
+
+                body = bytearray()
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    body.extend(chunk)
+                    if len(body) > self.max_bytes:
+                        raise FetchError(self._too_large())
+
+                return time.monotonic(), response.content_type, bytes(body)
+        except asyncio.TimeoutError:
+            raise FetchError("Timed out fetching that URL.")
+        except (aiohttp.ClientError, ValueError) as e:
+            log.debug(f"Fetch failed for {url}", exc_info=e)
+            raise FetchError("Couldn't fetch that URL.")
+
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connections,
+                limit_per_host=self.connections_per_host,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(
+                    total=self.timeout, sock_connect=self.timeout / 2
+                ),
+            )
+        return self._session
+
+    def _too_large(self):
+        return f"That file is too large (limit is {self.max_bytes // 1024} KiB)."
+
+    def _cache_get(self, url: str):
+        entry = self._cache.get(url)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.cache_ttl:
+            self._cache_evict(url)
+            return None
+        self._cache.move_to_end(url)
+        return entry
+
+    def _cache_put(self, url: str, entry: Tuple[float, str, bytes]):
+        size = len(entry[2])
+        if size > self.cache_bytes:
+            return
+        if url in self._cache:
+            self._cache_evict(url)
+        self._cache[url] = entry
+        self._cached_bytes += size
+        while self._cached_bytes > self.cache_bytes:
+            self._cache_evict(next(iter(self._cache)))
+
+    def _cache_evict(self, url: str):
+        _fetched_at, _type, body = self._cache.pop(url)
+        self._cached_bytes -= len(body)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
@@ -0,0 +1,4 @@
+from .state import GreeterStore as GreeterStore
+from .state import GreeterState as GreeterState
+from .dispatch import GreetingDispatcher as GreetingDispatcher
+from .template import GreetingTemplate as GreetingTemplate
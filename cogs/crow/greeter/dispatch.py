@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List
+
+import discord
+
+log = logging.getLogger("red.kenku")
+
+# how long to wait for more members to verify before greeting everyone at once
+BATCH_WINDOW = 3.0
+# mentions per greeting, comfortably under the message length limit
+MAX_BATCH = 40
+# channels allow 5 messages per 5 seconds; stay under that when working through a backlog
+SEND_INTERVAL = 1.5
+
+Sender = Callable[[List[discord.Member]], Awaitable[None]]
+
+
+class GreetingDispatcher:
+    """
+    Queues greetings per guild and sends them in batches.
+
+    The first member to verify opens a short window; everyone else who verifies during
+    it gets greeted in the same message. Large waves are split into several messages,
+    spaced out to stay clear of the channel rate limit.
+    """
+
+    def __init__(
+        self,
+        send: Sender,
+        *,
+        window: float = BATCH_WINDOW,
+        max_batch: int = MAX_BATCH,
+        interval: float = SEND_INTERVAL,
+    ):
+        self.send = send
+        self.window = window
+        self.max_batch = max_batch
+        self.interval = interval
+
+        self._queues: Dict[int, List[discord.Member]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+
+    def enqueue(self, member: discord.Member):
+        guild_id = member.guild.id
+        queue = self._queues.setdefault(guild_id, [])
+        if any(queued.id == member.id for queued in queue):
+            return
+        queue.append(member)
+
+        if guild_id not in self._workers:
+            self._workers[guild_id] = asyncio.create_task(self._work(guild_id))
+
+    def depth(self, guild_id: int) -> int:
+        """Number of members waiting to be greeted in a guild."""
+
+        return len(self._queues.get(guild_id, []))
+
+    async def _work(self, guild_id: int):
+        queue = self._queues[guild_id]
+        try:
+            await asyncio.sleep(self.window)
+            while queue:
+                batch = queue[: self.max_batch]
+                del queue[: self.max_batch]
+                try:
+                    await self.send(batch)
+                except Exception:
+                    log.exception(f"Failed to send greeting in guild {guild_id}")
+                if queue:
+                    await asyncio.sleep(self.interval)
+        finally:
+            del self._workers[guild_id]
+            if not queue:
+                del self._queues[guild_id]
+
+    async def close(self):
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+        dropped = sum(len(queue) for queue in self._queues.values())
+        if dropped:
+            log.warning(f"Dropped {dropped} queued greetings on unload")
+        self._queues.clear()
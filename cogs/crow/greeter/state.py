@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+import discord
+from redbot.core import Config
+
+from .template import GreetingTemplate
+
+log = logging.getLogger("red.kenku")
+
+DEFAULTS = {
+    "message": "Welcome $USER to our server!",
+    "channel": 0,
+    "images": [],
+    "next_image": 0,
+}
+
+# how long to sit on banner rotation changes before writing them out
+FLUSH_DELAY = 30.0
+
+
+@dataclass
+class GreeterState:
+    message: str
+    channel: int
+    images: List[str] = field(default_factory=list)
+    next_image: int = 0
+    template: GreetingTemplate = field(init=False)
+
+    def __post_init__(self):
+        # compiled once per config change, rendered per greeting
+        self.template = GreetingTemplate(self.message)
+
+
+class GreeterStore:
+    """
+    In-memory copy of each guild's greeter config.
+
+    Greetings read from here instead of Config. Config edits go through `edit` so both
+    stay in sync. The banner rotation index only lives in memory until it's flushed,
+    which happens a little while after it changes (and on unload).
+    """
+
+    def __init__(self, config: Config, *, flush_delay: float = FLUSH_DELAY):
+        self.config = config
+        self.config.register_guild(greeter=DEFAULTS)
+        self.flush_delay = flush_delay
+
+        self._states: Dict[int, GreeterState] = {}
+        self._dirty: Set[int] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def get(self, guild: discord.Guild) -> GreeterState:
+        state = self._states.get(guild.id)
+        if state is None:
+            state = _to_state(await self.config.guild(guild).greeter())
+            self._states[guild.id] = state
+        return state
+
+    @asynccontextmanager
+    async def edit(self, guild: discord.Guild):
+        """Edit a guild's stored greeter config, like `async with config.greeter()`."""
+
+        async with self.config.guild(guild).greeter() as greeter:
+            # write out our rotation index along with the edit
+            if guild.id in self._states:
+                greeter["next_image"] = self._states[guild.id].next_image
+            yield greeter
+        self._states[guild.id] = _to_state(greeter)
+        self._dirty.discard(guild.id)
+
+    def next_image(self, guild_id: int) -> Optional[str]:
+        """Advance a guild's banner rotation. The guild's state must already be loaded."""
+
+        state = self._states[guild_id]
+        if not state.images:
+            return None
+
+        # wrap around at the start, instead of afterwards, so we can still show images recently
+        # added at the end (if the pointer was already at the end)
+        index = state.next_image
+        if index >= len(state.images):
+            index = 0
+        state.next_image = index + 1
+
+        self._dirty.add(guild_id)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+        return state.images[index]
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_delay)
+        await self.flush()
+
+    async def flush(self):
+        """Write pending rotation indexes out to Config."""
+
+        dirty, self._dirty = self._dirty, set()
+        for guild_id in dirty:
+            state = self._states.get(guild_id)
+            if state is None:
+                continue
+            try:
+                config = self.config.guild_from_id(guild_id)
+                async with config.greeter() as greeter:
+                    greeter["next_image"] = state.next_image
+            except Exception:
+                log.exception(f"Failed to save greeter state for guild {guild_id}")
+                self._dirty.add(guild_id)
+
+    async def close(self):
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+
+
+def _to_state(greeter: dict):
+    state = GreeterState(**{**DEFAULTS, **greeter})
+    state.images = list(state.images)
+    return state
@@ -0,0 +1,58 @@
+import re
+from typing import List, Sequence, Union
+
+import discord
+
+PLACEHOLDER = re.compile(r"\$(USER|NAME|SERVER|MEMBERS)")
+
+
+class Placeholder(str):
+    pass
+
+
+class GreetingTemplate:
+    """
+    A greeting message, pre-split into literal text and placeholders.
+
+    - `$USER` mentions the member(s) being greeted
+    - `$NAME` is their display name(s)
+    - `$SERVER` is the server name
+    - `$MEMBERS` is the server's member count
+    """
+
+    def __init__(self, message: str):
+        self.message = message
+        self.parts: List[Union[str, Placeholder]] = []
+
+        position = 0
+        for match in PLACEHOLDER.finditer(message):
+            if match.start() > position:
+                self.parts.append(message[position : match.start()])
+            self.parts.append(Placeholder(match.group(1)))
+            position = match.end()
+        if position < len(message):
+            self.parts.append(message[position:])
+
+    def render(self, members: Sequence[discord.Member]) -> str:
+        values = {}
+        out = []
+        for part in self.parts:
+            if not isinstance(part, Placeholder):
+                out.append(part)
+                continue
+            if part not in values:
+                values[part] = self._value(part, members)
+            out.append(values[part])
+        return "".join(out)
+
+    def _value(self, placeholder: Placeholder, members: Sequence[discord.Member]):
+        guild = members[0].guild
+        if placeholder == "USER":
+            return ", ".join(f"<@{member.id}>" for member in members)
+        if placeholder == "NAME":
+            return ", ".join(member.display_name for member in members)
+        if placeholder == "SERVER":
+            return guild.name
+        if placeholder == "MEMBERS":
+            return str(guild.member_count)
+        return ""
@@ -0,0 +1,197 @@
+import asyncio
+import functools
+import os
+import time
+from typing import Dict, List
+
+# upper bounds, in seconds
+BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    float("inf"),
+)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts: List[int] = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                return
+
+    def quantile(self, q: float) -> float:
+        """Rough quantile: the upper bound of the bucket it lands in."""
+
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return BUCKETS[-1]
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """
+    Timing histograms and counters for the hot paths.
+
+    Off by default. While disabled, `timer` hands back a shared no-op context manager
+    and `timed` functions call straight through, so instrumentation costs next to
+    nothing.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+
+    def timer(self, name: str):
+        """`with metrics.timer("thing"): ...` records how long the block took."""
+
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def timed(self, name: str):
+        """Decorator version of `timer`, for sync and async functions."""
+
+        def decorator(fn):
+            if asyncio.iscoroutinefunction(fn):
+
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await fn(*args, **kwargs)
+                    with _Timer(self, name):
+                        return await fn(*args, **kwargs)
+
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with _Timer(self, name):
+                    return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def observe(self, name: str, seconds: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+    def incr(self, name: str, amount: int = 1):
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        self.histograms.clear()
+        self.counters.clear()
+
+    def summary(self) -> List[str]:
+        """Human-readable lines, one per metric."""
+
+        lines = []
+        for name, h in sorted(self.histograms.items()):
+            mean = h.sum / h.count * 1000
+            p50 = _format_bound(h.quantile(0.5))
+            p99 = _format_bound(h.quantile(0.99))
+            lines.append(f"{name}: {h.count}× mean {mean:.2f}ms, p50 {p50}, p99 {p99}")
+        for name, count in sorted(self.counters.items()):
+            lines.append(f"{name}: {count}")
+        return lines
+
+    def render_prometheus(self) -> str:
+        """Render everything in the Prometheus text exposition format."""
+
+        lines = [
+            "# HELP kenku_duration_seconds Time spent in instrumented operations.",
+            "# TYPE kenku_duration_seconds histogram",
+        ]
+        for name, h in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, h.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    f'kenku_duration_seconds_bucket{{op="{name}",le="{le}"}} {cumulative}'
+                )
+            lines.append(f'kenku_duration_seconds_sum{{op="{name}"}} {h.sum}')
+            lines.append(f'kenku_duration_seconds_count{{op="{name}"}} {h.count}')
+
+        lines += [
+            "# HELP kenku_events_total Counted occurrences.",
+            "# TYPE kenku_events_total counter",
+        ]
+        for name, count in sorted(self.counters.items()):
+            lines.append(f'kenku_events_total{{event="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Atomically (re)write a Prometheus text file, e.g. for node_exporter."""
+
+        temp = f"{path}.tmp"
+        with open(temp, "w") as file:
+            file.write(self.render_prometheus())
+        os.replace(temp, path)
+
+
+def _format_bound(bound: float) -> str:
+    if bound == float("inf"):
+        return f">{BUCKETS[-2]:g}s"
+    return f"≤{bound * 1000:g}ms"
+
+
+# shared by the cog and the events storage
+metrics = Metrics()
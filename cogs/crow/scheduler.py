@@ -0,0 +1,283 @@
+import asyncio
+import enum
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    TypeVar,
+)
+
+from .metrics import metrics
+
+log = logging.getLogger("red.kenku")
+
+# jobs running at once, across every guild
+MAX_RUNNING = 4
+# normal jobs running at once in one guild; global jobs (backups etc.) share their own
+# slots. bulk jobs don't count, so a long rescan never holds up a guild's commands
+MAX_PER_GUILD = 2
+# bulk jobs running at once in one guild
+MAX_BULK_PER_GUILD = 1
+# bulk jobs running at once, so there's always room for something someone's waiting on
+MAX_BULK = 2
+# finished jobs kept around for `events jobs`
+HISTORY = 20
+
+T = TypeVar("T")
+
+
+class JobError(Exception):
+    pass
+
+
+class Priority(enum.IntEnum):
+    # someone ran a command and is waiting for the result
+    NORMAL = 0
+    # maintenance that can take as long as it needs: rescans, checks, backups
+    BULK = 1
+
+
+class Job:
+    def __init__(
+        self,
+        id: int,
+        name: str,
+        factory: Callable[[], Awaitable[Any]],
+        *,
+        guild_id: Optional[int],
+        priority: Priority,
+        key: Optional[Hashable],
+    ):
+        self.id = id
+        self.name = name
+        self.guild_id = guild_id
+        self.priority = priority
+        self.key = key
+        # queued, running, done, failed or cancelled
+        self.status = "queued"
+        self.created_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+
+        self._factory = factory
+        self._result: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._waiters = 0
+
+    def __str__(self):
+        return f"#{self.id} {self.name}"
+
+    @property
+    def finished(self) -> bool:
+        return self._result.done()
+
+    async def wait(self) -> Any:
+        """Wait for the job to finish, and return its result or raise its error."""
+
+        self._waiters += 1
+        try:
+            # the job doesn't go away just because one caller stopped waiting
+            return await asyncio.shield(self._result)
+        finally:
+            self._waiters -= 1
+
+
+class JobScheduler:
+    """
+    Runs the cog's background work in order of priority, a few jobs at a time.
+
+    Jobs wait in a queue until there's a free slot overall and among their guild's
+    jobs of the same priority (and, for bulk jobs, among all bulk jobs); the most
+    important, then oldest, go first. A job with
+    a `key` is refused while another with the same key is unfinished, so the same
+    channel can't be rescanned twice at once.
+
+    Reactions and greetings don't queue at all. They mark themselves with
+    `interactive()`, and bulk jobs call `checkpoint()` between units of work, which
+    waits until nothing interactive is in flight. Everything shares one event loop, so
+    that's as close to preempting as it gets.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_running: int = MAX_RUNNING,
+        max_per_guild: int = MAX_PER_GUILD,
+        max_bulk_per_guild: int = MAX_BULK_PER_GUILD,
+        max_bulk: int = MAX_BULK,
+    ):
+        self.max_running = max_running
+        self.max_per_guild = max_per_guild
+        self.max_bulk_per_guild = max_bulk_per_guild
+        self.max_bulk = max_bulk
+
+        self._next_id = 1
+        self._queue: List[Job] = []
+        self._running: Dict[int, Job] = {}
+        self._history: Deque[Job] = deque(maxlen=HISTORY)
+
+        self._interactive = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def submit(
+        self,
+        name: str,
+        factory: Callable[[], Awaitable[Any]],
+        *,
+        guild_id: Optional[int] = None,
+        priority: Priority = Priority.NORMAL,
+        key: Optional[Hashable] = None,
+    ) -> Job:
+        """
+        Queue `factory()` to be awaited once there's room for it.
+
+        Raises `JobError` if an unfinished job already has the same `key`.
+        """
+        if key is not None:
+            for job in self.jobs():
+                if job.key == key and not job.finished:
+                    raise JobError(f"That's already being worked on (job {job}).")
+
+        job = Job(
+            self._next_id,
+            name,
+            factory,
+            guild_id=guild_id,
+            priority=priority,
+            key=key,
+        )
+        self._next_id += 1
+        self._queue.append(job)
+        metrics.incr(f"jobs.{name}.submitted")
+        self._pump()
+        return job
+
+    async def run(
+        self,
+        name: str,
+        factory: Callable[[], Awaitable[T]],
+        *,
+        guild_id: Optional[int] = None,
+        priority: Priority = Priority.NORMAL,
+        key: Optional[Hashable] = None,
+    ) -> T:
+        """`submit` a job and wait for its result."""
+
+        job = self.submit(name, factory, guild_id=guild_id, priority=priority, key=key)
+        return await job.wait()
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a queued or running job. Returns whether there was one to cancel."""
+
+        for job in self._queue:
+            if job.id == job_id:
+                self._queue.remove(job)
+                self._finish(job, "cancelled")
+                job._result.cancel()
+                return True
+        job = self._running.get(job_id)
+        if job and job.task:
+            job.task.cancel()
+            return True
+        return False
+
+    def jobs(self, guild_id: Optional[int] = None) -> List[Job]:
+        """Running, queued and recently finished jobs, optionally just for one guild."""
+
+        jobs = [*self._running.values(), *self._queue, *reversed(self._history)]
+        if guild_id is not None:
+            jobs = [job for job in jobs if job.guild_id == guild_id]
+        return jobs
+
+    @contextmanager
+    def interactive(self) -> Iterator[None]:
+        """Hold bulk jobs at their next `checkpoint` until this block is done."""
+
+        self._interactive += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._interactive -= 1
+            if not self._interactive:
+                self._idle.set()
+
+    async def checkpoint(self):
+        """Let anything waiting run, and wait out interactive work in flight."""
+
+        await asyncio.sleep(0)
+        await self._idle.wait()
+
+    async def close(self):
+        for job in list(self._queue):
+            self.cancel(job.id)
+        tasks = [job.task for job in self._running.values() if job.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _pump(self):
+        for job in sorted(self._queue, key=lambda job: (job.priority, job.id)):
+            if len(self._running) >= self.max_running:
+                return
+            same_priority = [
+                other
+                for other in self._running.values()
+                if other.priority == job.priority
+            ]
+            in_guild = sum(
+                1 for other in same_priority if other.guild_id == job.guild_id
+            )
+            if job.priority == Priority.BULK:
+                if (
+                    in_guild >= self.max_bulk_per_guild
+                    or len(same_priority) >= self.max_bulk
+                ):
+                    continue
+            elif in_guild >= self.max_per_guild:
+                continue
+
+            self._queue.remove(job)
+            self._running[job.id] = job
+            job.status = "running"
+            job.started_at = time.monotonic()
+            job.task = asyncio.create_task(self._run(job))
+
+    async def _run(self, job: Job):
+        try:
+            with metrics.timer(f"jobs.{job.name}"):
+                result = await job._factory()
+        except asyncio.CancelledError:
+            self._finish(job, "cancelled")
+            job._result.cancel()
+        except Exception as e:
+            self._finish(job, "failed")
+            job.error = e
+            job._result.set_exception(e)
+            if not job._waiters:
+                # nobody to hand the error to
+                log.exception(f"Background job {job} failed")
+                job._result.exception()
+        else:
+            self._finish(job, "done")
+            job._result.set_result(result)
+        finally:
+            self._pump()
+
+    def _finish(self, job: Job, status: str):
+        job.status = status
+        job.finished_at = time.monotonic()
+        self._running.pop(job.id, None)
+        self._history.append(job)
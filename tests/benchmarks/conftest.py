@@ -0,0 +1,240 @@
+"""
+Benchmark harness for the events engine.
+
+Skipped unless pytest is run with `--bench` (see `pipenv run bench`). Each benchmark
+reports ops/sec and p50/p99 latency, and is compared against `baselines.json`. Run
+with `--bench-save` to record new baselines.
+"""
+
+from dataclasses import asdict, dataclass
+import datetime
+import json
+from pathlib import Path
+import random
+import statistics
+import time
+from typing import Callable, Dict, List, Optional, cast
+
+import pytest
+from redbot.core import commands
+
+from cogs.crow.events.manager import EventManager
+from cogs.crow.events.schema import BACKFILL_8_TO_9
+
+BASELINES = Path(__file__).parent / "baselines.json"
+SEED = 8703465
+
+
+@dataclass
+class BenchResult:
+    name: str
+    count: int
+    ops_per_sec: float
+    p50_ms: float
+    p99_ms: float
+
+
+_results: Dict[str, BenchResult] = {}
+
+
+def pytest_generate_tests(metafunc):
+    if "points" in metafunc.fixturenames:
+        sizes = metafunc.config.getoption("--bench-sizes")
+        metafunc.parametrize("points", [int(s) for s in sizes.split(",")])
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    if not _results:
+        return
+
+    terminalreporter.section("kenku benchmarks")
+    terminalreporter.write_line(
+        f"{'benchmark':<55} {'ops/sec':>10} {'p50 ms':>10} {'p99 ms':>10}"
+    )
+    for result in _results.values():
+        terminalreporter.write_line(
+            f"{result.name:<55} {result.ops_per_sec:>10.1f} "
+            + f"{result.p50_ms:>10.3f} {result.p99_ms:>10.3f}"
+        )
+
+    if config.getoption("--bench-save"):
+        baselines = _load_baselines()
+        baselines.update({name: asdict(r) for name, r in _results.items()})
+        BASELINES.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        terminalreporter.write_line(f"Saved baselines to {BASELINES}")
+
+
+def _load_baselines() -> Dict[str, dict]:
+    if not BASELINES.exists():
+        return {}
+    return json.loads(BASELINES.read_text())
+
+
+class Bench:
+    """
+    Times callables and records the results.
+
+    `bench(fn, repeat=100)` calls `fn` repeatedly (up to `max_seconds`). Timings taken
+    some other way (e.g. from async code) can be passed to `bench.record`. Either way,
+    the result is stored under the test's id, and the test fails if it's much slower
+    than the stored baseline.
+    """
+
+    def __init__(self, config, name: str):
+        self.config = config
+        self.name = name
+
+    def __call__(
+        self,
+        fn: Callable[[], object],
+        *,
+        repeat: int = 100,
+        warmup: int = 3,
+        max_seconds: float = 20.0,
+        label: Optional[str] = None,
+    ):
+        for _ in range(warmup):
+            fn()
+
+        timings: List[float] = []
+        deadline = time.perf_counter() + max_seconds
+        while len(timings) < repeat and time.perf_counter() < deadline:
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+
+        return self.record(timings, label=label)
+
+    def record(
+        self,
+        timings: List[float],
+        *,
+        ops_per_sec: Optional[float] = None,
+        label: Optional[str] = None,
+    ):
+        """Record latencies (in seconds). Throughput defaults to 1 / mean latency."""
+
+        result_name = f"{self.name}:{label}" if label else self.name
+        timings = sorted(timings)
+        result = BenchResult(
+            name=result_name,
+            count=len(timings),
+            ops_per_sec=ops_per_sec or len(timings) / sum(timings),
+            p50_ms=statistics.median(timings) * 1000,
+            p99_ms=timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000,
+        )
+        _results[result_name] = result
+
+        baseline = _load_baselines().get(result_name)
+        if baseline and not self.config.getoption("--bench-save"):
+            limit = baseline["p50_ms"] * self.config.getoption("--bench-tolerance")
+            assert result.p50_ms <= limit, (
+                f"{result_name} regressed: p50 {result.p50_ms:.3f}ms, "
+                + f"baseline {baseline['p50_ms']:.3f}ms"
+            )
+        return result
+
+
+@pytest.fixture
+def bench(request):
+    if not request.config.getoption("--bench"):
+        pytest.skip("benchmarks only run with --bench")
+    return Bench(request.config, request.node.name)
+
+
+@pytest.fixture(params=["memory", "file"])
+def storage_path(request, tmp_path):
+    return ":memory:" if request.param == "memory" else str(tmp_path)
+
+
+@dataclass
+class SyntheticGuild:
+    manager: EventManager
+    season_id: int
+    channels: list
+    users: list
+    rng: random.Random
+    next_message_id: int
+
+    def new_message_id(self):
+        self.next_message_id += 1
+        return self.next_message_id
+
+
+@pytest.fixture
+def make_synthetic_guild(storage_path, dummy_guild, make_channel, make_user):
+    """
+    Build an event manager filled with a season of synthetic points.
+
+    Points are spread over `channels` events and `users` members, with a Zipf-like skew
+    towards a small set of very active members like a real server.
+    """
+
+    def _make_synthetic_guild(points: int, *, channels: int = 20, users: int = 2000):
+        rng = random.Random(SEED)
+        manager = EventManager(cast(commands.Cog, None), storage_path=storage_path)
+        storage = manager.storage
+        season_id = manager._active_season(dummy_guild.id)["id"]
+
+        event_channels = [
+            make_channel(name=f"event-{i}", id=100_000 + i) for i in range(channels)
+        ]
+        for channel in event_channels:
+            storage.configure_channel(
+                season_id=season_id,
+                channel_id=channel.id,
+                point_value=rng.randint(1, 3),
+            )
+            storage.update_snowflake(id=channel.id, name=channel.name)
+
+        members = [make_user(id=1_000_000 + i, name=f"user-{i}") for i in range(users)]
+        storage.db.executemany(
+            "INSERT INTO snowflakes (id, name, cached_at) VALUES (?, ?, ?)",
+            ((m.id, f"{m.name}#{m.discriminator}", 0) for m in members),
+        )
+
+        # one a minute, up to now, so recent windows have points in them
+        start = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+            minutes=points
+        )
+        weights = [1 / (i + 1) for i in range(users)]
+        authors = rng.choices(members, weights=weights, k=points)
+
+        def point_rows():
+            for message_id, member in enumerate(authors):
+                channel = rng.choice(event_channels)
+                sent_at = start + datetime.timedelta(minutes=message_id)
+                yield (
+                    message_id,
+                    season_id,
+                    member.id,
+                    channel.id,
+                    sent_at,
+                    rng.randint(1, 3),
+                )
+
+        storage.db.executemany(
+            """
+            INSERT INTO event_points
+                (message_id, season_id, user_id, channel_id, sent_at, multiplier)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            point_rows(),
+        )
+        storage.db.executescript(BACKFILL_8_TO_9)
+        storage.db.commit()
+        for channel in event_channels:
+            storage._scoring.recalculate_event_scores(
+                season_id=season_id, channel_id=channel.id
+            )
+
+        return SyntheticGuild(
+            manager=manager,
+            season_id=season_id,
+            channels=event_channels,
+            users=members,
+            rng=rng,
+            next_message_id=points,
+        )
+
+    return _make_synthetic_guild
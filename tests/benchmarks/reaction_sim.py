@@ -0,0 +1,404 @@
+"""
+Load simulator for the event reaction pipeline.
+
+Replays mod reactions through `CrowEvents.event_react_added`/`event_react_removed`
+against a fake Discord backend with configurable API latency, then reports what each
+reaction cost: API calls, `is_mod` checks, SQL statements, commits and latency.
+
+    env PYTHONPATH=. python -m tests.benchmarks.reaction_sim --reactions 5000 --latency 0.02
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+from dataclasses import dataclass, field
+import datetime
+import random
+import statistics
+import time
+from typing import Dict, List, Optional, cast
+
+import discord
+from redbot.core import commands
+
+from cogs.crow.crow_events import EVENT_EMOJIS, CrowEvents
+from cogs.crow.events import EventManager
+from cogs.crow.scheduler import JobScheduler
+
+GUILD_ID = 9876
+BOT_ID = 1
+
+
+@dataclass
+class FakeUser:
+    id: int
+    name: str
+    discriminator: str = "1111"
+
+
+@dataclass
+class FakeReaction:
+    emoji: str
+    backend: "FakeBackend"
+    users_: List[FakeUser] = field(default_factory=list)
+
+    async def _pages(self):
+        users = list(self.users_)
+        for i in range(0, max(len(users), 1), 100):
+            await self.backend.api_call("reaction.users")
+            for user in users[i : i + 100]:
+                yield user
+
+    def users(self):
+        return self._pages()
+
+
+@dataclass
+class FakeMessage:
+    id: int
+    author: FakeUser
+    channel: "FakeChannel"
+    guild: "FakeGuild"
+    created_at: datetime.datetime
+    backend: "FakeBackend"
+    reactions: List[FakeReaction] = field(default_factory=list)
+
+    def reaction(self, emoji: str, *, create=False) -> Optional[FakeReaction]:
+        for reaction in self.reactions:
+            if reaction.emoji == emoji:
+                return reaction
+        if create:
+            reaction = FakeReaction(emoji=emoji, backend=self.backend)
+            self.reactions.append(reaction)
+            return reaction
+        return None
+
+    def react(self, emoji: str, user: FakeUser):
+        reaction = cast(FakeReaction, self.reaction(emoji, create=True))
+        if user not in reaction.users_:
+            reaction.users_.append(user)
+
+    def unreact(self, emoji: str, user: FakeUser):
+        reaction = self.reaction(emoji)
+        if reaction and user in reaction.users_:
+            reaction.users_.remove(user)
+            if not reaction.users_:
+                self.reactions.remove(reaction)
+
+    async def add_reaction(self, emoji):
+        await self.backend.api_call("message.add_reaction")
+        self.react(_emoji_name(emoji), self.backend.bot.user)
+
+    async def remove_reaction(self, emoji, member):
+        await self.backend.api_call("message.remove_reaction")
+        self.unreact(_emoji_name(emoji), member)
+
+
+class FakeHTTP:
+    def __init__(self, backend: "FakeBackend"):
+        self.backend = backend
+
+    async def get_message(self, channel_id: int, message_id: int):
+        await self.backend.api_call("message.fetch")
+        return self.backend.messages[message_id]
+
+
+class FakeState:
+    """Stands in for discord.py's ConnectionState, so `PartialMessage.fetch` works."""
+
+    def __init__(self, backend: "FakeBackend"):
+        self.http = FakeHTTP(backend)
+
+    def create_message(self, *, channel, data):
+        return data
+
+
+@dataclass
+class FakeChannel:
+    id: int
+    name: str
+    guild: "FakeGuild"
+    _state: FakeState
+    type: discord.ChannelType = discord.ChannelType.text
+
+
+@dataclass
+class FakeGuild:
+    id: int
+    members: Dict[int, FakeUser]
+
+    def get_member(self, user_id: int):
+        return self.members.get(user_id)
+
+
+@dataclass
+class FakePayload:
+    """Stands in for `discord.RawReactionActionEvent`."""
+
+    user_id: int
+    emoji: discord.PartialEmoji
+    channel_id: int
+    message_id: int
+    guild_id: int
+    member: Optional[FakeUser]
+
+
+class FakeBot:
+    def __init__(self, backend: "FakeBackend", mod_ids: set):
+        self.backend = backend
+        self.user = FakeUser(id=BOT_ID, name="kenku")
+        self.mod_ids = mod_ids
+
+    def get_channel(self, channel_id: int):
+        return self.backend.channels[channel_id]
+
+    def get_guild(self, guild_id: int):
+        return self.backend.guild
+
+    async def is_mod(self, member: FakeUser):
+        self.backend.calls["bot.is_mod"] += 1
+        return member.id in self.mod_ids
+
+
+class FakeBackend:
+    def __init__(self, *, latency: float, mod_ids: set):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.bot = FakeBot(self, mod_ids)
+        self.guild = FakeGuild(id=GUILD_ID, members={})
+        self.channels: Dict[int, FakeChannel] = {}
+        self.messages: Dict[int, FakeMessage] = {}
+        self.state = FakeState(self)
+
+    async def api_call(self, name: str):
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class SimCog(CrowEvents):
+    def __init__(self, bot: FakeBot, storage_path: str):
+        self.bot = cast(discord.Client, bot)  # type: ignore
+        self.scheduler = JobScheduler()
+        self.event_manager = EventManager(
+            cast(commands.Cog, self), storage_path=storage_path
+        )
+
+
+@dataclass
+class SimulationStats:
+    reactions: int
+    elapsed: float
+    latencies: List[float]
+    calls: Counter
+    statements: int
+    commits: int
+    mismatched_scores: int
+
+    @property
+    def api_calls(self):
+        return sum(n for name, n in self.calls.items() if name != "bot.is_mod")
+
+    def report(self):
+        n = self.reactions
+        latencies = sorted(self.latencies)
+        lines = [
+            f"{n} reactions in {self.elapsed:.2f}s ({n / self.elapsed:.0f}/s)",
+            f"latency p50 {statistics.median(latencies) * 1000:.2f}ms, "
+            + f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f}ms",
+            f"per reaction: {self.api_calls / n:.2f} API calls, "
+            + f"{self.calls['bot.is_mod'] / n:.2f} is_mod checks, "
+            + f"{self.statements / n:.2f} SQL statements, {self.commits / n:.2f} commits",
+        ]
+        lines += [f"  {name}: {count}" for name, count in sorted(self.calls.items())]
+        lines.append(f"mismatched scores: {self.mismatched_scores}")
+        return "\n".join(lines)
+
+
+async def simulate(
+    *,
+    reactions: int = 2000,
+    messages: int = 500,
+    channels: int = 5,
+    members: int = 200,
+    mods: int = 5,
+    latency: float = 0.0,
+    rate: Optional[float] = None,
+    storage_path: str = ":memory:",
+    seed: int = 8703465,
+) -> SimulationStats:
+    """
+    Replay `reactions` random mod reactions over a fresh guild.
+
+    Reactions on the same message are handled in order (each waits for the previous
+    one's handler), but different messages are handled concurrently like the gateway
+    would. `rate` paces dispatch in reactions per second; by default everything is
+    dispatched at once.
+    """
+    rng = random.Random(seed)
+    mod_ids = set(range(100, 100 + mods))
+    backend = FakeBackend(latency=latency, mod_ids=mod_ids)
+    cog = SimCog(backend.bot, storage_path)
+
+    for user_id in list(mod_ids) + list(range(1000, 1000 + members)):
+        backend.guild.members[user_id] = FakeUser(id=user_id, name=f"user-{user_id}")
+    mod_list = [backend.guild.members[id] for id in sorted(mod_ids)]
+    authors = [backend.guild.members[id] for id in range(1000, 1000 + members)]
+
+    for i in range(channels):
+        channel = FakeChannel(
+            id=10_000 + i, name=f"event-{i}", guild=backend.guild, _state=backend.state
+        )
+        backend.channels[channel.id] = channel
+        cog.event_manager.configure_channel(cast(discord.TextChannel, channel), i + 1)
+
+    channel_list = list(backend.channels.values())
+    for message_id in range(100_000, 100_000 + messages):
+        backend.messages[message_id] = FakeMessage(
+            id=message_id,
+            author=rng.choice(authors),
+            channel=rng.choice(channel_list),
+            guild=backend.guild,
+            created_at=datetime.datetime.now(),
+            backend=backend,
+        )
+
+    statements = Counter()
+
+    def trace(statement: str):
+        statements["all"] += 1
+        if statement == "COMMIT":
+            statements["commit"] += 1
+
+    cog.event_manager.storage.db.set_trace_callback(trace)
+
+    latencies: List[float] = []
+    previous: Dict[int, asyncio.Task] = {}
+
+    async def run(payload: FakePayload, adding: bool, after: Optional[asyncio.Task]):
+        if after:
+            await after
+        message = backend.messages[payload.message_id]
+        user = backend.guild.members[payload.user_id]
+        emoji = cast(str, payload.emoji.name)
+        if adding:
+            message.react(emoji, user)
+            handler = cog.event_react_added
+        else:
+            message.unreact(emoji, user)
+            handler = cog.event_react_removed
+
+        start = time.perf_counter()
+        await handler(cast(discord.RawReactionActionEvent, payload))
+        latencies.append(time.perf_counter() - start)
+
+    # decide whether each reaction is an add or a remove up front, as if in order
+    reacted = set()
+    started = time.perf_counter()
+    for _ in range(reactions):
+        message = backend.messages[rng.randrange(100_000, 100_000 + messages)]
+        mod = rng.choice(mod_list)
+        emoji = rng.choice(list(EVENT_EMOJIS))
+        key = (message.id, mod.id, emoji)
+        adding = key not in reacted
+        reacted.symmetric_difference_update({key})
+
+        payload = FakePayload(
+            user_id=mod.id,
+            emoji=discord.PartialEmoji(name=emoji),
+            channel_id=message.channel.id,
+            message_id=message.id,
+            guild_id=GUILD_ID,
+            # like the gateway, member is only filled in on adds
+            member=mod if adding else None,
+        )
+        task = asyncio.create_task(run(payload, adding, previous.get(message.id)))
+        previous[message.id] = task
+        if rate:
+            await asyncio.sleep(1 / rate)
+    await asyncio.gather(*previous.values())
+    elapsed = time.perf_counter() - started
+
+    return SimulationStats(
+        reactions=reactions,
+        elapsed=elapsed,
+        latencies=latencies,
+        calls=backend.calls,
+        statements=statements["all"],
+        commits=statements["commit"],
+        mismatched_scores=_check_scores(cog, backend, reacted),
+    )
+
+
+def _check_scores(cog: SimCog, backend: FakeBackend, reacted: set):
+    """Count event scores that don't match what the reactions add up to."""
+
+    storage = cog.event_manager.storage
+    season_id = cog.event_manager._active_season(GUILD_ID)["id"]
+    expected: Dict[int, Counter] = {id: Counter() for id in backend.channels}
+    emojis_by_message: Dict[int, set] = {}
+    for message_id, _mod_id, emoji in reacted:
+        emojis_by_message.setdefault(message_id, set()).add(emoji)
+    for message_id, emojis in emojis_by_message.items():
+        message = backend.messages[message_id]
+        channel = storage.get_channel(
+            season_id=season_id, channel_id=message.channel.id
+        )
+        assert channel
+        point_value = channel["point_value"]
+        multiplier = sum(EVENT_EMOJIS[emoji] for emoji in emojis)
+        expected[message.channel.id][message.author.id] += point_value * multiplier
+
+    mismatched = 0
+    for channel_id, scores in expected.items():
+        actual = {
+            row["user_id"]: row["score"]
+            for row in storage.get_event_scores(
+                season_id=season_id, channel_id=channel_id
+            )
+            if row["score"] != 0
+        }
+        expected_scores = {user_id: s for user_id, s in scores.items() if s != 0}
+        mismatched += len(set(actual.items()) ^ set(expected_scores.items()))
+    return mismatched
+
+
+def _emoji_name(emoji):
+    return emoji if isinstance(emoji, str) else emoji.name
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay mod reactions through CrowEvents against a fake Discord."
+    )
+    parser.add_argument("--reactions", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--channels", type=int, default=5)
+    parser.add_argument("--members", type=int, default=200)
+    parser.add_argument("--mods", type=int, default=5)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds per fake API call"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=None, help="reactions dispatched per second"
+    )
+    parser.add_argument("--storage", default=":memory:", help="storage directory")
+    args = parser.parse_args()
+
+    stats = asyncio.run(
+        simulate(
+            reactions=args.reactions,
+            messages=args.messages,
+            channels=args.channels,
+            members=args.members,
+            mods=args.mods,
+            latency=args.latency,
+            rate=args.rate,
+            storage_path=args.storage,
+        )
+    )
+    print(stats.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import datetime
+import io
+
+
+def test_record_point(bench, make_synthetic_guild, points):
+    guild = make_synthetic_guild(points)
+    storage = guild.manager.storage
+
+    def record():
+        storage.record_point(
+            message_id=guild.new_message_id(),
+            user_id=guild.rng.choice(guild.users).id,
+            season_id=guild.season_id,
+            channel_id=guild.rng.choice(guild.channels).id,
+            multiplier=1,
+            sent_at=datetime.datetime.now(),
+        )
+
+    bench(record, repeat=200)
+
+
+def test_remove_point(bench, make_synthetic_guild, points):
+    guild = make_synthetic_guild(points)
+    storage = guild.manager.storage
+    # remove real points, so each removal re-scores the author's event
+    stored = iter(
+        storage.db.execute(
+            """
+            SELECT message_id, user_id, channel_id FROM event_points
+            WHERE season_id = ?
+            ORDER BY message_id
+            """,
+            (guild.season_id,),
+        ).fetchall()
+    )
+
+    def remove():
+        message_id, user_id, channel_id = next(stored)
+        storage.remove_point(
+            message_id=message_id,
+            user_id=user_id,
+            season_id=guild.season_id,
+            channel_id=channel_id,
+        )
+
+    bench(remove, repeat=200)
+
+
+def test_recalculate_event_scores(bench, make_synthetic_guild, points):
+    guild = make_synthetic_guild(points)
+    scoring = guild.manager.storage._scoring
+
+    def recalculate():
+        scoring.recalculate_event_scores(
+            season_id=guild.season_id, channel_id=guild.rng.choice(guild.channels).id
+        )
+
+    bench(recalculate, repeat=20, warmup=1)
+
+
+def test_reconfigure_season(bench, make_synthetic_guild, points):
+    guild = make_synthetic_guild(points)
+    storage = guild.manager.storage
+
+    def reconfigure():
+        storage.configure_channels(
+            season_id=guild.season_id,
+            point_values={c.id: guild.rng.randint(1, 3) for c in guild.channels},
+        )
+
+    bench(reconfigure, repeat=10, warmup=1)
+
+
+def test_export_points(bench, make_synthetic_guild, points, dummy_guild):
+    guild = make_synthetic_guild(points)
+
+    def export():
+        guild.manager.export_points(dummy_guild.id, io.StringIO())
+
+    bench(export, repeat=10, warmup=1)
+
+
+def test_leaderboards(bench, make_synthetic_guild, points, dummy_guild):
+    guild = make_synthetic_guild(points)
+    manager = guild.manager
+
+    bench(
+        lambda: manager.get_season_leaderboard(dummy_guild.id),
+        repeat=50,
+        label="season",
+    )
+    bench(
+        lambda: manager.get_event_leaderboard(
+            dummy_guild.id, guild.rng.choice(guild.channels).id
+        ),
+        repeat=50,
+        label="event",
+    )
+    bench(
+        lambda: manager.storage.get_user_season_scores(
+            season_id=guild.season_id, user_id=guild.rng.choice(guild.users).id
+        ),
+        repeat=200,
+        label="user",
+    )
+    bench(
+        lambda: manager.storage.get_season_rank(
+            season_id=guild.season_id, user_id=guild.rng.choice(guild.users).id
+        ),
+        repeat=200,
+        label="rank",
+    )
+    bench(
+        lambda: manager.get_hot_leaderboard(dummy_guild.id),
+        repeat=50,
+        label="hot",
+    )
+    bench(
+        lambda: manager.get_movers_leaderboard(dummy_guild.id, 7),
+        repeat=50,
+        label="window",
+    )
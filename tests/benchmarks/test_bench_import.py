@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+
+# a running bot has already loaded these by the time the cog is loaded
+PRELOAD = """
+import discord
+import redbot.core.bot
+import redbot.core.commands
+import redbot.core.config
+import redbot.core.utils.chat_formatting
+import redbot.core.utils.menus
+import redbot.core.utils.predicates
+import redbot.core.data_manager
+"""
+
+IMPORT_COG = (
+    PRELOAD
+    + """
+import json, sys, time
+
+start = time.perf_counter()
+import cogs.crow
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "modules": sorted(sys.modules)}))
+"""
+)
+
+
+def _import_cog():
+    root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_COG],
+        capture_output=True,
+        check=True,
+        cwd=root,
+        env={**os.environ, "PYTHONPATH": root},
+        text=True,
+    )
+    return json.loads(result.stdout)
+
+
+def test_heavy_imports_are_lazy():
+    """Pillow and the events storage stack only load when first used."""
+
+    modules = _import_cog()["modules"]
+    assert "PIL" not in modules
+    for name in ("manager", "storage", "schema", "scoring", "backup", "profiling"):
+        assert f"cogs.crow.events.{name}" not in modules
+
+
+def test_import_time(bench):
+    bench.record([_import_cog()["elapsed"] for _ in range(10)])
@@ -0,0 +1,20 @@
+from tests.benchmarks.reaction_sim import simulate
+
+
+async def test_simulated_reactions_score_correctly():
+    stats = await simulate(reactions=300, messages=50)
+    assert 300 == len(stats.latencies)
+    assert 0 == stats.mismatched_scores
+
+
+async def test_reaction_pipeline(bench, storage_path):
+    stats = await simulate(reactions=3000, storage_path=storage_path)
+    assert 0 == stats.mismatched_scores
+    bench.record(stats.latencies, ops_per_sec=stats.reactions / stats.elapsed)
+
+
+async def test_reaction_pipeline_with_latency(bench):
+    # the API dominates here; this is about how many calls each reaction makes
+    stats = await simulate(reactions=2000, latency=0.01)
+    assert 0 == stats.mismatched_scores
+    bench.record(stats.latencies, ops_per_sec=stats.reactions / stats.elapsed)
@@ -5,6 +5,29 @@ import pytest
 import discord
 
 
+def pytest_addoption(parser):
+    group = parser.getgroup("kenku benchmarks")
+    group.addoption(
+        "--bench", action="store_true", help="run the benchmarks in tests/benchmarks"
+    )
+    group.addoption(
+        "--bench-sizes",
+        default="10000,100000",
+        help="comma-separated point counts to benchmark at (default: 10000,100000)",
+    )
+    group.addoption(
+        "--bench-save",
+        action="store_true",
+        help="save benchmark results as the new baselines",
+    )
+    group.addoption(
+        "--bench-tolerance",
+        type=float,
+        default=2.0,
+        help="fail if a median latency is this many times slower than its baseline",
+    )
+
+
 @pytest.fixture
 def dummy_guild():
     @dataclass
@@ -22,8 +45,8 @@ def make_channel(dummy_guild):
         name: str
         guild: discord.Guild
 
-    def _make_channel(name="dummy-channel"):
-        return Channel(id=222, name=name, guild=dummy_guild)
+    def _make_channel(name="dummy-channel", id=222):
+        return Channel(id=id, name=name, guild=dummy_guild)
 
     return _make_channel
 
@@ -43,6 +66,24 @@ def make_user(dummy_guild):
     return _make_user
 
 
+@pytest.fixture
+def make_member(dummy_guild):
+    @dataclass
+    class Member:
+        id: int
+        name: str
+        display_name: str
+        guild: discord.Guild
+        pending: bool
+
+    def _make_member(id=4321, name="dummy-member", pending=False):
+        return Member(
+            id=id, name=name, display_name=name, guild=dummy_guild, pending=pending
+        )
+
+    return _make_member
+
+
 @pytest.fixture
 def make_message(make_channel, make_user, dummy_guild):
     @dataclass
@@ -1,4 +1,10 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import datetime
 from io import StringIO
+import os
+import shutil
+import sqlite3
 from multiprocessing import dummy
 from textwrap import dedent
 from typing import cast
@@ -6,7 +12,10 @@ import pytest
 
 from redbot.core import commands
 
-from cogs.crow.events.manager import EventManager
+from cogs.crow.events.backup import backup_archives, list_backups
+from cogs.crow.events.manager import EventError, EventManager
+from cogs.crow.events.reconcile import check_users
+from cogs.crow.events.schema import Migrations
 
 
 @pytest.fixture
@@ -51,6 +60,187 @@ def test_can_record_point(event_manager: EventManager, make_channel, make_messag
     assert 0 == scores[0]["score"]
 
 
+def test_ranks(
+    event_manager: EventManager, dummy_guild, make_channel, make_message, make_user
+):
+    dummy_channel = make_channel()
+    event_manager.configure_channel(dummy_channel)
+    users = [make_user(id=id) for id in range(1, 6)]
+    for points, user in zip([5, 3, 3, 8, 1], users):
+        event_manager.set_points(make_message(id=user.id, author=user), points)
+
+    rank = event_manager.user_rank(users[1], dummy_guild.id)
+    assert rank
+    assert (3, 3) == (rank.rank, rank.score)
+    assert [(1, 5)] == [tuple(row) for row in rank.above]
+    assert [(5, 1)] == [tuple(row) for row in rank.below]
+
+    # ties share a rank
+    rank = event_manager.user_rank(users[2], dummy_guild.id, dummy_channel.id)
+    assert rank
+    assert 3 == rank.rank
+
+    rank = event_manager.user_rank(users[3], dummy_guild.id)
+    assert rank
+    assert (1, []) == (rank.rank, rank.above)
+    assert event_manager.user_rank(make_user(id=99), dummy_guild.id) is None
+
+
+def test_point_history(
+    event_manager: EventManager, dummy_guild, make_channel, make_message, make_user
+):
+    event_manager.configure_channel(make_channel(), 2)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    user, other = make_user(id=1), make_user(id=2)
+    today = make_message(id=1, author=user)
+    today.created_at = now
+    earlier = make_message(id=2, author=user)
+    earlier.created_at = now - datetime.timedelta(days=2)
+    others = make_message(id=3, author=other)
+    others.created_at = now
+
+    event_manager.set_points(today, 3)
+    event_manager.set_points(earlier, 1)
+    event_manager.set_points(others, 2)
+    # updating a point replaces its multiplier on the same day
+    event_manager.set_points(today, 1)
+    assert [2, 0, 2] == event_manager.user_trend(user, dummy_guild.id, 3)
+
+    _season, movers = event_manager.get_movers_leaderboard(dummy_guild.id, 1)
+    assert [(2, 4), (1, 2)] == list(movers.items())
+
+    event_manager.set_points(earlier, 0)
+    assert [0, 0, 2] == event_manager.user_trend(user, dummy_guild.id, 3)
+    _season, movers = event_manager.get_movers_leaderboard(dummy_guild.id, 7)
+    assert {2: 4, 1: 2} == movers
+
+
+def test_hot_leaderboard(
+    event_manager: EventManager, dummy_guild, make_channel, make_message, make_user
+):
+    event_manager.configure_channel(make_channel(), 2)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    recent, old = make_user(id=1), make_user(id=2)
+    for id, (user, age, points) in enumerate(
+        [(recent, 0, 3), (old, 7, 4), (old, 70, 9)]
+    ):
+        message = make_message(id=id, author=user)
+        message.created_at = now - datetime.timedelta(days=age)
+        event_manager.set_points(message, points)
+
+    # a week old counts for half, and ten weeks old for next to nothing
+    _season, scores = event_manager.get_hot_leaderboard(dummy_guild.id)
+    assert [(1, 6), (2, 4)] == list(scores.items())
+
+    # re-scoring the event gives the same hot scores
+    event_manager.configure_channel(make_channel(), 1)
+    _season, scores = event_manager.get_hot_leaderboard(dummy_guild.id, 222)
+    assert [(1, 3), (2, 2)] == list(scores.items())
+
+
+def test_bulk_rescoring(
+    event_manager: EventManager, dummy_guild, make_channel, make_message, make_user
+):
+    channels = [make_channel(id=id, name=f"event-{id}") for id in range(1, 4)]
+    event_manager.configure_channels(channels)
+    for id, channel in enumerate(channels):
+        event_manager.set_points(make_message(id=id, channel=channel), id + 1)
+
+    statements = []
+    event_manager.storage.db.set_trace_callback(statements.append)
+    event_manager.configure_channels(channels[:2], 10)
+    event_manager.storage.db.set_trace_callback(None)
+
+    # one read of the season's points, and one commit
+    assert 1 == sum("FROM event_points p" in s for s in statements)
+    assert 1 == statements.count("COMMIT")
+    _season, scores = event_manager.get_season_leaderboard(dummy_guild.id)
+    assert {4321: 10 + 20 + 3} == scores
+    assert {4321: 20} == event_manager.get_event_leaderboard(dummy_guild.id, 2)
+
+    # removed channels drop out of the season
+    event_manager.configure_channels(channels[1:], 0)
+    _season, scores = event_manager.get_season_leaderboard(dummy_guild.id)
+    assert {4321: 10} == scores
+    assert event_manager.get_event_leaderboard(dummy_guild.id, 3) is None
+
+
+def test_transactions(
+    event_manager: EventManager, dummy_guild, make_channel, make_message
+):
+    channel = make_channel()
+    event_manager.configure_channel(channel, 2)
+
+    # a point, its scores and names are committed together
+    statements = []
+    event_manager.storage.db.set_trace_callback(statements.append)
+    event_manager.set_points(make_message(id=1, channel=channel), 1)
+    event_manager.set_points(make_message(id=1, channel=channel), 0)
+    event_manager.storage.db.set_trace_callback(None)
+    assert 2 == statements.count("COMMIT")
+
+    # and several writes can share one, rolled back together on errors
+    storage = event_manager.storage
+    season_id = event_manager._active_season(dummy_guild.id)["id"]
+    with pytest.raises(RuntimeError):
+        with storage.transaction():
+            event_manager.set_points(make_message(id=2, channel=channel), 3)
+            storage.update_snowflake(id=999, name="rolled-back")
+            raise RuntimeError
+    assert not storage.db.in_transaction
+    _season, scores = event_manager.get_season_leaderboard(dummy_guild.id)
+    assert {4321: 0} == scores
+    assert not storage.db.execute("SELECT * FROM snowflakes WHERE id = 999").fetchall()
+    assert storage.get_channel(season_id=season_id, channel_id=channel.id)
+
+
+async def test_shared_database(tmp_path, dummy_guild, make_channel, make_message):
+    # as if two bot processes shared the data directory
+    first, second = [
+        EventManager(cast(commands.Cog, None), storage_path=str(tmp_path))
+        for _ in range(2)
+    ]
+    channel = make_channel()
+    first.configure_channel(channel, 1)
+
+    def score(manager: EventManager, multiplier: int):
+        for _ in range(3):
+            for id in range(100):
+                manager.set_points(make_message(id=id, channel=channel), multiplier)
+
+    with ThreadPoolExecutor(2) as pool:
+        list(pool.map(score, [first, second], [1, 2]))
+
+    # both see the same scores, and they match the points underneath
+    _season, scores = first.get_season_leaderboard(dummy_guild.id)
+    assert scores == second.get_season_leaderboard(dummy_guild.id)[1]
+    assert 100 <= scores[4321] <= 200
+    report = await first.reconcile()
+    assert [] == report.drift
+
+
+async def test_external_changes(tmp_path, dummy_guild, make_channel, make_message):
+    first, second = [
+        EventManager(cast(commands.Cog, None), storage_path=str(tmp_path))
+        for _ in range(2)
+    ]
+    channel = make_channel()
+
+    # caches filled before another process configures the channel are dropped
+    assert not first.set_points(make_message(channel=channel), 1)
+    second.configure_channel(channel, 3)
+    assert first.check_changes()
+    assert first.set_points(make_message(channel=channel), 1)
+    assert not first.check_changes()
+
+    # and guilds moved by another process are followed to their own database
+    assert first.storage_for(dummy_guild.id) is first.storage
+    await second.move_guild(dummy_guild.id)
+    assert first.check_changes()
+    _season, scores = first.get_season_leaderboard(dummy_guild.id)
+    assert {4321: 3} == scores
+
+
 def test_season_scoring(event_manager: EventManager, make_channel):
     dummy_channel = make_channel()
     event_manager.configure_channel(dummy_channel)
@@ -62,7 +252,12 @@ def test_season_scoring(event_manager: EventManager, make_channel):
 
 
 async def test_adjustments(
-    event_manager: EventManager, make_channel, dummy_context, make_message, make_user
+    event_manager: EventManager,
+    make_channel,
+    dummy_context,
+    dummy_guild,
+    make_message,
+    make_user,
 ):
     dummy_channel = make_channel()
     event_manager.configure_channel(dummy_channel, 2)
@@ -79,7 +274,7 @@ async def test_adjustments(
     await event_manager.replace_adjustments(dummy_context, dummy_channel.id, csv)
 
     # adjusted scores are not affected by multiplier
-    scores = event_manager.get_event_leaderboard(dummy_channel.id)
+    scores = event_manager.get_event_leaderboard(dummy_guild.id, dummy_channel.id)
     expected = {
         111: 70,
         222: -1,
@@ -89,7 +284,7 @@ async def test_adjustments(
     # but they do add in with multiplied scores from reactions
     msg = make_message(7777, make_user(111), dummy_channel)
     event_manager.set_points(msg, 3)
-    scores = event_manager.get_event_leaderboard(dummy_channel.id)
+    scores = event_manager.get_event_leaderboard(dummy_guild.id, dummy_channel.id)
     expected = {
         111: 70 + 2 * 3,
         222: -1,
@@ -99,8 +294,460 @@ async def test_adjustments(
     # adjustments can be removed
     csv = StringIO("user_id,user_name,adjustment,note")
     await event_manager.replace_adjustments(dummy_context, dummy_channel.id, csv)
-    scores = event_manager.get_event_leaderboard(dummy_channel.id)
+    scores = event_manager.get_event_leaderboard(dummy_guild.id, dummy_channel.id)
     expected = {
         111: 2 * 3,
     }
     assert expected == scores
+
+
+def test_slow_query_log(event_manager: EventManager, make_channel, make_message):
+    storage = event_manager.storage
+    event_manager.configure_channel(make_channel())
+
+    # record everything
+    storage.set_slow_query_threshold(0)
+    event_manager.set_points(make_message(), 3)
+    queries = list(storage.profiler.queries)
+    assert any("INSERT INTO event_points" in q.sql for q in queries)
+    select = next(q for q in queries if "FROM event_points p" in q.sql)
+    assert select.plan
+    assert "(int, int)" == select.params
+    assert "EXPLAIN" not in storage.profiler.dump()
+
+    # and nothing
+    storage.profiler.clear()
+    storage.set_slow_query_threshold(None)
+    event_manager.set_points(make_message(), 0)
+    assert 0 == len(storage.profiler.queries)
+
+
+def test_seasons(event_manager: EventManager, dummy_guild, make_channel, make_message):
+    dummy_channel = make_channel()
+    old_message = make_message()
+    event_manager.configure_channel(dummy_channel, 2)
+    event_manager.set_points(old_message, 1)
+
+    previous, current = event_manager.start_season(dummy_guild.id, "Season 2")
+    assert "Season 1" == previous["name"]
+    assert "Season 2" == current["name"]
+    with pytest.raises(EventError):
+        event_manager.start_season(dummy_guild.id, "season 2")
+
+    # channels start over, and can be reused
+    assert event_manager.get_event_leaderboard(dummy_guild.id, dummy_channel.id) is None
+    assert not event_manager.set_points(make_message(id=5555), 1)
+    event_manager.configure_channel(dummy_channel)
+    event_manager.set_points(make_message(id=5555), 3)
+
+    # neither a new reaction nor removing one touches the finished season
+    event_manager.set_points(old_message, 3)
+    event_manager.set_points(old_message, 0)
+
+    author_id = old_message.author.id
+    _season, scores = event_manager.get_season_leaderboard(dummy_guild.id)
+    assert {author_id: 3} == scores
+    season, scores = event_manager.get_season_leaderboard(dummy_guild.id, "Season 1")
+    assert season["end_at"]
+    assert {author_id: 2} == scores
+    rows = event_manager.storage.export_points(guild_id=dummy_guild.id)
+    assert {(previous["id"], 2), (current["id"], 1)} == {
+        (r["season_id"], r["point_value"]) for r in rows
+    }
+
+
+# a version 5 database: one channel in season 1 and a point in a channel that's gone
+V5_DATABASE = """
+    CREATE TABLE seasons (
+        id INTEGER PRIMARY KEY NOT NULL, name TEXT NOT NULL,
+        guild_id INTEGER NOT NULL, start_at INTEGER NOT NULL, end_at INTEGER,
+        UNIQUE (name, guild_id)
+    );
+    CREATE TABLE season_scores (
+        season_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+        score INTEGER NOT NULL, PRIMARY KEY (season_id, user_id)
+    );
+    CREATE TABLE event_channels (
+        channel_id INTEGER PRIMARY KEY NOT NULL, season_id INTEGER NOT NULL,
+        point_value INTEGER DEFAULT 1
+    );
+    CREATE TABLE event_points (
+        message_id INTEGER PRIMARY KEY NOT NULL, user_id INTEGER NOT NULL,
+        channel_id INTEGER NOT NULL, sent_at INTEGER NOT NULL,
+        multiplier INTEGER NOT NULL DEFAULT 1
+    );
+    CREATE TABLE event_adjustments (
+        id INTEGER PRIMARY KEY NOT NULL, channel_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL, adjustment INTEGER NOT NULL, note TEXT
+    );
+    CREATE TABLE event_scores (
+        channel_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+        score INTEGER NOT NULL, PRIMARY KEY (channel_id, user_id)
+    );
+    CREATE INDEX idx_event_high_scores ON event_scores (channel_id, score DESC);
+    CREATE TABLE snowflakes (
+        id INTEGER PRIMARY KEY NOT NULL, name TEXT, cached_at INTEGER NOT NULL
+    );
+    INSERT INTO seasons VALUES (1, 'Season 1', 9876, '2023-01-01 00:00:00', NULL);
+    INSERT INTO event_channels VALUES (222, 1, 2);
+    INSERT INTO event_points VALUES
+        (1, 4321, 222, 0, 3), (2, 4321, 333, 0, 1), (3, 1234, 222, 0, 1),
+        (4, 1234, 222, 0, 1), (5, 1234, 222, 0, 1);
+    INSERT INTO event_adjustments VALUES (1, 222, 1234, -2, NULL);
+    INSERT INTO event_scores VALUES (222, 4321, 6), (222, 1234, 4);
+    PRAGMA user_version = 5;
+"""
+
+
+def test_migrate_from_v5():
+    db = sqlite3.connect(":memory:")
+    db.executescript(V5_DATABASE)
+    # small batches, to copy in several steps
+    Migrations(db, batch_size=2).migrate()
+
+    assert 10 == Migrations(db).version()
+    points = db.execute(
+        "SELECT message_id, season_id FROM event_points ORDER BY message_id"
+    ).fetchall()
+    assert [(1, 1), (2, 0), (3, 1), (4, 1), (5, 1)] == points
+    adjustments = db.execute("SELECT season_id, adjustment FROM event_adjustments")
+    assert [(1, -2)] == adjustments.fetchall()
+    scores = db.execute(
+        """
+        SELECT season_id, channel_id, user_id, score, hot
+        FROM event_scores ORDER BY user_id
+        """
+    ).fetchall()
+    # points from 1970 have long since cooled off
+    assert [(1, 222, 1234, 4, None), (1, 222, 4321, 6, None)] == scores
+    days = db.execute(
+        """
+        SELECT season_id, channel_id, user_id, multiplier FROM event_point_days
+        ORDER BY season_id, user_id
+        """
+    ).fetchall()
+    assert [(0, 333, 4321, 1), (1, 222, 1234, 3), (1, 222, 4321, 3)] == days
+
+
+# before event_points lost its extra column (v4) and gained multipliers (v5), and
+# before adjustments and name caching
+V2_DATABASE = """
+    CREATE TABLE seasons (
+        id INTEGER PRIMARY KEY NOT NULL, name TEXT NOT NULL,
+        guild_id INTEGER NOT NULL, start_at INTEGER NOT NULL, end_at INTEGER,
+        UNIQUE (name, guild_id)
+    );
+    CREATE TABLE event_channels (
+        channel_id INTEGER PRIMARY KEY NOT NULL, season_id INTEGER NOT NULL,
+        point_value INTEGER DEFAULT 1
+    );
+    CREATE TABLE event_points (
+        message_id INTEGER PRIMARY KEY NOT NULL, user_id INTEGER NOT NULL,
+        channel_id INTEGER NOT NULL, sent_at INTEGER NOT NULL, emoji TEXT
+    );
+    CREATE TABLE event_scores (
+        channel_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+        score INTEGER NOT NULL, PRIMARY KEY (channel_id, user_id)
+    );
+    INSERT INTO seasons VALUES (1, 'Season 1', 9876, '2023-01-01 00:00:00', NULL);
+    INSERT INTO event_channels VALUES (222, 1, 2);
+    INSERT INTO event_points VALUES
+        (1, 4321, 222, 0, '🧩'), (2, 1234, 222, 0, '🧩'), (3, 1234, 222, 0, '🧩');
+    INSERT INTO event_scores VALUES (222, 4321, 2), (222, 1234, 4);
+    PRAGMA user_version = 2;
+"""
+
+
+def test_migrate_from_v2():
+    db = sqlite3.connect(":memory:")
+    db.executescript(V2_DATABASE)
+    Migrations(db).migrate()
+
+    assert 10 == Migrations(db).version()
+    points = db.execute(
+        """
+        SELECT message_id, season_id, user_id, multiplier FROM event_points
+        ORDER BY message_id
+        """
+    ).fetchall()
+    assert [(1, 1, 4321, 1), (2, 1, 1234, 1), (3, 1, 1234, 1)] == points
+    scores = db.execute(
+        "SELECT user_id, score FROM season_scores WHERE season_id = 1 ORDER BY user_id"
+    ).fetchall()
+    assert [(1234, 4), (4321, 2)] == scores
+
+
+async def test_background_migration(tmp_path, make_message):
+    db = sqlite3.connect(tmp_path / "event_storage.sqlite")
+    db.executescript(V5_DATABASE)
+    db.close()
+
+    event_manager = EventManager(
+        cast(commands.Cog, None), storage_path=str(tmp_path), background=True
+    )
+    assert not event_manager.ready.is_set()
+
+    # writes queue up behind the migration
+    async def react():
+        await event_manager.wait_ready()
+        return event_manager.set_points(make_message(id=6), 1)
+
+    waiting = asyncio.create_task(react())
+    progress = []
+    notes = []
+
+    async def notify(note):
+        notes.append(note)
+
+    await event_manager.start(progress=progress.append, notify=notify)
+    # the migration doesn't count as another process's change, so the warm caches stay
+    assert not event_manager.check_changes()
+    assert await waiting
+    assert "Migrating event storage to version 10" in progress
+    assert ["⏳", "🏁"] == [note[0] for note in notes]
+    assert 0 == event_manager.storage.pending_migrations()
+    # warmed up: the active season and its channel are cached
+    storage = event_manager.storage
+    assert 9876 in storage._active_seasons
+    assert storage.get_channel(season_id=1, channel_id=222) is not None
+    assert [] == storage.check_integrity()
+    scores = event_manager.get_event_leaderboard(9876, 222)
+    assert {4321: 3 * 2 + 2, 1234: 4} == scores
+
+
+def test_new_database_pragmas(tmp_path):
+    event_manager = EventManager(cast(commands.Cog, None), storage_path=str(tmp_path))
+    db = event_manager.storage.db
+    # incremental, so archiving a season can hand its space back
+    assert 2 == db.execute("PRAGMA auto_vacuum").fetchone()[0]
+    assert "wal" == db.execute("PRAGMA journal_mode").fetchone()[0]
+
+
+def test_archive_season(tmp_path, dummy_guild, make_channel, make_message):
+    event_manager = EventManager(cast(commands.Cog, None), storage_path=str(tmp_path))
+    storage = event_manager.storage
+    event_manager.configure_channel(make_channel(), 2)
+    event_manager.set_points(make_message(), 3)
+    with pytest.raises(EventError):
+        event_manager.archive_season(dummy_guild.id, "Season 1")
+
+    event_manager.start_season(dummy_guild.id, "Season 2")
+    event_manager.configure_channel(make_channel())
+    event_manager.set_points(make_message(id=5555), 1)
+    season = event_manager.archive_season(dummy_guild.id, "Season 1")
+    with pytest.raises(EventError):
+        event_manager.archive_season(dummy_guild.id, "Season 1")
+
+    # raw points are gone from the live database, but scores and exports aren't
+    assert (tmp_path / "event_archives" / f"season_{season['id']}.sqlite").exists()
+    points = storage.db.execute("SELECT message_id FROM event_points").fetchall()
+    assert [5555] == [p["message_id"] for p in points]
+    _season, scores = event_manager.get_season_leaderboard(dummy_guild.id, "Season 1")
+    assert {4321: 6} == scores
+    rows = storage.export_points(guild_id=dummy_guild.id)
+    assert {("Season 1", 2), ("Season 2", 1)} == {
+        (r["season_name"], r["point_value"]) for r in rows
+    }
+
+
+async def test_backup_archived_seasons(
+    tmp_path, dummy_guild, make_channel, make_message
+):
+    event_manager = EventManager(cast(commands.Cog, None), storage_path=str(tmp_path))
+    event_manager.configure_channel(make_channel(), 2)
+    event_manager.set_points(make_message(), 3)
+    event_manager.start_season(dummy_guild.id, "Season 2")
+    event_manager.archive_season(dummy_guild.id, "Season 1")
+
+    backups = str(tmp_path / "backups")
+    path = await event_manager.backup(backups, keep=1)
+    assert os.path.exists(backup_archives(path))
+
+    # losing the archives doesn't lose the season, once restored
+    shutil.rmtree(tmp_path / "event_archives")
+    await event_manager.restore(path)
+    exported = StringIO()
+    event_manager.export_points(dummy_guild.id, exported)
+    assert "Season 1" in exported.getvalue()
+
+    # and old backups' archives rotate out with them
+    await event_manager.backup(backups, keep=1)
+    assert not os.path.exists(backup_archives(path))
+
+
+async def test_backup_and_restore(tmp_path, dummy_guild, make_channel, make_message):
+    event_manager = EventManager(cast(commands.Cog, None), storage_path=str(tmp_path))
+    event_manager.configure_channel(make_channel(), 2)
+    event_manager.set_points(make_message(), 3)
+
+    backups = str(tmp_path / "backups")
+    first = await event_manager.backup(backups, keep=2)
+    event_manager.set_points(make_message(id=5555), 1)
+    await event_manager.backup(backups, keep=2)
+    await event_manager.backup(backups, keep=2)
+
+    # only the newest two are kept
+    assert 2 == len(list_backups(backups))
+    assert not os.path.exists(first)
+
+    # a restore brings back the data as of the backup, scores included
+    newest = os.path.join(backups, list_backups(backups)[0])
+    event_manager.set_points(make_message(id=6666), 3)
+    await event_manager.restore(newest)
+    _season, scores = event_manager.get_season_leaderboard(dummy_guild.id)
+    assert {4321: 2 * 3 + 2 * 1} == scores
+
+    # and a damaged backup is refused, leaving data alone
+    with open(newest, "r+b") as file:
+        file.seek(100)
+        file.write(b"\xff" * 4000)
+    with pytest.raises(EventError):
+        await event_manager.restore(newest)
+    _season, scores = event_manager.get_season_leaderboard(dummy_guild.id)
+    assert {4321: 8} == scores
+
+
+@pytest.mark.parametrize("in_memory", [True, False])
+async def test_reconcile(
+    tmp_path, in_memory, dummy_guild, make_channel, make_message, make_user
+):
+    storage_path = ":memory:" if in_memory else str(tmp_path)
+    event_manager = EventManager(cast(commands.Cog, None), storage_path=storage_path)
+    channels = [make_channel(id=id, name=f"event-{id}") for id in range(1, 4)]
+    event_manager.configure_channels(channels, 2)
+    for id in range(30):
+        author = make_user(id=1000 + id % 10)
+        event_manager.set_points(
+            make_message(id=id, author=author, channel=channels[id % 3]), 1
+        )
+    _season, expected = event_manager.get_season_leaderboard(dummy_guild.id)
+
+    # nothing to fix
+    report = await event_manager.reconcile(chunk_size=3)
+    assert 10 == report.users
+    assert [] == report.drift and [] == report.orphans
+
+    # leave scores behind for a removed event, and drift scores and history
+    season_id = event_manager._active_season(dummy_guild.id)["id"]
+    event_manager.configure_channel(channels[2], 0)
+    _season, expected = event_manager.get_season_leaderboard(dummy_guild.id)
+    db = event_manager.storage.db
+    db.execute(
+        "INSERT INTO event_scores (season_id, channel_id, user_id, score) "
+        + "VALUES (?, 3, 1003, 5)",
+        (season_id,),
+    )
+    db.execute("UPDATE season_scores SET score = 99 WHERE user_id = 1001")
+    db.execute("UPDATE event_scores SET score = 99 WHERE user_id = 1002")
+    db.execute("DELETE FROM event_point_days WHERE user_id = 1004")
+    db.commit()
+
+    report = await event_manager.reconcile(chunk_size=3)
+    assert {"season", "event", "days"} == {drift.kind for _s, drift in report.drift}
+    assert [(season_id, 3)] == report.orphans
+    _season, scores = event_manager.get_season_leaderboard(dummy_guild.id)
+    assert expected == scores
+
+    # and it all checks out afterwards
+    report = await event_manager.reconcile()
+    assert [] == report.drift and [] == report.orphans
+
+    # the removed event's points were kept, so adding it back restores its scores
+    event_manager.configure_channel(channels[2], 2)
+    _season, scores = event_manager.get_season_leaderboard(dummy_guild.id)
+    assert 60 == sum(scores.values())
+
+
+def test_reconcile_snapshot(tmp_path, dummy_guild, make_channel, make_message):
+    event_manager = EventManager(cast(commands.Cog, None), storage_path=str(tmp_path))
+    event_manager.configure_channel(make_channel(), 2)
+    event_manager.set_points(make_message(id=1), 1)
+    season_id = event_manager._active_season(dummy_guild.id)["id"]
+
+    class Racing:
+        # commits another point once the expected scores have been read
+        def __init__(self, db):
+            self.db = db
+            self.reads = 0
+
+        @property
+        def in_transaction(self):
+            return self.db.in_transaction
+
+        def execute(self, *args):
+            if self.reads == 3:
+                event_manager.set_points(make_message(id=2), 1)
+            self.reads += 1
+            return self.db.execute(*args)
+
+    with event_manager.storage.reader() as db:
+        drift, users = check_users(
+            cast(sqlite3.Connection, Racing(db)),
+            season_id=season_id,
+            after=-1,
+            limit=10,
+        )
+    assert [] == drift and [4321] == users
+
+
+async def test_guild_shards(tmp_path, dummy_guild, make_channel, make_message):
+    event_manager = EventManager(cast(commands.Cog, None), storage_path=str(tmp_path))
+    event_manager.configure_channel(make_channel(), 2)
+    event_manager.set_points(make_message(id=1), 1)
+    event_manager.start_season(dummy_guild.id, "Season 2")
+    event_manager.archive_season(dummy_guild.id, "Season 1")
+    event_manager.configure_channel(make_channel(), 3)
+    event_manager.set_points(make_message(id=2), 1)
+
+    # guilds already in the shared database stay there; new ones get their own
+    event_manager = EventManager(
+        cast(commands.Cog, None), storage_path=str(tmp_path), shard_by_guild=True
+    )
+    assert event_manager.storage_for(dummy_guild.id) is event_manager.storage
+    assert event_manager.storage_for(1234) is event_manager.shards[1234]
+
+    # until moved, archives and all, on a worker thread with everything else held
+    move = asyncio.create_task(event_manager.move_guild(dummy_guild.id))
+    await asyncio.sleep(0)
+    assert not event_manager.ready.is_set()
+    assert 2 == await move
+    assert event_manager.ready.is_set()
+    shard = event_manager.storage_for(dummy_guild.id)
+    assert shard is event_manager.shards[dummy_guild.id]
+    assert [] == event_manager.storage.get_guild_ids()
+    _season, scores = event_manager.get_season_leaderboard(dummy_guild.id)
+    assert {4321: 3} == scores
+    _season, scores = event_manager.get_season_leaderboard(dummy_guild.id, "Season 1")
+    assert {4321: 2} == scores
+    exported = StringIO()
+    event_manager.export_points(dummy_guild.id, exported)
+    assert 3 == len(exported.getvalue().splitlines())
+
+    # backups and reconciliation cover every database
+    backups = str(tmp_path / "backups")
+    await event_manager.backup(backups, keep=1)
+    shard_backups = event_manager.shard_backup_dir(backups, dummy_guild.id)
+    assert 1 == len(list_backups(shard_backups))
+    report = await event_manager.reconcile()
+    assert (1, 1) == (report.seasons, report.users)
+
+    # restoring one guild (after a safety backup, like `events backup restore`)
+    # leaves everyone else's backups alone
+    for _ in range(3):
+        await event_manager.backup(backups, keep=None)
+    shared = list_backups(backups)
+    assert 4 == len(shared)
+    await event_manager.backup(backups, keep=None)
+    await event_manager.restore(
+        os.path.join(shard_backups, list_backups(shard_backups)[-1]),
+        guild_id=dummy_guild.id,
+    )
+    assert set(shared) < set(list_backups(backups))
+    _season, scores = event_manager.get_season_leaderboard(dummy_guild.id)
+    assert {4321: 3} == scores
+
+    # and guilds keep their own database with sharding off
+    event_manager = EventManager(cast(commands.Cog, None), storage_path=str(tmp_path))
+    assert event_manager.storage_for(dummy_guild.id) is not event_manager.storage
+    _season, scores = event_manager.get_season_leaderboard(dummy_guild.id)
+    assert {4321: 3} == scores
@@ -0,0 +1,59 @@
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from cogs.crow.fetcher import Fetcher, FetchError
+
+
+@pytest.fixture
+async def server():
+    hits = {"count": 0}
+
+    async def image(request):
+        hits["count"] += 1
+        return web.Response(body=b"x" * 100, content_type="image/png")
+
+    async def huge(request):
+        # no content-length, so it has to be caught while streaming
+        response = web.StreamResponse(headers={"Content-Type": "image/png"})
+        await response.prepare(request)
+        for _ in range(10):
+            await response.write(b"x" * 1000)
+        return response
+
+    async def text(request):
+        return web.Response(text="hello")
+
+    app = web.Application()
+    app.router.add_get("/image.png", image)
+    app.router.add_get("/huge.png", huge)
+    app.router.add_get("/text", text)
+
+    server = TestServer(app)
+    await server.start_server()
+    server.hits = hits  # type: ignore
+    yield server
+    await server.close()
+
+
+@pytest.fixture
+async def fetcher():
+    fetcher = Fetcher(max_bytes=5000)
+    yield fetcher
+    await fetcher.close()
+
+
+async def test_fetch_caches(server, fetcher: Fetcher):
+    url = str(server.make_url("/image.png"))
+    assert b"x" * 100 == await fetcher.fetch(url, content_type="image/")
+    assert b"x" * 100 == await fetcher.fetch(url)
+    assert 1 == server.hits["count"]
+
+
+async def test_fetch_limits(server, fetcher: Fetcher):
+    with pytest.raises(FetchError):
+        await fetcher.fetch(str(server.make_url("/huge.png")))
+    with pytest.raises(FetchError):
+        await fetcher.fetch(str(server.make_url("/text")), content_type="image/")
+    with pytest.raises(FetchError):
+        await fetcher.fetch(str(server.make_url("/missing")))
@@ -0,0 +1,90 @@
+import asyncio
+from dataclasses import dataclass, replace
+from typing import List
+
+import pytest
+
+from cogs.crow.crow_greeter import CrowGreeter
+from cogs.crow.greeter import GreetingDispatcher, GreetingTemplate
+
+
+@pytest.fixture
+def greeter_cog():
+    """A greeter cog that records greetings instead of sending them."""
+
+    cog = CrowGreeter()
+    cog.sent = []  # type: ignore
+
+    async def send(members):
+        cog.sent.append([m.id for m in members])  # type: ignore
+
+    cog.greeter_dispatcher = GreetingDispatcher(
+        send, window=0.05, max_batch=10, interval=0.01
+    )
+    return cog
+
+
+async def replay_verifications(cog: CrowGreeter, members, *, spacing=0.0):
+    """Replay `on_member_update` events for members passing membership screening."""
+
+    for member in members:
+        before = replace(member, pending=True)
+        await cog.greeter_member_verified(before, member)  # type: ignore
+        if spacing:
+            await asyncio.sleep(spacing)
+
+
+async def test_burst_is_batched(greeter_cog, make_member):
+    members = [make_member(id=i) for i in range(25)]
+    await replay_verifications(greeter_cog, members)
+    assert 25 == greeter_cog.greeter_dispatcher.depth(members[0].guild.id)
+
+    await asyncio.sleep(0.2)
+    sent: List[List[int]] = greeter_cog.sent
+    assert [10, 10, 5] == [len(batch) for batch in sent]
+    assert list(range(25)) == [id for batch in sent for id in batch]
+    assert 0 == greeter_cog.greeter_dispatcher.depth(members[0].guild.id)
+
+
+async def test_only_verifications_are_greeted(greeter_cog, make_member):
+    member = make_member(id=1)
+
+    # unrelated member updates, and members becoming pending, are ignored
+    await greeter_cog.greeter_member_verified(member, member)
+    await greeter_cog.greeter_member_verified(member, replace(member, pending=True))
+    # repeated verifications are only greeted once
+    await replay_verifications(greeter_cog, [member, member])
+
+    await asyncio.sleep(0.1)
+    assert [[1]] == greeter_cog.sent
+
+
+async def test_separate_waves(greeter_cog, make_member):
+    await replay_verifications(greeter_cog, [make_member(id=1), make_member(id=2)])
+    await asyncio.sleep(0.1)
+    await replay_verifications(greeter_cog, [make_member(id=3)])
+    await asyncio.sleep(0.1)
+    assert [[1, 2], [3]] == greeter_cog.sent
+
+
+def test_greeting_template(make_member):
+    @dataclass
+    class Guild:
+        id: int
+        name: str
+        member_count: int
+
+    guild = Guild(id=1, name="Kanjon's Cave", member_count=1234)
+    members = [
+        replace(make_member(id=1, name="spine"), guild=guild),
+        replace(make_member(id=2, name="kanjon"), guild=guild),
+    ]
+
+    template = GreetingTemplate(
+        "Welcome $USER ($NAME) to $SERVER! Now $MEMBERS strong."
+    )
+    assert (
+        "Welcome <@1>, <@2> (spine, kanjon) to Kanjon's Cave! Now 1234 strong."
+        == template.render(members)
+    )
+    assert "no placeholders" == GreetingTemplate("no placeholders").render(members)
@@ -0,0 +1,43 @@
+from cogs.crow.metrics import Metrics
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics()
+
+    @metrics.timed("thing")
+    def thing():
+        return 1
+
+    assert 1 == thing()
+    with metrics.timer("block"):
+        pass
+    metrics.incr("count")
+    assert {} == metrics.histograms
+    assert {} == metrics.counters
+
+
+async def test_timings_and_counters():
+    metrics = Metrics()
+    metrics.enabled = True
+
+    @metrics.timed("async_thing")
+    async def async_thing():
+        return 2
+
+    assert 2 == await async_thing()
+    with metrics.timer("block"):
+        pass
+    metrics.observe("slow", 0.3)
+    metrics.incr("count", 3)
+
+    assert 1 == metrics.histograms["async_thing"].count
+    assert 1 == metrics.histograms["block"].count
+    assert 0.5 == metrics.histograms["slow"].quantile(0.99)
+    assert 3 == metrics.counters["count"]
+
+    text = metrics.render_prometheus()
+    assert 'kenku_duration_seconds_bucket{op="slow",le="0.25"} 0' in text
+    assert 'kenku_duration_seconds_bucket{op="slow",le="0.5"} 1' in text
+    assert 'kenku_duration_seconds_count{op="slow"} 1' in text
+    assert 'kenku_events_total{event="count"} 3' in text
+    assert 4 == len(metrics.summary())
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from cogs.crow.scheduler import JobError, JobScheduler, Priority
+
+
+def blocking_job(started, release, name):
+    async def run():
+        started.append(name)
+        await release.wait()
+        return name
+
+    return run
+
+
+async def test_priority_and_limits():
+    scheduler = JobScheduler(
+        max_running=3, max_per_guild=1, max_bulk_per_guild=1, max_bulk=2
+    )
+    started = []
+    release = asyncio.Event()
+
+    def submit(name, guild_id, priority=Priority.NORMAL):
+        job = blocking_job(started, release, name)
+        return scheduler.submit(name, job, guild_id=guild_id, priority=priority)
+
+    jobs = [
+        submit("bulk", 1, Priority.BULK),
+        # one bulk job per guild
+        submit("same_guild_bulk", 1, Priority.BULK),
+        submit("normal", 1),
+        # one normal job per guild
+        submit("same_guild", 1),
+        submit("other_bulk", 2, Priority.BULK),
+        # nothing left overall
+        submit("late", 3),
+    ]
+    await asyncio.sleep(0)
+    assert ["bulk", "normal", "other_bulk"] == started
+
+    release.set()
+    await asyncio.gather(*(job.wait() for job in jobs))
+    assert 6 == len(started)
+    assert {"done"} == {job.status for job in scheduler.jobs()}
+
+    # once a slot frees up, waiting commands go before waiting bulk work
+    scheduler = JobScheduler(max_running=1)
+    started.clear()
+    release.clear()
+    jobs = [submit("first", 1), submit("bulk", 2, Priority.BULK), submit("normal", 3)]
+    release.set()
+    await asyncio.gather(*(job.wait() for job in jobs))
+    assert ["first", "normal", "bulk"] == started
+
+
+async def test_bulk_jobs_leave_room_for_commands():
+    scheduler = JobScheduler(max_bulk_per_guild=2)
+    started = []
+    release = asyncio.Event()
+
+    for channel_id in (1, 2):
+        scheduler.submit(
+            "rescan",
+            blocking_job(started, release, "rescan"),
+            guild_id=1,
+            priority=Priority.BULK,
+            key=("rescan", channel_id),
+        )
+    wide = scheduler.submit("wide", blocking_job(started, release, "wide"), guild_id=1)
+    await asyncio.sleep(0)
+    assert ["rescan", "rescan", "wide"] == started
+    assert "running" == wide.status
+    await scheduler.close()
+
+
+async def test_duplicates_cancel_and_errors():
+    scheduler = JobScheduler()
+
+    async def forever():
+        await asyncio.Event().wait()
+
+    async def broken():
+        raise ValueError("nope")
+
+    job = scheduler.submit("rescan", forever, guild_id=1, key=("rescan", 5))
+    with pytest.raises(JobError):
+        scheduler.submit("rescan", forever, guild_id=1, key=("rescan", 5))
+    await asyncio.sleep(0)
+    assert "running" == job.status
+
+    assert scheduler.cancel(job.id)
+    with pytest.raises(asyncio.CancelledError):
+        await job.wait()
+    assert "cancelled" == job.status
+    assert not scheduler.cancel(job.id)
+    # finished, so the key is free again
+    scheduler.submit("rescan", forever, guild_id=1, key=("rescan", 5))
+
+    with pytest.raises(ValueError):
+        await scheduler.run("broken", broken, guild_id=2)
+    assert ["broken"] == [job.name for job in scheduler.jobs(2)]
+    assert "failed" == scheduler.jobs(2)[0].status
+    await scheduler.close()
+
+
+async def test_bulk_work_waits_for_interactive():
+    scheduler = JobScheduler()
+    steps = []
+
+    async def bulk():
+        for i in range(3):
+            await scheduler.checkpoint()
+            steps.append(i)
+
+    with scheduler.interactive():
+        job = scheduler.submit("bulk", bulk, priority=Priority.BULK)
+        await asyncio.sleep(0.01)
+        assert [] == steps
+    await job.wait()
+    assert [0, 1, 2] == steps